@@ -1,10 +1,10 @@
 # src/bot/dialogs/resumes/__init__.py
 from aiogram_dialog import Dialog
 
-from .windows import w_list, w_manage, w_pos_input, w_neg_input, w_confirm
+from .windows import w_list, w_manage, w_pos_input, w_neg_input, w_confirm, w_emp_input
 from .states import ResumesSG
 
 # Экспортируем готовый Dialog и состояния
-resumes_dialog = Dialog(w_list, w_manage, w_pos_input, w_neg_input, w_confirm)
+resumes_dialog = Dialog(w_list, w_manage, w_pos_input, w_neg_input, w_confirm, w_emp_input)
 
 __all__ = ["resumes_dialog", "ResumesSG"]
@@ -33,6 +33,10 @@ async def to_neg_input(_cq: CallbackQuery, _btn: Button, dialog_manager: DialogM
     """Переход к вводу негативных слов."""
     await dialog_manager.switch_to(ResumesSG.neg_input)
 
+async def to_emp_input(_cq: CallbackQuery, _btn: Button, dialog_manager: DialogManager):
+    """Переход к вводу исключённых работодателей."""
+    await dialog_manager.switch_to(ResumesSG.emp_input)
+
 async def toggle_status(cq: CallbackQuery, _btn: Button, dialog_manager: DialogManager):
     """
     Переключить статус активности резюме и перерисовать окно.
@@ -70,6 +74,24 @@ def _parse_words(text: str) -> List[str]:
     """Разбор слов через пробелы/запятые."""
     return [w.strip() for w in _WORDS_RE.split(text or "") if w.strip()]
 
+_EMPLOYERS_RE = re.compile(r"[,;\n]+")
+_EMPLOYER_URL_RE = re.compile(r"hh\.ru/employer/(\d+)")
+
+def parse_employers(text: str) -> List[str]:
+    """
+    Работодатели через запятую или с новой строки: название, id или ссылка
+    на страницу работодателя на hh.ru (из неё берётся id). Дубли убираются.
+    """
+    employers = []
+    for part in _EMPLOYERS_RE.split(text or ""):
+        part = part.strip()
+        url = _EMPLOYER_URL_RE.search(part)
+        if url:
+            part = url.group(1)
+        if part and part.lower() not in {e.lower() for e in employers}:
+            employers.append(part)
+    return employers
+
 async def on_pos_words(msg: Message, _inp: MessageInput, dialog_manager: DialogManager):
     """Сохранение позитивных ключевых слов и возврат к управлению."""
     words = _parse_words(msg.text)
@@ -101,3 +123,23 @@ async def on_neg_words(msg: Message, _inp: MessageInput, dialog_manager: DialogM
     await resume.save()
     await msg.answer(f"Слова-исключения обновлены:\n<code>{', '.join(words)}</code>")
     await dialog_manager.switch_to(ResumesSG.manage)
+
+async def on_employers(msg: Message, _inp: MessageInput, dialog_manager: DialogManager):
+    """Сохранение исключённых работодателей («-» — очистить список) и возврат к управлению."""
+    text = (msg.text or "").strip()
+    employers = [] if text == "-" else parse_employers(text)
+    if not employers and text != "-":
+        await msg.answer("Пусто. Отправьте названия или ссылки на работодателей через запятую.")
+        return
+    rid = dialog_manager.dialog_data.get("resume_id")
+    resume = await Resume.get_or_none(id=rid)
+    if not resume:
+        await msg.answer("Резюме не найдено.")
+        return
+    resume.excluded_employers = employers or None
+    await resume.save(update_fields=("excluded_employers",))
+    if employers:
+        await msg.answer(f"Скрытые работодатели обновлены:\n<code>{', '.join(employers)}</code>")
+    else:
+        await msg.answer("Список скрытых работодателей очищен.")
+    await dialog_manager.switch_to(ResumesSG.manage)
@@ -11,3 +11,4 @@ class ResumesSG(StatesGroup):
     pos_input = State()      # ввод позитивных ключевых слов
     neg_input = State()      # ввод негативных слов
     confirm_delete = State() # подтверждение удаления
+    emp_input = State()      # ввод исключённых работодателей
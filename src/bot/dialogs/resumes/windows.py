@@ -4,7 +4,7 @@ from __future__ import annotations
 import operator
 from aiogram_dialog import Window
 from aiogram_dialog.widgets.text import Const, Format
-from aiogram_dialog.widgets.kbd import Select, Button, Back, Row, Column
+from aiogram_dialog.widgets.kbd import Select, Button, Back, Row, Column, SwitchTo
 from aiogram_dialog.widgets.input import MessageInput
 
 from src.bot.dialogs.resume_add.handlers import open_add_dialog
@@ -12,10 +12,10 @@ from src.bot.dialogs.resumes.states import ResumesSG
 from src.bot.dialogs.resumes.getters import list_getter, manage_getter
 from src.bot.dialogs.resumes.handlers import (
     on_resume_selected,
-    to_pos_input, to_neg_input,
+    to_pos_input, to_neg_input, to_emp_input,
     toggle_status, ask_delete, do_delete,
     to_main_menu,
-    on_pos_words, on_neg_words,
+    on_pos_words, on_neg_words, on_employers,
 )
 
 # Окно со списком резюме
@@ -45,6 +45,9 @@ w_manage = Window(
         Button(Const("⚙️ Ключевые слова"), id="edit_pos", on_click=to_pos_input),
         Button(Const("🚫 Слова-исключения"), id="edit_neg", on_click=to_neg_input),
     ),
+    Row(
+        Button(Const("🏢 Скрыть работодателей"), id="edit_emp", on_click=to_emp_input),
+    ),
     Row(
         Button(Const("🔄 Изменить статус"), id="toggle", on_click=toggle_status),
         Button(Const("🗑️ Удалить"), id="delete", on_click=ask_delete),
@@ -85,6 +88,22 @@ w_neg_input = Window(
     state=ResumesSG.neg_input,
 )
 
+# Ввод исключённых работодателей
+w_emp_input = Window(
+    Const(
+        "Отправьте работодателей, вакансии которых не показывать, через запятую:\n"
+        "название или ссылку на страницу компании на hh.ru.\n"
+        "Напр.: <code>Рога и копыта, https://hh.ru/employer/1234</code>\n"
+        "Отправьте <code>-</code>, чтобы очистить список."
+    ),
+    MessageInput(on_employers),
+    Row(
+        SwitchTo(Const("⬅️ Назад"), id="back_from_emp", state=ResumesSG.manage),
+        Button(Const("⬅️ В главное меню"), id="to_main_from_emp", on_click=to_main_menu)
+    ),
+    state=ResumesSG.emp_input,
+)
+
 # Подтверждение удаления
 w_confirm = Window(
     Const("Удалить резюме безвозвратно?"),
@@ -1,6 +1,14 @@
+import asyncio
+import logging
+
+from src.celery_app import celery_app
+from src.config import config
 from src.models import User, Resume
 from src.services.hh.client import hhc
 from src.services.resume.parser import extract_keywords
+from src.services.resume.snapshot import set_resume_json, snapshot_fields
+
+logger = logging.getLogger(__name__)
 
 
 async def add_resume_task(user_id, resume_id):
@@ -22,14 +30,22 @@ async def add_resume_task(user_id, resume_id):
         id=resume_id,
         defaults={
             "user": user,
-            "resume_json": resume_json,
             "positive_keywords": positive_keywords,
+            **snapshot_fields(resume_json),
         },
     )
     if not created:
         resume.user = user
-        resume.resume_json = resume_json
+        set_resume_json(resume, resume_json)
         resume.positive_keywords = positive_keywords
         await resume.save()
 
+    # 4) Профиль резюме для писем собирает воркер (там живёт клиент OpenAI)
+    if config.ai.resume_profile or config.ai.letter_mode == "slots":
+        try:
+            # send_task блокирующий (сеть до брокера) — не держим цикл бота
+            await asyncio.to_thread(celery_app.send_task, "src.workers.apply.build_resume_profile", args=[resume_id])
+        except Exception:
+            logger.warning("build_resume_profile enqueue failed for resume_id=%s", resume_id, exc_info=True)
+
     return resume, positive_keywords
\ No newline at end of file
@@ -36,6 +36,12 @@ celery_app.conf.beat_schedule = {
         "schedule": crontab(minute=0, hour=12),
         "options": {"queue": "free"},
     },
+    # офлайн-генерация писем free-когорты (APPLY_FREE_LETTER_MODE=batch)
+    "letter-batches-every-5m": {
+        "task": "src.workers.apply.poll_letter_batches",
+        "schedule": crontab(minute="*/5"),
+        "options": {"queue": "free"},
+    },
     # # каждые 15 минут
     # "notifications-every-15m": {
     #     "task": "src.workers.notification_sender_worker.run_notifications_every_15m",
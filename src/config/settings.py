@@ -1,5 +1,7 @@
 from pathlib import Path
-from pydantic import SecretStr
+from typing import Optional
+
+from pydantic import BaseModel, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -30,11 +32,67 @@ class BotConfig(ConfigBase):
         return [int(admin_id) for admin_id in self.admins.split(",") if admin_id.isdigit()]
 
 
+class AIBackendConfig(BaseModel):
+    """Бэкенд пула OpenAI (ключ/endpoint/прокси), см. AIConfig.backends."""
+    name: str
+    api_key: SecretStr
+    base_url: Optional[str] = None
+    proxy_url: Optional[str] = None
+    weight: float = 1.0
+
+
 class AIConfig(ConfigBase):
     model_config = SettingsConfigDict(env_prefix="AI_")
 
     openai_api_key: SecretStr
     proxy_url: str
+    # "prefix" — стабильный префикс (инструкции, шаблон, резюме) + вакансия в конце,
+    # чтобы провайдер кэшировал префикс; "inline" — всё в одном system-сообщении
+    prompt_layout: str = "prefix"
+    # Одновременных запросов к OpenAI на процесс воркера (остальные ждут слота)
+    max_concurrency: int = 8
+    # Несколько ключей/endpoint'ов/прокси с весами (JSON-список в AI_BACKENDS), например:
+    # [{"name": "main", "api_key": "sk-...", "weight": 2}, {"name": "reserve", "api_key": "sk-...", "proxy_url": "http://..."}]
+    # Пусто — один бэкенд из openai_api_key/proxy_url. Первый в списке — основной (через него Batch API)
+    backends: list[AIBackendConfig] = []
+    # Бэкенд исключается на backend_eject_seconds после backend_eject_after ошибок подряд (429/5xx/таймауты)
+    backend_eject_after: int = 3
+    backend_eject_seconds: float = 30.0
+    # Автомат: после breaker_threshold неудачных попыток подряд (5xx/таймауты/сеть) генерация
+    # приостанавливается на breaker_open_seconds, прогоны откликов в это время пропускают резюме
+    breaker_threshold: int = 5
+    breaker_open_seconds: float = 30.0
+    # Хеджирование: запрос, который идёт дольше hedge_percentile-го перцентиля недавних (но не меньше
+    # hedge_min_delay сек), дублируется; берётся первый ответ. Дублей не больше hedge_max_ratio от запросов.
+    # 0 — выключено
+    hedge_percentile: float = 0.0
+    hedge_min_delay: float = 3.0
+    hedge_max_ratio: float = 0.05
+    # Бэкенд офлайн-генерации писем: "openai" (Batch API)
+    batch_backend: str = "openai"
+    # Бюджет токенов на резюме и на вакансию в промпте (0 — без ограничения):
+    # лишнее отбрасывается, начиная со старого опыта и абзацев "о компании/условия"
+    resume_token_budget: int = 1500
+    vacancy_token_budget: int = 1000
+    # В промпт письма — компактный профиль резюме (собирается раз на версию резюме) вместо полного текста.
+    # Меняет письма всех пользователей, поэтому включается явно
+    resume_profile: bool = False
+    # "full" — модель пишет письмо целиком; "slots" — имя, должность, компанию, зарплату и контакты
+    # подставляем сами, у модели просим только свободные фрагменты (короче ответ, быстрее письмо)
+    letter_mode: str = "full"
+    # В режиме "slots": при сбое модели письмо собирается целиком локально (иначе отклик откладывается)
+    letter_local_fallback: bool = True
+    # Режим "full": писем на вакансии одного резюме в одном запросе к модели (общий префикс
+    # с резюме отправляется один раз); 1 — каждое письмо отдельным запросом
+    letter_group_size: int = 1
+    # Режим "full": письмо запрашивается потоком — генерация обрывается после подписи шаблона,
+    # а явно негодный ответ (отказ, код, незаполненные плейсхолдеры) — сразу, без ожидания конца
+    letter_stream: bool = False
+    # Журнал расходов LLM (таблица llm_usage): записи копятся в памяти процесса и пишутся пачкой,
+    # когда набралось usage_flush_size или старейшей больше usage_flush_interval секунд
+    usage_ledger: bool = True
+    usage_flush_size: int = 100
+    usage_flush_interval: float = 60.0
 
 
 class DatabaseConfig(ConfigBase):
@@ -83,12 +141,56 @@ class HH(ConfigBase):
     def auth_url(self) -> str:
         return f"https://hh.ru/oauth/authorize?response_type=code&client_id={self.client_id.get_secret_value()}&redirect_uri={self.redirect_uri}"
 
+
+class CacheConfig(ConfigBase):
+    model_config = SettingsConfigDict(env_prefix="CACHE_")
+
+    # Детали вакансий HH (общие для всех пользователей)
+    vacancy_ttl: int = 6 * 3600
+    vacancy_lru_size: int = 2048
+    # Контекст резюме на прогон apply_for_resume → apply_for_vacancy
+    resume_context_ttl: int = 2 * 3600
+    # Готовые письма по хэшу (резюме, вакансия, модель, версия промпта)
+    letter_ttl: int = 7 * 24 * 3600
+
+
+class ApplyConfig(ConfigBase):
+    model_config = SettingsConfigDict(env_prefix="APPLY_")
+
+    # Сколько вакансий одного резюме готовим (вакансия + письмо) параллельно
+    concurrency: int = 3
+    # Как часто обновлять снимок резюме из HH (текст для промпта берётся из БД)
+    resume_refresh_hours: int = 24
+    # Постраничный поиск: размер страницы = max(min_page_size, cap * page_factor), не больше 100
+    search_page_factor: int = 5
+    search_min_page_size: int = 10
+    search_max_pages: int = 5
+    # Прогон когорты: сколько пользователей параллельно и сколько секунд даём одному (0 — без лимита).
+    # В задачах Celery зависшего пользователя и так отменяет дедлайн прогона (его подхватит продолжение),
+    # а лимит не меньше оставшегося до дедлайна времени не применяется
+    cohort_concurrency: int = 5
+    cohort_user_timeout: float = 0.0
+    # Дедлайн прогона: заканчиваем за deadline_margin сек до soft limit задачи,
+    # новых пользователей не берём за drain_seconds до дедлайна
+    cohort_deadline_margin: float = 5.0
+    cohort_drain_seconds: float = 10.0
+    cohort_max_continuations: int = 20
+    # Массовая постановка задач (task_manager.batch_publisher): сообщений на один producer и pipeline Redis
+    publish_chunk_size: int = 500
+    # Письма для free-когорты: "sync" — сразу при прогоне, "batch" — через Batch API,
+    # отклики отправляет poll_letter_batches по готовности
+    free_letter_mode: str = "sync"
+    batch_meta_ttl: int = 3 * 24 * 3600
+
+
 class Config(ConfigBase):
     bot: BotConfig = BotConfig()
     ai: AIConfig = AIConfig()
     database: DatabaseConfig = DatabaseConfig()
     redis: RedisConfig = RedisConfig()
     hh: HH = HH()
+    cache: CacheConfig = CacheConfig()
+    apply: ApplyConfig = ApplyConfig()
 
 
 config = Config()
@@ -0,0 +1,83 @@
+# src/db/upgrade.py
+"""
+Доводит схему существующей базы до текущих моделей.
+
+Миграции aerich в репозитории не хранятся (каждое окружение делает aerich init-db у себя),
+поэтому столбцы, добавленные в модели после init-db, здесь перечислены явно.
+Новые таблицы создаёт generate_schemas(safe=True), недостающие столбцы — ALTER TABLE.
+Повторный запуск ничего не меняет. Запускать при выкатке до старта бота и воркеров:
+
+    python -m src.db.upgrade
+"""
+import logging
+from typing import List, Set, Tuple
+
+from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+logger = logging.getLogger(__name__)
+
+# (таблица, столбец, тип в PostgreSQL); все столбцы nullable — старые строки остаются валидными
+COLUMNS: Tuple[Tuple[str, str, str], ...] = (
+    # Снимок резюме для промпта (текст, хэш JSON, время синхронизации с HH) и профиль для писем
+    ("resumes", "resume_text", "TEXT"),
+    ("resumes", "resume_hash", "VARCHAR(64)"),
+    ("resumes", "resume_synced_at", "TIMESTAMPTZ"),
+    ("resumes", "resume_profile", "JSONB"),
+    # Работодатели (id или название), вакансии которых не показываем
+    ("resumes", "excluded_employers", "JSONB"),
+)
+
+
+async def _existing_columns(conn: BaseDBAsyncClient, table: str) -> Set[str]:
+    if conn.capabilities.dialect == "sqlite":
+        rows = await conn.execute_query_dict(f'PRAGMA table_info("{table}")')
+        return {row["name"] for row in rows}
+    rows = await conn.execute_query_dict(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = $1", [table]
+    )
+    return {row["column_name"] for row in rows}
+
+
+async def upgrade_schema() -> List[str]:
+    """
+    Создать недостающие таблицы и столбцы (Tortoise уже инициализирован).
+
+    Returns:
+        list: Добавленные столбцы ("таблица.столбец")
+    """
+    await Tortoise.generate_schemas(safe=True)
+    conn = Tortoise.get_connection("default")
+    added = []
+    existing = {}
+    for table, column, column_type in COLUMNS:
+        if table not in existing:
+            existing[table] = await _existing_columns(conn, table)
+        if column in existing[table]:
+            continue
+        if conn.capabilities.dialect == "sqlite":
+            await conn.execute_script(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {column_type}')
+        else:
+            # IF NOT EXISTS — на случай одновременного запуска с другого хоста
+            await conn.execute_script(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "{column}" {column_type}')
+        added.append(f"{table}.{column}")
+        logger.info("[db_upgrade] added column %s.%s", table, column)
+    return added
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    from src.db.init import init_db, close_db
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def _main() -> None:
+        await init_db()
+        try:
+            added = await upgrade_schema()
+            print(f"added: {', '.join(added)}" if added else "schema is up to date")
+        finally:
+            await close_db()
+
+    asyncio.run(_main())
@@ -5,4 +5,5 @@ from .hh_token import HHToken
 from .application_result import ApplicationResult
 from .subscription import Subscription, Plan, SubscriptionStatus
 from .application_history import ApplicationHistory, ApplicationStatus
-from .task_result import TaskResult, RunType
\ No newline at end of file
+from .task_result import TaskResult, RunType
+from .llm_usage import LLMUsage
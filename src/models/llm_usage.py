@@ -0,0 +1,47 @@
+# src/models/llm_usage.py
+
+from __future__ import annotations
+
+from typing import Optional
+
+from tortoise import fields, models
+
+
+class LLMUsage(models.Model):
+    """
+    Журнал вызовов LLM: токены, задержка и ретраи на каждый вызов.
+    Пишется пачками (src.services.ai.usage_ledger), поэтому без внешних ключей:
+    вставка не проверяет пользователя/резюме, а записи переживают их удаление.
+    """
+    id: int = fields.BigIntField(pk=True)
+
+    user_id: Optional[int] = fields.IntField(null=True)
+    resume_id: Optional[str] = fields.CharField(max_length=40, null=True)
+    # letter | letter_group | letter_slots | letter_batch | resume_profile
+    purpose: Optional[str] = fields.CharField(max_length=16, null=True)
+    prompt_version: Optional[str] = fields.CharField(max_length=12, null=True)
+
+    model: str = fields.CharField(max_length=32)
+    backend: Optional[str] = fields.CharField(max_length=32, null=True)
+
+    prompt_tokens: int = fields.IntField(default=0)
+    cached_tokens: int = fields.IntField(default=0)
+    completion_tokens: int = fields.IntField(default=0)
+    # None — у вызова нет своей задержки (Batch API)
+    latency_ms: Optional[int] = fields.IntField(null=True)
+    retries: int = fields.SmallIntField(default=0)
+    # None — успешно, иначе вид ошибки (rate_limited, timeouts, ...) или имя исключения
+    error: Optional[str] = fields.CharField(max_length=32, null=True)
+
+    # Время вызова, а не вставки пачки
+    created_at = fields.DatetimeField()
+
+    class Meta:
+        table = "llm_usage"
+        indexes = (
+            ("created_at",),
+            ("user_id", "created_at"),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.user_id}:{self.purpose}:{self.model}:{self.prompt_tokens}+{self.completion_tokens}"
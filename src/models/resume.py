@@ -1,6 +1,11 @@
 # src/models/resume.py
+import hashlib
+import json
+from datetime import timedelta
+
 from tortoise.models import Model
 from tortoise import fields
+from tortoise.timezone import now
 
 from src.utils.keywords import build_search_query
 
@@ -22,7 +27,14 @@ class Resume(Model):
     )
     positive_keywords = fields.JSONField(null=True)
     negative_keywords = fields.JSONField(null=True)
+    excluded_employers = fields.JSONField(null=True)  # id или названия работодателей, которых пропускаем
     resume_json = fields.JSONField(null=True)
+    # Снимок для промпта: текст, отрендеренный из resume_json, и хэш JSON, из которого он собран
+    resume_text = fields.TextField(null=True)
+    resume_hash = fields.CharField(max_length=64, null=True)
+    resume_synced_at = fields.DatetimeField(null=True)  # когда resume_json последний раз брали из HH
+    # Компактный профиль для промпта письма (src.services.resume.profile), привязан к resume_hash
+    resume_profile = fields.JSONField(null=True)
     status = fields.CharField(max_length=10, choices=STATUS_CHOICES, default='inactive')
 
     @property
@@ -31,3 +43,23 @@ class Resume(Model):
         Возвращает готовую строку для запроса HH API.
         """
         return build_search_query(self.positive_keywords, self.negative_keywords)
+
+
+    SNAPSHOT_FIELDS = ("resume_json", "resume_text", "resume_hash", "resume_synced_at")
+
+    @staticmethod
+    def json_hash(resume_json: dict) -> str:
+        """
+        Хэш содержимого резюме (sha256 канонического JSON).
+        Нужен, чтобы понять, изменилось ли резюме с момента рендера текста.
+        """
+        canonical = json.dumps(resume_json, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def is_snapshot_stale(self, max_age: timedelta) -> bool:
+        """
+        Нужно ли заново тянуть резюме из HH: снимка нет или он старше max_age.
+        """
+        if self.resume_json is None or self.resume_synced_at is None:
+            return True
+        return now() - self.resume_synced_at > max_age
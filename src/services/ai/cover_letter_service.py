@@ -1,29 +1,281 @@
 # src/services/ai/cover_letter_service.py
 from __future__ import annotations
 
-from typing import List, Dict
+import asyncio
+import json
+import logging
+import re
+from typing import Any, List, Dict, Optional, Tuple
 
-from src.services.ai.prompt_manager import generate_system_prompt, user_prompt
-from src.services.ai.openai_client import chat_complete
+from src.config import config
+from src.services.ai.prompt_manager import (
+    generate_multi_letter_messages, generate_prompt_messages, letter_template, MULTI_PROMPT_VERSION, PROMPT_VERSION,
+)
+from src.services.ai.openai_client import chat_complete, chat_complete_stream
+from src.services.ai.letter_slots import generate_slot_letter
+from src.services.ai.openai_pool import (
+    DEFAULT_MODEL, LLMDeadlineExceeded, ProviderUnavailable, StreamAborted, is_provider_available, llm_call_context,
+)
+from src.services.ai.token_budget import fit_prompt_inputs, fit_resume_text, fit_vacancy_text
+from src.services.vacancy.parser import extract_job_description_from_vacancy
+from src.utils.cache import letter_cache
 
+logger = logging.getLogger(__name__)
 
-async def generate_cover_letter(resume_text: str, vacancy_text: str) -> str:
+# Письмо из группового ответа короче/длиннее — считаем, что модель ошиблась, и пишем его отдельно
+MIN_LETTER_CHARS = 200
+MAX_LETTER_CHARS = 5000
+_PLACEHOLDER_RE = re.compile(r"\{[a-z_]+\}")
+
+# Потоковое письмо: после строки подписи ("С уважением,") и строки с именем письмо закончено
+_SIGN_OFF = letter_template.rstrip().split("\n")[-2].strip()
+_SIGNATURE_RE = re.compile(re.escape(_SIGN_OFF) + r"\s*\n[^\n]*\S[^\n]*(?=\n)")
+# Отказ или рассуждения вместо письма видны по первым словам
+_REFUSAL_PREFIXES = ("извините", "к сожалению", "я не могу", "как ии", "sorry", "i'm sorry", "i cannot", "as an ai")
+_REFUSAL_WINDOW = 40
+_MAX_LINE_REPEATS = 3
+
+
+def letter_stream_check(text: str) -> Optional[int]:
+    """
+    Проверка письма по ходу генерации (см. chat_complete_stream): позиция конца письма,
+    как только за подписью шаблона появилась строка с именем; StreamAborted — письмо
+    уже ясно негодное (отказ, блок кода, незаполненный плейсхолдер, зацикливание, слишком длинное).
+    """
+    if len(text) <= _REFUSAL_WINDOW + 20 and text.lstrip().lower().startswith(_REFUSAL_PREFIXES):
+        raise StreamAborted("refusal")
+    if "```" in text:
+        raise StreamAborted("code_block")
+    if _PLACEHOLDER_RE.search(text):
+        raise StreamAborted("placeholder")
+
+    signature = _SIGNATURE_RE.search(text)
+    if signature is not None:
+        return signature.end()
+    if len(text) > MAX_LETTER_CHARS:
+        raise StreamAborted("too_long")
+
+    # Зацикливание: одна и та же содержательная строка несколько раз (проверяем по завершении строки)
+    if text.endswith("\n"):
+        line = text.rstrip("\n").rsplit("\n", 1)[-1].strip()
+        if len(line) >= 20 and text.count(line) >= _MAX_LINE_REPEATS:
+            raise StreamAborted("repetition")
+    return None
+
+
+def cover_letter_cache_key(
+    resume_text: str,
+    vacancy_text: str,
+    model: str = DEFAULT_MODEL,
+    layout: Optional[str] = None,
+    prompt_version: Optional[str] = None,
+) -> str:
+    """
+    Ключ кэша письма: одинаковые входные данные, модель и версия промпта -> одинаковое письмо.
+    prompt_version — по умолчанию PROMPT_VERSION (одиночные письма), у групповых — MULTI_PROMPT_VERSION.
+    """
+    layout = layout or config.ai.prompt_layout
+    budgets = f"{config.ai.resume_token_budget}/{config.ai.vacancy_token_budget}"
+    return letter_cache.make_key(prompt_version or PROMPT_VERSION, layout, model, budgets, resume_text, vacancy_text)
+
+
+def _normalize_letter(text: str) -> str:
+    """Итоговый вид письма (одиночного и группового): без крайних пробелов, "—" -> "-" (как просит промпт)."""
+    return text.strip().replace("—", "-")
+
+
+def build_letter_messages(resume_text: str, vacancy_text: str) -> List[Dict[str, str]]:
+    """Сообщения для LLM: входные данные ужаты до бюджета токенов, раскладка — config.ai.prompt_layout."""
+    fitted = fit_prompt_inputs(
+        resume_text,
+        vacancy_text,
+        resume_budget=config.ai.resume_token_budget,
+        vacancy_budget=config.ai.vacancy_token_budget,
+    )
+    if fitted.saved:
+        logger.info("[token_budget] saved %d tokens: resume %d->%d, vacancy %d->%d",
+                    fitted.saved, *fitted.resume_tokens, *fitted.vacancy_tokens)
+    return generate_prompt_messages(fitted.resume_text, fitted.vacancy_text, layout=config.ai.prompt_layout)
+
+
+async def generate_cover_letter(
+    resume_text: str,
+    vacancy_text: str,
+    *,
+    model: str = DEFAULT_MODEL,
+    use_cache: bool = True,
+) -> str:
     """
     Бизнес-логика генерации сопроводительного письма:
-    - Формирует system/user промпты
-    - Делегирует вызов LLM в openai_client.chat_complete
+    - Ищет готовое письмо в кэше (повторы после сбоев отклика, перезапуски воркера)
+    - Ужимает резюме и вакансию до бюджета токенов и формирует system/user промпты
+    - Делегирует вызов LLM в openai_client.chat_complete (с config.ai.letter_stream — потоком,
+      с обрывом после подписи; оборванный как негодный ответ один раз запрашивается обычным вызовом)
     - Возвращает финальный текст письма
     """
-    system = generate_system_prompt(resume_text, vacancy_text)
+    key = cover_letter_cache_key(resume_text, vacancy_text, model) if use_cache else None
+    if key is not None:
+        cached = await letter_cache.get(key)
+        if cached is not None:
+            logger.debug("[letter_cache] hit %s", key[:12])
+            return cached
 
-    messages: List[Dict[str, str]] = [
-        {"role": "system", "content": system},
-        {"role": "user", "content": user_prompt},
-    ]
+    messages: List[Dict[str, str]] = build_letter_messages(resume_text, vacancy_text)
 
     # Генерируем
-    text = await chat_complete(
-        messages
+    with llm_call_context(purpose="letter", prompt_version=PROMPT_VERSION):
+        if config.ai.letter_stream:
+            try:
+                text = await chat_complete_stream(messages, check=letter_stream_check, model=model)
+            except StreamAborted as e:
+                logger.info("[letter_stream] aborted (%s) after %d chars, retrying without stream", e.reason, len(e.text))
+                text = await chat_complete(messages, model=model)
+        else:
+            text = await chat_complete(
+                messages,
+                model=model,
+            )
+    text = _normalize_letter(text)
+
+    if key is not None and text:
+        await letter_cache.set(key, text)
+    return text
+
+
+def build_multi_letter_messages(resume_text: str, vacancy_texts: List[str]) -> List[Dict[str, str]]:
+    """Сообщения для писем на несколько вакансий (номера 1..N); резюме и каждая вакансия — в пределах бюджета."""
+    if config.ai.resume_token_budget:
+        resume_text = fit_resume_text(resume_text, config.ai.resume_token_budget)
+    if config.ai.vacancy_token_budget:
+        vacancy_texts = [fit_vacancy_text(text, config.ai.vacancy_token_budget) for text in vacancy_texts]
+    return generate_multi_letter_messages(
+        resume_text, [(str(i), text) for i, text in enumerate(vacancy_texts, 1)]
     )
 
-    return text.strip()
+
+def valid_letter(text: Any) -> Optional[str]:
+    """
+    Письмо, полученное не из generate_cover_letter (групповой ответ, Batch API), в итоговом виде
+    (_normalize_letter) или None, если оно подозрительное: не строка, слишком короткое/длинное,
+    с незаполненными плейсхолдерами.
+    """
+    if not isinstance(text, str):
+        return None
+    text = _normalize_letter(text)
+    if not MIN_LETTER_CHARS <= len(text) <= MAX_LETTER_CHARS or _PLACEHOLDER_RE.search(text):
+        return None
+    return text
+
+
+def parse_multi_letters(answer: str, ids: List[str]) -> Dict[str, str]:
+    """
+    Письма из JSON-ответа на групповой запрос: {"letters": [{"id": ..., "letter": ...}]}
+    (или {"<id>": "<письмо>"}). Неизвестные id, пустые и подозрительные письма отбрасываются.
+    """
+    try:
+        data = json.loads((answer or "").strip().removeprefix("```json").removesuffix("```"))
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    items: List[Tuple[Any, Any]]
+    if isinstance(data.get("letters"), list):
+        items = [(i.get("id"), i.get("letter")) for i in data["letters"] if isinstance(i, dict)]
+    else:
+        items = list(data.items())
+
+    wanted = set(ids)
+    letters: Dict[str, str] = {}
+    for item_id, text in items:
+        item_id = str(item_id).strip()
+        letter = valid_letter(text)
+        if item_id in wanted and item_id not in letters and letter is not None:
+            letters[item_id] = letter
+    return letters
+
+
+async def generate_cover_letters(
+    resume_text: str,
+    vacancy_texts: List[str],
+    *,
+    model: str = DEFAULT_MODEL,
+    use_cache: bool = True,
+) -> List[Optional[str]]:
+    """
+    Письма на несколько вакансий одного резюме: общий префикс (инструкции, шаблон, резюме)
+    уходит в модель один раз, письма возвращаются JSON'ом и проверяются по отдельности.
+    Письма из кэша не запрашиваются; те, что в ответе не нашлись или не прошли проверку
+    (и все — если ответ не разобрался), пишутся отдельными вызовами generate_cover_letter.
+    Групповые письма кэшируются с версией MULTI_PROMPT_VERSION; в кэше ищется и одиночное письмо.
+
+    Returns:
+        list: Письма в порядке vacancy_texts; None — письмо не удалось получить (ошибка в логе)
+    """
+    letters: List[Optional[str]] = [None] * len(vacancy_texts)
+    group_keys: List[Optional[str]] = [None] * len(vacancy_texts)
+    if use_cache:
+        for i, text in enumerate(vacancy_texts):
+            group_keys[i] = cover_letter_cache_key(resume_text, text, model, prompt_version=MULTI_PROMPT_VERSION)
+            for key in (cover_letter_cache_key(resume_text, text, model), group_keys[i]):
+                letters[i] = await letter_cache.get(key)
+                if letters[i] is not None:
+                    break
+
+    todo = [i for i, letter in enumerate(letters) if letter is None]
+    if len(todo) > 1:
+        messages = build_multi_letter_messages(resume_text, [vacancy_texts[i] for i in todo])
+        ids = [str(n) for n in range(1, len(todo) + 1)]
+        try:
+            with llm_call_context(purpose="letter_group", prompt_version=MULTI_PROMPT_VERSION):
+                answer = await chat_complete(messages, model=model, response_format={"type": "json_object"})
+        except (ProviderUnavailable, LLMDeadlineExceeded):
+            raise
+        except Exception:
+            logger.warning("[letter_group] request for %d letters failed, falling back to single calls",
+                           len(todo), exc_info=True)
+            answer = ""
+        parsed = parse_multi_letters(answer, ids)
+        for n, i in zip(ids, todo):
+            if n in parsed:
+                letters[i] = parsed[n]
+                if group_keys[i] is not None:
+                    await letter_cache.set(group_keys[i], parsed[n])
+        logger.info("[letter_group] %d of %d letter(s) from one request", len(parsed), len(todo))
+
+    rest = [i for i, letter in enumerate(letters) if letter is None]
+    if rest:
+        singles = await asyncio.gather(*(
+            generate_cover_letter(resume_text, vacancy_texts[i], model=model, use_cache=use_cache) for i in rest
+        ), return_exceptions=True)
+        for i, letter in zip(rest, singles):
+            if isinstance(letter, BaseException):
+                # Одно неудачное письмо не отменяет остальные
+                logger.warning("[letter_group] single letter %d of %d failed: %r", i + 1, len(vacancy_texts), letter)
+                continue
+            letters[i] = letter or None
+    return letters
+
+
+def can_generate_letters() -> bool:
+    """Письма сейчас можно получить: модель доступна или есть локальный запасной путь (режим "slots")."""
+    if is_provider_available():
+        return True
+    return config.ai.letter_mode == "slots" and config.ai.letter_local_fallback
+
+
+async def generate_letter_for_vacancy(
+    resume_text: str,
+    vacancy: Dict[str, Any],
+    profile: Optional[Dict[str, Any]] = None,
+    *,
+    model: str = DEFAULT_MODEL,
+) -> str:
+    """
+    Письмо на вакансию (JSON из HH) в режиме config.ai.letter_mode.
+    "slots" требует профиль резюме; без него письмо пишется целиком, как в режиме "full".
+    """
+    vacancy_text = extract_job_description_from_vacancy(vacancy)
+    if config.ai.letter_mode == "slots" and profile is not None:
+        return await generate_slot_letter(profile, vacancy, vacancy_text, model=model)
+    return await generate_cover_letter(resume_text, vacancy_text, model=model)
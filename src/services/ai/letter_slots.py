@@ -0,0 +1,248 @@
+# src/services/ai/letter_slots.py
+"""
+Письмо по шаблону с заполнением "механических" плейсхолдеров без модели.
+
+Имя, окончание по полу, должность, компания, зарплата и контакты берутся из профиля
+резюме (src.services.resume.profile) и JSON вакансии. Модель пишет только свободный
+текст — relevant_skills_match, key_expertise, personal_highlights — коротким JSON,
+поэтому выходных токенов и времени на письмо меньше. Если модель недоступна или
+ответ не разобрался, фрагменты собираются локально из навыков и достижений профиля.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from src.config import config
+from src.services.ai.openai_client import chat_complete
+from src.services.ai.openai_pool import DEFAULT_MODEL, llm_call_context
+from src.services.ai.prompt_manager import SLOTS_PROMPT_VERSION, generate_slot_messages, letter_template
+from src.services.ai.token_budget import fit_vacancy_text
+from src.services.resume.profile import render_resume_profile
+from src.utils.cache import letter_cache
+
+logger = logging.getLogger(__name__)
+
+SLOT_NAMES = ("relevant_skills_match", "key_expertise", "personal_highlights")
+# Ответ длиннее — скорее всего модель написала письмо целиком, а не фрагмент
+MAX_SLOT_CHARS = {"relevant_skills_match": 500, "key_expertise": 120, "personal_highlights": 900}
+MAX_HIGHLIGHTS = 4
+
+_CURRENCIES = {
+    "RUR": "рублей", "RUB": "рублей", "USD": "долларов", "EUR": "евро", "KZT": "тенге",
+    "UAH": "гривен", "BYR": "белорусских рублей", "BYN": "белорусских рублей", "UZS": "сумов",
+    "KGS": "сомов", "AZN": "манатов", "GEL": "лари",
+}
+# Мужские имена на -а/-я
+_MALE_NAMES_A = {"никита", "илья", "кузьма", "фома", "лука", "савва", "данила", "гаврила", "миша", "саша", "женя"}
+_CONTACT_METHOD = {"Телефон": "по телефону"}
+# Абзац без значения одного из этих плейсхолдеров выбрасывается целиком
+_OPTIONAL_PARAGRAPH_SLOTS = ("salary", "contact_info", "relevant_skills_match", "personal_highlights")
+
+
+def _salary_text(amount_from: Any, amount_to: Any, currency: Optional[str]) -> str:
+    """Зарплата без разделителей разрядов, валюта по-русски ("от 150000 до 200000 рублей")."""
+    currency_name = _CURRENCIES.get((currency or "RUR").upper(), currency or "")
+    if amount_from and amount_to and amount_from != amount_to:
+        amount = f"от {amount_from} до {amount_to}"
+    else:
+        amount = str(amount_from or amount_to or "")
+    return f"{amount} {currency_name}".strip() if amount else ""
+
+
+def letter_salary(profile: Dict[str, Any], vacancy: Dict[str, Any]) -> str:
+    """Зарплата из вакансии, а если там её нет — ожидания из резюме."""
+    salary = vacancy.get("salary") or {}
+    if salary.get("from") or salary.get("to"):
+        return _salary_text(salary.get("from"), salary.get("to"), salary.get("currency"))
+    # В профиле — "<сумма> <валюта>"
+    amount, _, currency = (profile.get("salary") or "").partition(" ")
+    return _salary_text(amount, None, currency) if amount else ""
+
+
+def gender_ending(profile: Dict[str, Any]) -> str:
+    """Окончание для {gender_ending}: из резюме, иначе по имени."""
+    if profile.get("gender_ending") is not None:
+        return profile["gender_ending"]
+    first_name = (profile.get("name") or "").split(" ", 1)[0].lower()
+    return "а" if first_name.endswith(("а", "я")) and first_name not in _MALE_NAMES_A else ""
+
+
+def _contacts(profile: Dict[str, Any]) -> Dict[str, str]:
+    """Тексты для {contact_methods} и {contact_info} из контактов профиля ("Email: ...", "Телефон: ...")."""
+    emails, others, methods = [], [], []
+    for contact in profile.get("contacts") or []:
+        kind, _, value = contact.partition(": ")
+        if not value:
+            continue
+        if kind == "Email":
+            emails.append(value)
+        else:
+            others.append(value)
+            method = _CONTACT_METHOD.get(kind, f"через {kind}" if kind else "")
+            if method and method not in methods:
+                methods.append(method)
+    info = "\n".join(f"➜ {value}" for value in emails + others)
+    if not emails and methods:
+        # "по электронной почте" в шаблоне уже не подходит — заменяем целиком (см. fill_letter)
+        return {"contact_methods": "", "contact_info": info, "contact_phrase": _join_or(methods)}
+    # "по электронной почте, по телефону или через Telegram"
+    extra = f", {', '.join(methods[:-1])} или {methods[-1]}" if len(methods) > 1 else "".join(f" или {m}" for m in methods)
+    return {"contact_methods": extra, "contact_info": info}
+
+
+def _join_or(items: List[str]) -> str:
+    if len(items) <= 1:
+        return "".join(items)
+    return ", ".join(items[:-1]) + " или " + items[-1]
+
+
+def _join_and(items: List[str]) -> str:
+    if len(items) <= 1:
+        return "".join(items)
+    return ", ".join(items[:-1]) + " и " + items[-1]
+
+
+def _vacancy_words(vacancy: Dict[str, Any], vacancy_text: str) -> str:
+    skills = " ".join(s.get("name", "") for s in vacancy.get("key_skills") or [])
+    return f"{skills}\n{vacancy_text}".lower()
+
+
+def local_slots(profile: Dict[str, Any], vacancy: Dict[str, Any], vacancy_text: str) -> Dict[str, str]:
+    """Свободные фрагменты без модели: совпавшие с вакансией навыки и достижения из профиля."""
+    skills = list(profile.get("key_skills") or [])
+    words = _vacancy_words(vacancy, vacancy_text)
+    matched = [s for s in skills if s and s.lower() in words]
+    top = (matched or skills)[:3]
+
+    if matched:
+        skills_match = f"Мой опыт включает {_join_and(top)} - это как раз то, что требуется в вакансии."
+    elif top:
+        skills_match = f"Мои ключевые навыки - {_join_and(top)}."
+    else:
+        skills_match = ""
+
+    highlights = list(profile.get("highlights") or []) or list(profile.get("recent_roles") or [])
+    return {
+        "relevant_skills_match": skills_match,
+        "key_expertise": _join_and(top) or profile.get("title") or "своей профессии",
+        "personal_highlights": "\n".join(f"- {item}" for item in highlights[:MAX_HIGHLIGHTS]),
+    }
+
+
+def parse_slots(text: str) -> Dict[str, str]:
+    """
+    Фрагменты из JSON-ответа модели. Пустые, слишком длинные и не строки отбрасываются
+    (вызывающий код подставит вместо них локальные).
+    """
+    try:
+        data = json.loads((text or "").strip().removeprefix("```json").removesuffix("```"))
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    slots = {}
+    for name in SLOT_NAMES:
+        value = data.get(name)
+        if isinstance(value, list) and name == "personal_highlights":
+            value = "\n".join(f"- {str(item).lstrip('-• ').strip()}" for item in value if str(item).strip())
+        if not isinstance(value, str):
+            continue
+        value = value.strip().replace("—", "-")
+        if name == "key_expertise":
+            value = value.rstrip(".")
+        if value and len(value) <= MAX_SLOT_CHARS[name]:
+            slots[name] = value
+    return slots
+
+
+def fill_letter(profile: Dict[str, Any], vacancy: Dict[str, Any], slots: Dict[str, str]) -> str:
+    """Подставить в letter_template данные профиля, вакансии и свободные фрагменты."""
+    contacts = _contacts(profile)
+    values = {
+        "candidate_name": profile.get("name") or "",
+        "gender_ending": gender_ending(profile),
+        "position": vacancy.get("name") or "",
+        "company_name": (vacancy.get("employer") or {}).get("name") or "",
+        "salary": letter_salary(profile, vacancy),
+        "contact_methods": contacts["contact_methods"],
+        "contact_info": contacts["contact_info"],
+        **{name: slots.get(name, "") for name in SLOT_NAMES},
+    }
+
+    template = letter_template
+    if "contact_phrase" in contacts:
+        template = template.replace("по электронной почте{contact_methods}", contacts["contact_phrase"])
+    if values["contact_info"]:
+        values["contact_info"] = "\n" + values["contact_info"]
+
+    paragraphs = []
+    for paragraph in template.split("\n\n"):
+        names = re.findall(r"\{(\w+)\}", paragraph)
+        empty = [n for n in names if n in _OPTIONAL_PARAGRAPH_SLOTS and not values.get(n)]
+        if empty == ["contact_info"]:
+            # Нет контактов — убираем только предложение о способах связи
+            paragraph = paragraph.split(" Связаться со мной", 1)[0]
+        elif empty:
+            continue
+        paragraphs.append(paragraph)
+    text = "\n\n".join(paragraphs).format(**values)
+    return "\n".join(line.rstrip() for line in text.split("\n"))
+
+
+def slot_letter_cache_key(profile: Dict[str, Any], vacancy_text: str, model: str) -> str:
+    return letter_cache.make_key(
+        "slots", SLOTS_PROMPT_VERSION, model, profile.get("version") or "", profile.get("resume_hash") or "",
+        str(config.ai.vacancy_token_budget), vacancy_text,
+    )
+
+
+async def generate_slot_letter(
+    profile: Dict[str, Any],
+    vacancy: Dict[str, Any],
+    vacancy_text: str,
+    *,
+    model: str = DEFAULT_MODEL,
+    use_cache: bool = True,
+) -> str:
+    """
+    Письмо в режиме "slots": модель пишет только свободные фрагменты, остальное подставляется
+    из профиля и вакансии. Сбой модели (в т.ч. разомкнутый автомат) — фрагменты собираются
+    локально, если включён config.ai.letter_local_fallback, иначе ошибка пробрасывается.
+    """
+    key = slot_letter_cache_key(profile, vacancy_text, model) if use_cache else None
+    if key is not None:
+        cached = await letter_cache.get(key)
+        if cached is not None:
+            logger.debug("[letter_cache] hit %s", key[:12])
+            return cached
+
+    fallback = local_slots(profile, vacancy, vacancy_text)
+    messages = generate_slot_messages(
+        render_resume_profile(profile),
+        fit_vacancy_text(vacancy_text, config.ai.vacancy_token_budget) if config.ai.vacancy_token_budget else vacancy_text,
+        gender_ending(profile),
+    )
+    try:
+        with llm_call_context(purpose="letter_slots", prompt_version=SLOTS_PROMPT_VERSION):
+            answer = await chat_complete(messages, model=model, response_format={"type": "json_object"})
+    except Exception as e:
+        if not config.ai.letter_local_fallback:
+            raise
+        logger.warning("[letter_slots] LLM failed (%s), using local letter for vacancy_id=%s",
+                       type(e).__name__, vacancy.get("id"))
+        return fill_letter(profile, vacancy, fallback)
+
+    slots = parse_slots(answer)
+    missing = [name for name in SLOT_NAMES if name not in slots]
+    if missing:
+        logger.info("[letter_slots] vacancy_id=%s: local text for %s", vacancy.get("id"), ", ".join(missing))
+    text = fill_letter(profile, vacancy, {**fallback, **slots})
+
+    # Кэшируем только письма, где модель ответила: локальное в следующий раз попробуем улучшить
+    if key is not None and not missing:
+        await letter_cache.set(key, text)
+    return text
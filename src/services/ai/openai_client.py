@@ -11,7 +11,7 @@ from __future__ import annotations
 
 from typing import Dict, List
 
-from src.services.ai.openai_pool import chat_complete_async
+from src.services.ai.openai_pool import StreamCheck, chat_complete_async, chat_complete_stream_async
 
 
 async def chat_complete(messages: List[Dict[str, str]], *, model: str = "gpt-5-mini", **kwargs) -> str:
@@ -22,6 +22,13 @@ async def chat_complete(messages: List[Dict[str, str]], *, model: str = "gpt-5-m
     return await chat_complete_async(messages, model=model, **kwargs)
 
 
+async def chat_complete_stream(
+    messages: List[Dict[str, str]], *, check: StreamCheck, model: str = "gpt-5-mini", **kwargs
+) -> str:
+    """Потоковый вызов Chat Completions с проверкой текста по ходу генерации (см. chat_complete_stream_async)."""
+    return await chat_complete_stream_async(messages, model=model, check=check, **kwargs)
+
+
 
 
 # from typing import Dict, List
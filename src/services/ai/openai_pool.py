@@ -8,21 +8,106 @@ from __future__ import annotations
 - Один фоновый event loop на процесс воркера (thread) → общий пул соединений httpx.
 - Нормализованный proxy (пустые строки → None), современный параметр httpx `proxy=`.
 - Разнесённые таймауты (connect/read/write/pool).
-- Простой backoff для временных ошибок (429/таймаут/сеть/5xx).
+- Backoff с разбросом для временных ошибок (429/таймаут/сеть/5xx): учитывает Retry-After
+  и не выходит за дедлайн вызывающего (llm_deadline).
+- Автомат (circuit breaker): пока провайдер лежит, вызовы сразу падают с ProviderUnavailable.
+- Ограничение одновременных запросов на процесс (семафор) со статистикой ожидания в очереди.
+- Single-flight: одинаковые запросы, уже летящие в API, не дублируются — ждут общий результат.
+- Потоковый вариант (chat_complete_stream_async): текст проверяется по мере генерации,
+  поток обрывается, как только ответ готов или явно не годится — меньше выходных токенов.
+- Хеджирование (по желанию): запрос дольше выученного перцентиля задержки дублируется,
+  берётся ответ, пришедший первым, второй отменяется; доля хеджей ограничена.
+- Несколько бэкендов (ключ/endpoint/прокси) с весами: выбор с учётом здоровья,
+  временное исключение бэкенда после серии 429/5xx/таймаутов, статистика по каждому.
+- Запись о каждом вызове (токены, задержка, ретраи, атрибуция из llm_call_context)
+  уходит подписчикам add_call_listener — например, в журнал расходов (usage_ledger).
 """
 
 import asyncio
-import threading
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from email.utils import parsedate_to_datetime
+from types import SimpleNamespace
+from typing import Optional, List, Dict, Any, Awaitable, Callable, Deque, Iterator, Tuple
 
 import httpx
 from openai import AsyncOpenAI
 from openai import APITimeoutError, RateLimitError, APIConnectionError, APIError
 
+from src.services.ai.token_budget import count_tokens
+from src.utils.loop_thread import LoopThread
+from src.utils.run_stats import Counters, count, current_run_stats, with_run_stats
+
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_MODEL = "gpt-5-mini"
 
+# Ретраи: попыток всего, база и потолок экспоненты (full jitter), потолок Retry-After
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+MAX_RETRY_AFTER = 60.0
+# Меньше этого до дедлайна — новую попытку не начинаем
+MIN_ATTEMPT_SECONDS = 1.0
+
+
+class ProviderUnavailable(RuntimeError):
+    """Провайдер LLM недоступен (автомат разомкнут) — запрос не отправлялся."""
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """
+    До дедлайна llm_deadline() вызов (или следующая попытка) не успевает. Работа не сделана,
+    а не провалена: вызывающий должен отложить её до следующего запуска, а не считать ошибкой.
+    """
+
+
+class StreamAborted(RuntimeError):
+    """
+    Потоковый ответ оборван проверкой (check) как негодный; reason — причина для логов.
+    text — полученный до обрыва текст (заполняется пулом).
+    """
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.text = ""
+        self.usage: Any = None
+
+
+# Проверка потокового ответа: получает весь текст на данный момент; None — продолжать,
+# число — ответ готов, обрезать по этой позиции; StreamAborted — ответ негодный
+StreamCheck = Callable[[str], Optional[int]]
+
+
+@dataclass(frozen=True)
+class OpenAIBackendSettings:
+    """Один бэкенд пула: ключ, endpoint и прокси.
+    Attributes:
+        name: Имя для логов и статистики.
+        api_key: API-ключ.
+        base_url: Endpoint API (None — api.openai.com).
+        proxy_url: URL прокси (или None).
+        weight: Доля запросов относительно других бэкендов (при равном здоровье).
+    """
+    name: str
+    api_key: str
+    base_url: Optional[str] = None
+    proxy_url: Optional[str] = None
+    weight: float = 1.0
+
 
 @dataclass(frozen=True)
 class OpenAISettings:
@@ -34,6 +119,20 @@ class OpenAISettings:
         read_timeout: Таймаут ожидания ответа (сек).
         pool_timeout: Таймаут ожидания свободного соединения из пула (сек).
         http2: Включать ли HTTP/2.
+        max_concurrency: Сколько запросов к API одновременно на процесс (остальные ждут в очереди).
+        backends: Бэкенды пула; если пусто — один бэкенд из api_key/proxy_url.
+            Первый бэкенд — основной: через него идёт Batch API.
+        eject_after: После скольких ошибок подряд бэкенд временно исключается.
+        eject_seconds: На сколько исключается в первый раз (дальше — вдвое дольше, до max_eject_seconds).
+        max_eject_seconds: Верхняя граница исключения.
+        breaker_threshold: После скольких неудачных попыток подряд (5xx/таймауты/сеть на всех
+            бэкендах) автомат размыкается.
+        breaker_open_seconds: Сколько автомат разомкнут до пробного запроса.
+        hedge_percentile: Перцентиль задержки (по последним успешным запросам того же назначения),
+            после которого запрос дублируется; 0 — без хеджирования.
+        hedge_min_delay: Раньше этого (сек) запрос не дублируется, даже если перцентиль меньше.
+        hedge_max_ratio: Максимальная доля хеджей от запросов к API.
+        hedge_min_samples: Сколько замеров нужно, прежде чем хеджировать.
     """
     api_key: str
     proxy_url: Optional[str] = None
@@ -41,70 +140,438 @@ class OpenAISettings:
     read_timeout: float = 60.0
     pool_timeout: float = 60.0
     http2: bool = True
+    max_concurrency: int = 8
+    backends: Tuple[OpenAIBackendSettings, ...] = ()
+    eject_after: int = 3
+    eject_seconds: float = 30.0
+    max_eject_seconds: float = 300.0
+    breaker_threshold: int = 5
+    breaker_open_seconds: float = 30.0
+    hedge_percentile: float = 0.0
+    hedge_min_delay: float = 3.0
+    hedge_max_ratio: float = 0.05
+    hedge_min_samples: int = 20
 
+    def backend_list(self) -> Tuple[OpenAIBackendSettings, ...]:
+        if self.backends:
+            return self.backends
+        return (OpenAIBackendSettings(name="default", api_key=self.api_key, proxy_url=self.proxy_url),)
 
-class _LoopThread:
-    """Фоновый asyncio-цикл в отдельном потоке.
 
-    Нужен, чтобы переиспользовать асинхронные httpx/AsyncOpenAI клиенты
-    между задачами Celery, не создавая новый event loop каждый раз.
-    """
-    def __init__(self) -> None:
-        self._loop: Optional[asyncio.AbstractEventLoop] = None
-        self._thread: Optional[threading.Thread] = None
-        self._ready = threading.Event()
+@dataclass
+class UsageStats(Counters):
+    """Счётчики токенов по ответам API (на процесс)."""
+    calls: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0      # часть prompt_tokens, взятая из кэша префикса провайдера
+    completion_tokens: int = 0
+
+    @property
+    def cached_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+@dataclass
+class PoolStats(Counters):
+    """Очередь к API на процесс: сколько запросов ждали слота и сколько склеено single-flight'ом."""
+    requests: int = 0           # попыток запроса к API (включая ретраи)
+    queued: int = 0             # из них ждали свободного слота
+    wait_seconds: float = 0.0   # суммарное ожидание слота
+    coalesced: int = 0          # вызовов, получивших результат уже летящего одинакового запроса
+    hedged: int = 0             # запросов, продублированных из-за долгого ответа
+    hedge_wins: int = 0         # из них дубль ответил первым
+
+    @property
+    def avg_wait(self) -> float:
+        return self.wait_seconds / self.requests if self.requests else 0.0
+
+
+@dataclass
+class BackendStats(Counters):
+    """Счётчики по одному бэкенду пула."""
+    requests: int = 0
+    successes: int = 0
+    rate_limited: int = 0       # 429
+    server_errors: int = 0      # 5xx
+    timeouts: int = 0
+    connection_errors: int = 0
+    auth_errors: int = 0        # 401/403 — ключ не работает
+    ejections: int = 0
+    latency_seconds: float = 0.0  # суммарно по успешным запросам
+
+    @property
+    def avg_latency(self) -> float:
+        return self.latency_seconds / self.successes if self.successes else 0.0
+
+
+usage_stats = UsageStats()
+pool_stats = PoolStats()
+
+# Группы счётчиков в статистике прогона (src.utils.run_stats): тот же состав, что у счётчиков процесса
+USAGE_STATS = "openai_usage"
+POOL_STATS = "openai_pool"
+BACKEND_STATS_PREFIX = "openai_backend:"
+
+
+class _Limiter:
+    """Семафор на одновременные запросы к API с учётом ожидания в pool_stats."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._sem = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def __aenter__(self) -> None:
+        count(POOL_STATS, pool_stats, "requests")
+        if self._sem.locked():
+            count(POOL_STATS, pool_stats, "queued")
+            t0 = time.perf_counter()
+            await self._sem.acquire()
+            waited = time.perf_counter() - t0
+            count(POOL_STATS, pool_stats, "wait_seconds", waited)
+            if waited > 1.0:
+                logger.debug("[openai] waited %.1fs for a slot (limit=%d)", waited, self.limit)
+        else:
+            await self._sem.acquire()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.release()
+
+    async def try_acquire(self) -> bool:
+        """Занять слот, только если он свободен прямо сейчас (для хеджа — в очередь не встаём)."""
+        if self._sem.locked():
+            return False
+        # Свободный семафор отдаёт слот без ожидания
+        await self._sem.acquire()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._sem.release()
+
+
+class _LatencyTracker:
+    """Задержки последних успешных запросов (по назначению вызова) для порога хеджирования."""
+
+    def __init__(self, window: int = 200) -> None:
+        self.window = window
+        self._samples: Dict[Any, Deque[float]] = {}
+
+    def record(self, key: Any, seconds: float) -> None:
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, key: Any, q: float, min_samples: int) -> Optional[float]:
+        """Перцентиль q (0..100) или None, пока замеров меньше min_samples."""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+@dataclass
+class LLMCall:
+    """Один вызов Chat Completions (со всеми ретраями) — для журнала расходов."""
+    model: str
+    context: Dict[str, Any] = field(default_factory=dict)   # атрибуция из llm_call_context
+    ok: bool = False
+    error: Optional[str] = None     # вид ошибки (_failure_kind) или имя исключения
+    backend: Optional[str] = None   # бэкенд последней попытки
+    attempts: int = 0
+    latency: Optional[float] = None  # сек, от первой попытки до результата с паузами; None — Batch API
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+    finished_at: float = field(default_factory=time.time)
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.attempts - 1)
+
+
+_call_listeners: List[Callable[[LLMCall], None]] = []
+
+
+def add_call_listener(listener: Callable[[LLMCall], None]) -> None:
+    """Подписаться на записи о вызовах (вызывается в цикле клиентов, должен быть быстрым)."""
+    if listener not in _call_listeners:
+        _call_listeners.append(listener)
+
+
+def remove_call_listener(listener: Callable[[LLMCall], None]) -> None:
+    if listener in _call_listeners:
+        _call_listeners.remove(listener)
 
-    def start(self) -> None:
-        if self._thread and self._thread.is_alive():
-            return
 
-        def _runner() -> None:
-            self._loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self._loop)
-            self._ready.set()
-            self._loop.run_forever()
-            # Аккуратно завершаем все таски перед закрытием цикла
-            pending = asyncio.all_tasks(loop=self._loop)
-            for t in pending:
-                t.cancel()
-            if pending:
-                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-            self._loop.close()
-
-        self._thread = threading.Thread(target=_runner, name="openai-loop", daemon=True)
-        self._thread.start()
-        self._ready.wait(timeout=5)
-
-    def stop(self) -> None:
-        if not self._loop:
+def _emit_call(call: LLMCall) -> None:
+    for listener in list(_call_listeners):
+        try:
+            listener(call)
+        except Exception:
+            # Телеметрия не должна ломать генерацию
+            logger.warning("[openai] call listener %r failed", listener, exc_info=True)
+
+
+def _record_usage(resp: Any, model: str) -> Tuple[int, int, int]:
+    """Учесть токены ответа в usage_stats; возвращает (prompt, cached, completion)."""
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return 0, 0, 0
+    prompt = usage.prompt_tokens or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+    completion = usage.completion_tokens or 0
+
+    count(USAGE_STATS, usage_stats, "calls")
+    count(USAGE_STATS, usage_stats, "prompt_tokens", prompt)
+    count(USAGE_STATS, usage_stats, "cached_tokens", cached)
+    count(USAGE_STATS, usage_stats, "completion_tokens", completion)
+    logger.debug("[openai] %s: prompt=%d (cached=%d), completion=%d", model, prompt, cached, completion)
+    return prompt, cached, completion
+
+
+_loop = LoopThread(name="openai-loop")
+
+
+def _failure_kind(err: BaseException) -> Optional[str]:
+    """Поле BackendStats для ошибки, говорящей о нездоровье бэкенда, или None."""
+    if isinstance(err, RateLimitError):
+        return "rate_limited"
+    if isinstance(err, APITimeoutError):
+        return "timeouts"
+    if isinstance(err, APIConnectionError):
+        return "connection_errors"
+    if isinstance(err, APIError):
+        status = getattr(err, "status_code", 0) or 0
+        if 500 <= status < 600:
+            return "server_errors"
+        if status in (401, 403):
+            return "auth_errors"
+    # Прочие 4xx — проблема запроса, а не бэкенда
+    return None
+
+
+class _Backend:
+    """Бэкенд пула: свои httpx/AsyncOpenAI клиенты, здоровье и статистика."""
+
+    # Здоровье — скользящая доля успешных запросов (1.0 — всё хорошо)
+    HEALTH_ALPHA = 0.2
+    MIN_HEALTH = 0.05
+
+    def __init__(self, settings: OpenAIBackendSettings, http: httpx.AsyncClient, ai: AsyncOpenAI) -> None:
+        self.settings = settings
+        self.name = settings.name
+        self.http = http
+        self.ai = ai
+        self.stats = BackendStats()
+        self.health = 1.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self._eject_for = 0.0
+
+    def is_available(self, now_: float) -> bool:
+        return self.ejected_until <= now_
+
+    @property
+    def score(self) -> float:
+        return self.settings.weight * max(self.health, self.MIN_HEALTH)
+
+    def _count(self, field: str, value: float = 1) -> None:
+        count(BACKEND_STATS_PREFIX + self.name, self.stats, field, value)
+
+    def record_success(self, latency: float) -> None:
+        self._count("successes")
+        self._count("latency_seconds", latency)
+        self.health += self.HEALTH_ALPHA * (1.0 - self.health)
+        self.consecutive_failures = 0
+        self._eject_for = 0.0
+
+    def record_failure(self, kind: str, cfg: OpenAISettings) -> None:
+        self._count(kind)
+        self.health -= self.HEALTH_ALPHA * self.health
+        if not self.is_available(time.monotonic()):
+            # Ответ на запрос, начатый до исключения, — исключение не продлеваем
             return
-        self._loop.call_soon_threadsafe(self._loop.stop)
-        if self._thread:
-            self._thread.join(timeout=10)
+        self.consecutive_failures += 1
+        # Нерабочий ключ исключаем сразу
+        if self.consecutive_failures >= cfg.eject_after or kind == "auth_errors":
+            self._eject_for = min(max(self._eject_for * 2, cfg.eject_seconds), cfg.max_eject_seconds)
+            self.ejected_until = time.monotonic() + self._eject_for
+            self.consecutive_failures = 0
+            self._count("ejections")
+            logger.warning("[openai] backend %s ejected for %.0fs (last error: %s, health=%.2f)",
+                           self.name, self._eject_for, kind, self.health)
+
+
+def _pick_backend(avoid: Optional[_Backend] = None) -> _Backend:
+    """
+    Взвешенный случайный выбор среди доступных бэкендов (вес × здоровье).
+    avoid — бэкенд, на котором только что была ошибка: на ретрае берём другой, если есть.
+    Если исключены все — берём тот, что вернётся раньше остальных.
+    """
+    backends = _clients.backends
+    now_ = time.monotonic()
+    candidates = [b for b in backends if b.is_available(now_) and b is not avoid]
+    if not candidates:
+        candidates = [b for b in backends if b.is_available(now_)]
+    if not candidates:
+        return min(backends, key=lambda b: b.ejected_until)
+    if len(candidates) == 1:
+        return candidates[0]
+    return random.choices(candidates, weights=[b.score for b in candidates])[0]
+
+
+class _CircuitBreaker:
+    """
+    Автомат на процесс. Замкнут — запросы идут; после threshold неудачных попыток подряд
+    размыкается на open_seconds (вызовы сразу получают ProviderUnavailable); затем
+    пропускает один пробный запрос: успех замыкает автомат, ошибка — снова размыкает.
+    """
+
+    def __init__(self, threshold: int, open_seconds: float) -> None:
+        self.threshold = threshold
+        self.open_seconds = open_seconds
+        self.failures = 0
+        self.opened_until = 0.0     # 0 — замкнут
+        self.probing = False
+        self.opens = 0
+
+    def available(self) -> bool:
+        """Можно ли сейчас отправлять запросы (замкнут или пора пробовать)."""
+        return self.opened_until == 0.0 or (time.monotonic() >= self.opened_until and not self.probing)
 
-    def submit(self, coro: "asyncio.Future[Any] | asyncio.coroutines") -> Any:
-        """Выполнить корутину в фоновом цикле и дождаться результата (блокирующе)."""
-        if not self._loop:
-            raise RuntimeError("Loop is not started")
-        fut = asyncio.run_coroutine_threadsafe(coro, self._loop)
-        return fut.result()
+    def acquire(self) -> bool:
+        """Разрешение на попытку. True — это пробный запрос (его исход нужно сообщить)."""
+        if self.opened_until == 0.0:
+            return False
+        if not self.available():
+            raise ProviderUnavailable(f"LLM provider unavailable for {self.opened_until - time.monotonic():.0f}s more")
+        self.probing = True
+        return True
 
-    def submit_future(self, coro: "asyncio.Future[Any] | asyncio.coroutines"):
-        """Выполнить корутину в фоновом цикле и вернуть concurrent.futures.Future.
-        Это позволяет await'ить её из другого asyncio-цикла через asyncio.wrap_future().
-        """
-        if not self._loop:
-            raise RuntimeError("Loop is not started")
-        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+    def release_probe(self) -> None:
+        """Пробный запрос завершился без вердикта (отмена, ошибка запроса)."""
+        self.probing = False
+
+    def record_success(self) -> None:
+        if self.opened_until:
+            logger.info("[openai] circuit closed")
+        self.failures = 0
+        self.opened_until = 0.0
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            self.opened_until = time.monotonic() + self.open_seconds
+            self.failures = 0
+            self.probing = False
+            self.opens += 1
+            logger.warning("[openai] circuit opened for %.0fs", self.open_seconds)
+
+
+def is_provider_available() -> bool:
+    """False — автомат разомкнут: генерацию писем лучше отложить."""
+    breaker = _clients.breaker
+    return breaker is None or breaker.available()
+
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+@contextmanager
+def llm_deadline(deadline: Optional[float]) -> Iterator[None]:
+    """Дедлайн (time.monotonic) для вызовов LLM внутри блока: ретраи и таймауты в него укладываются."""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def llm_deadline_exceeded() -> bool:
+    """Дедлайн llm_deadline() текущего контекста наступил: новый вызов LLM уже не успеет."""
+    deadline = _deadline.get()
+    return deadline is not None and deadline - time.monotonic() < MIN_ATTEMPT_SECONDS
+
+
+_call_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("llm_call_context", default={})
+
+
+@contextmanager
+def llm_call_context(**attrs: Any) -> Iterator[None]:
+    """
+    Атрибуция вызовов LLM внутри блока (user_id, resume_id, purpose, prompt_version) для журнала
+    расходов. Вложенные блоки дополняют внешние.
+    """
+    token = _call_context.set({**_call_context.get(), **attrs})
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def _retry_after(err: BaseException) -> Optional[float]:
+    """Сколько сервер просит подождать (заголовки retry-after-ms / Retry-After), сек."""
+    headers = getattr(getattr(err, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_delay(attempt: int, err: BaseException) -> float:
+    """
+    Пауза перед следующей попыткой. Есть Retry-After — ждём сколько просят (с небольшим
+    разбросом), иначе full jitter: случайно от 0 до base * 2^attempt, чтобы воркеры не ретраили строем.
+    """
+    retry_after = _retry_after(err)
+    if retry_after is not None:
+        return min(retry_after, MAX_RETRY_AFTER) + random.uniform(0, BACKOFF_BASE)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
 
 
-_loop = _LoopThread()
+def backend_stats() -> Dict[str, BackendStats]:
+    """Статистика по бэкендам пула (снимок)."""
+    return {b.name: b.stats.copy() for b in _clients.backends}
 
 
 class _Clients:
     """Хранилище долгоживущих клиентов (на процесс)."""
+    # Клиенты основного (первого) бэкенда: Batch API и прямые вызовы
     http: Optional[httpx.AsyncClient] = None
     ai: Optional[AsyncOpenAI] = None
+    loop: Optional[asyncio.AbstractEventLoop] = None  # цикл, к которому привязаны клиенты
+    settings: Optional[OpenAISettings] = None
+    backends: List[_Backend] = []
+    limiter: Optional[_Limiter] = None
+    breaker: Optional[_CircuitBreaker] = None
+    latency: Optional[_LatencyTracker] = None
+    # single-flight: ключ запроса -> (задача, число ожидающих её вызовов)
+    inflight: Dict[str, List[Any]] = {}
 
 
 _clients = _Clients()
@@ -118,9 +585,7 @@ def _normalize_proxy(url: Optional[str]) -> Optional[str]:
 
 
 async def _ainit_clients(cfg: OpenAISettings) -> None:
-    """Асинхронная инициализация httpx и OpenAI-клиента внутри фонового цикла."""
-    proxy = _normalize_proxy(cfg.proxy_url)
-
+    """Асинхронная инициализация httpx и OpenAI-клиентов (по одному на бэкенд) внутри фонового цикла."""
     timeout = httpx.Timeout(
         # По умолчанию общий таймаут None (без лимита), задаём по фазам:
         None,
@@ -130,25 +595,46 @@ async def _ainit_clients(cfg: OpenAISettings) -> None:
         pool=cfg.pool_timeout,
     )
 
-    http = httpx.AsyncClient(
-        http2=cfg.http2,
-        timeout=timeout,
-        proxy=proxy,  # NB: в httpx 0.27+ используем 'proxy=', а не 'proxies='
-    )
-    ai = AsyncOpenAI(api_key=cfg.api_key, http_client=http)
+    backends = []
+    for backend_cfg in cfg.backend_list():
+        http = httpx.AsyncClient(
+            http2=cfg.http2,
+            timeout=timeout,
+            proxy=_normalize_proxy(backend_cfg.proxy_url),  # NB: в httpx 0.27+ используем 'proxy=', а не 'proxies='
+        )
+        ai = AsyncOpenAI(api_key=backend_cfg.api_key, base_url=backend_cfg.base_url or None, http_client=http)
+        backends.append(_Backend(backend_cfg, http, ai))
 
-    _clients.http = http
-    _clients.ai = ai
+    _clients.backends = backends
+    _clients.http = backends[0].http
+    _clients.ai = backends[0].ai
+    _clients.settings = cfg
+    _clients.loop = asyncio.get_running_loop()
+    _clients.limiter = _Limiter(max(1, cfg.max_concurrency))
+    _clients.breaker = _CircuitBreaker(max(1, cfg.breaker_threshold), cfg.breaker_open_seconds)
+    _clients.latency = _LatencyTracker()
+    _clients.inflight = {}
+    if len(backends) > 1:
+        logger.info("[openai] %d backends: %s", len(backends),
+                    ", ".join(f"{b.name} (weight={b.settings.weight:g})" for b in backends))
 
 
 async def _aclose_clients() -> None:
     """Аккуратно закрываем клиентов (внутри фонового цикла)."""
-    if _clients.http:
+    backends, _clients.backends = _clients.backends, []
+    for backend in backends:
         try:
-            await _clients.http.aclose()
-        finally:
-            _clients.http = None
+            await backend.http.aclose()
+        except Exception:
+            logger.warning("[openai] closing backend %s failed", backend.name, exc_info=True)
+    _clients.http = None
     _clients.ai = None
+    _clients.settings = None
+    _clients.loop = None
+    _clients.limiter = None
+    _clients.breaker = None
+    _clients.latency = None
+    _clients.inflight = {}
 
 
 def setup(settings: OpenAISettings) -> None:
@@ -165,40 +651,313 @@ def teardown() -> None:
         _loop.stop()
 
 
+async def asetup(settings: OpenAISettings) -> None:
+    """
+    Инициализация клиентов в текущем (долгоживущем) цикле вместо отдельного потока.
+    Вызовы из этого цикла идут напрямую, без пересылки между потоками.
+    """
+    await _ainit_clients(settings)
+
+
+async def ateardown() -> None:
+    """Закрыть клиентов, поднятых через asetup (в том же цикле)."""
+    await _aclose_clients()
+
+
+def _request_key(messages: List[Dict[str, str]], model: str, kwargs: Dict[str, Any]) -> str:
+    payload = json.dumps([model, messages, kwargs], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 async def _achat_complete(
     messages: List[Dict[str, str]],
     model: str = DEFAULT_MODEL,
+    deadline: Optional[float] = None,
+    call_context: Optional[Dict[str, Any]] = None,
+    stream_check: Optional[StreamCheck] = None,
+    **kwargs: Any,
+) -> str:
+    """
+    Chat Completions с single-flight: одинаковый запрос (модель, сообщения, параметры),
+    уже выполняющийся в процессе, второй раз не отправляется — вызовы ждут общий результат
+    (в пределах дедлайна того вызова, который запрос начал; токены и попытки тоже
+    попадают в статистику его прогона).
+    Отмена одного вызова не отменяет запрос, пока его ждут другие.
+    """
+    if not _clients.backends:
+        raise RuntimeError("OpenAI client is not initialized")
+    if not is_provider_available():
+        raise ProviderUnavailable("LLM provider unavailable (circuit open)")
+
+    # Потоковый запрос с другой проверкой — другой результат
+    key = _request_key(messages, model, {**kwargs, "_stream_check": stream_check.__qualname__} if stream_check else kwargs)
+    entry = _clients.inflight.get(key)
+    if entry is None:
+        task = asyncio.get_running_loop().create_task(_achat_complete_once(
+            messages, model=model, deadline=deadline, call_context=call_context, stream_check=stream_check, **kwargs
+        ))
+        entry = [task, 0]
+        _clients.inflight[key] = entry
+        inflight = _clients.inflight
+        task.add_done_callback(lambda _t: inflight.pop(key, None) if inflight.get(key) is entry else None)
+    else:
+        count(POOL_STATS, pool_stats, "coalesced")
+
+    task = entry[0]
+    entry[1] += 1
+    try:
+        return await asyncio.shield(task)
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0 and not task.done():
+            # Результат больше никому не нужен
+            task.cancel()
+
+
+async def _achat_complete_once(
+    messages: List[Dict[str, str]],
+    model: str = DEFAULT_MODEL,
+    deadline: Optional[float] = None,
+    call_context: Optional[Dict[str, Any]] = None,
+    stream_check: Optional[StreamCheck] = None,
+    **kwargs: Any,
+) -> str:
+    """Вызов с ретраями (_achat_attempts) и записью о нём для подписчиков add_call_listener."""
+    call = LLMCall(model=model, context=dict(call_context or {}))
+    t0 = time.perf_counter()
+    try:
+        text = await _achat_attempts(messages, model, deadline, call, stream_check, **kwargs)
+    except asyncio.CancelledError:
+        # Результат никому не нужен — запись не делаем
+        raise
+    except Exception as e:
+        call.error = _failure_kind(e) or type(e).__name__
+        raise
+    else:
+        call.ok = True
+        return text
+    finally:
+        if call.ok or call.error:
+            call.latency = time.perf_counter() - t0
+            call.finished_at = time.time()
+            _emit_call(call)
+
+
+async def _send_stream(
+    backend: _Backend,
+    messages: List[Dict[str, str]],
+    model: str,
+    latency_key: Any,
+    check: StreamCheck,
+    **kwargs: Any,
+) -> Any:
+    """
+    Потоковый запрос к бэкенду: текст копится по мере генерации и после каждого фрагмента
+    проходит check. Когда ответ готов (или негоден), поток закрывается — генерация
+    на стороне провайдера прекращается. Возвращает объект в форме обычного ответа.
+    """
+    backend._count("requests")
+    t0 = time.perf_counter()
+    text = ""
+    usage = None
+
+    def _estimated_usage() -> Any:
+        # Поток оборван до итоговой статистики — оцениваем по тексту
+        return SimpleNamespace(
+            prompt_tokens=sum(count_tokens(m.get("content") or "") for m in messages),
+            completion_tokens=count_tokens(text),
+            prompt_tokens_details=None,
+        )
+
+    try:
+        stream = await backend.ai.chat.completions.create(
+            model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                text += delta
+                cut = check(text)
+                if cut is not None:
+                    text = text[:cut]
+                    break
+        finally:
+            await stream.close()
+    except StreamAborted as e:
+        # Бэкенд ответил исправно, негоден сам текст
+        backend.record_success(time.perf_counter() - t0)
+        e.text, e.usage = text, usage or _estimated_usage()
+        raise
+    except (RateLimitError, APITimeoutError, APIConnectionError, APIError) as e:
+        kind = _failure_kind(e)
+        if kind is not None:
+            backend.record_failure(kind, _clients.settings)
+        raise
+    backend.record_success(time.perf_counter() - t0)
+    if usage is None:
+        usage = _estimated_usage()
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=usage)
+
+
+async def _send(
+    backend: _Backend, messages: List[Dict[str, str]], model: str, latency_key: Any, **kwargs: Any
+) -> Any:
+    """Один запрос к бэкенду с учётом в его статистике и здоровье."""
+    backend._count("requests")
+    t0 = time.perf_counter()
+    try:
+        resp = await backend.ai.chat.completions.create(model=model, messages=messages, **kwargs)
+    except (RateLimitError, APITimeoutError, APIConnectionError, APIError) as e:
+        kind = _failure_kind(e)
+        if kind is not None:
+            backend.record_failure(kind, _clients.settings)
+        raise
+    latency = time.perf_counter() - t0
+    backend.record_success(latency)
+    if _clients.latency is not None:
+        _clients.latency.record(latency_key, latency)
+    return resp
+
+
+def _hedge_delay(cfg: OpenAISettings, latency_key: Any) -> Optional[float]:
+    """Через сколько секунд дублировать запрос, или None — не дублировать."""
+    if cfg.hedge_percentile <= 0 or _clients.latency is None:
+        return None
+    if pool_stats.hedged >= cfg.hedge_max_ratio * pool_stats.requests:
+        return None
+    threshold = _clients.latency.percentile(latency_key, cfg.hedge_percentile, cfg.hedge_min_samples)
+    if threshold is None:
+        return None
+    return max(cfg.hedge_min_delay, threshold)
+
+
+async def _send_hedged(
+    backend: _Backend, messages: List[Dict[str, str]], model: str, latency_key: Any, **kwargs: Any
+) -> Any:
+    """
+    Запрос с хеджированием: если ответа нет дольше порога (_hedge_delay), тот же запрос уходит
+    ещё раз (по возможности на другой бэкенд, только при свободном слоте лимитера). Берётся
+    первый успешный ответ, оставшийся запрос отменяется; если упали оба — ошибка первого.
+    """
+    delay = _hedge_delay(_clients.settings, latency_key)
+    if delay is None:
+        return await _send(backend, messages, model, latency_key, **kwargs)
+
+    primary = asyncio.ensure_future(_send(backend, messages, model, latency_key, **kwargs))
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not await _clients.limiter.try_acquire():
+            return await primary
+    except BaseException:
+        primary.cancel()
+        raise
+
+    count(POOL_STATS, pool_stats, "hedged")
+    other = _pick_backend(avoid=backend)
+    logger.debug("[openai] hedging after %.1fs: %s -> %s", delay, backend.name, other.name)
+    hedge = asyncio.ensure_future(_send(other, messages, model, latency_key, **kwargs))
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        count(POOL_STATS, pool_stats, "hedge_wins")
+                    return task.result()
+        raise primary.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+        # Ошибку дубля, если она не пробрасывается, забираем, чтобы asyncio не ругался
+        if hedge.done() and not hedge.cancelled():
+            hedge.exception()
+        _clients.limiter.release()
+
+
+async def _achat_attempts(
+    messages: List[Dict[str, str]],
+    model: str,
+    deadline: Optional[float],
+    call: LLMCall,
+    stream_check: Optional[StreamCheck] = None,
     **kwargs: Any,
 ) -> str:
-    """Асинхронный вызов Chat Completions в фоновом цикле с ретраями."""
-    if not _clients.ai:
+    """
+    Асинхронный вызов Chat Completions в фоновом цикле с ретраями.
+    Бэкенд выбирается на каждую попытку (ретрай — по возможности на другом), слот лимитера — тоже.
+    Со stream_check запрос потоковый (_send_stream, без хеджирования); StreamAborted не ретраится.
+    С дедлайном (time.monotonic) таймаут запроса и паузы между попытками в него укладываются:
+    если следующая попытка не успевает, сразу пробрасывается LLMDeadlineExceeded (причина — в __cause__).
+    """
+    cfg, limiter, breaker = _clients.settings, _clients.limiter, _clients.breaker
+    if not _clients.backends or cfg is None or limiter is None or breaker is None:
         raise RuntimeError("OpenAI client is not initialized")
 
-    # Небольшой экспоненциальный backoff
-    delays = (0.5, 1.0, 2.0, 4.0)
     last_err: Optional[BaseException] = None
+    backend: Optional[_Backend] = None
 
-    for delay in (*delays, None):
+    for attempt in range(MAX_ATTEMPTS):
+        if deadline is not None and deadline - time.monotonic() < MIN_ATTEMPT_SECONDS:
+            raise LLMDeadlineExceeded("LLM call deadline exceeded") from last_err
+        probe = breaker.acquire()
+        verdict = False
         try:
-            resp = await _clients.ai.chat.completions.create(
-                model=model,
-                messages=messages,
-                **kwargs,
-            )
+            async with limiter:
+                request_kwargs = kwargs
+                if deadline is not None:
+                    # Запрос не должен пережить дедлайн (учитываем и время ожидания слота)
+                    remaining = max(MIN_ATTEMPT_SECONDS, deadline - time.monotonic())
+                    request_kwargs = {**kwargs, "timeout": min(remaining, kwargs.get("timeout") or remaining)}
+                # Выбираем уже получив слот: пока ждали, бэкенд могли исключить
+                backend = _pick_backend(avoid=backend if last_err is not None else None)
+                call.attempts, call.backend = attempt + 1, backend.name
+                latency_key = (model, call.context.get("purpose"))
+                if stream_check is not None:
+                    resp = await _send_stream(backend, messages, model, latency_key, stream_check, **request_kwargs)
+                else:
+                    # Пробный запрос автомата не дублируем
+                    send = _send if probe else _send_hedged
+                    resp = await send(backend, messages, model, latency_key, **request_kwargs)
+            breaker.record_success()
+            verdict = True
+            call.prompt_tokens, call.cached_tokens, call.completion_tokens = _record_usage(resp, model)
             return resp.choices[0].message.content
-        except (RateLimitError, APITimeoutError, APIConnectionError) as e:
-            last_err = e
-            if delay is None:
+        except StreamAborted as e:
+            # Провайдер исправен; токены до обрыва всё равно оплачены
+            breaker.record_success()
+            verdict = True
+            call.prompt_tokens, call.cached_tokens, call.completion_tokens = _record_usage(e, model)
+            raise
+        except (RateLimitError, APITimeoutError, APIConnectionError, APIError) as e:
+            kind = _failure_kind(e)
+            if kind is None:
+                # Ошибка самого запроса (4xx) — ретраить бессмысленно
+                raise
+            if kind != "rate_limited" and kind != "auth_errors":
+                # 429 — это перегрузка, а не падение: с ней справляются backoff и исключение бэкенда
+                breaker.record_failure()
+                verdict = True
+            if kind == "auth_errors" and len(_clients.backends) == 1:
                 raise
-            await asyncio.sleep(delay)
-        except APIError as e:
-            # 5xx — ретраим; остальные — пробрасываем
-            status = getattr(e, "status_code", 0) or 0
-            if 500 <= status < 600 and delay is not None:
-                last_err = e
-                await asyncio.sleep(delay)
-            else:
+            last_err = e
+            if attempt == MAX_ATTEMPTS - 1:
                 raise
+            delay = _backoff_delay(attempt, e)
+            if deadline is not None and time.monotonic() + delay + MIN_ATTEMPT_SECONDS > deadline:
+                logger.info("[openai] no time left for a retry after %s (delay %.1fs)", kind, delay)
+                raise LLMDeadlineExceeded(f"no time left for a retry after {kind}") from e
+            if not breaker.available():
+                raise ProviderUnavailable("LLM provider unavailable (circuit opened)") from e
+        finally:
+            if probe and not verdict:
+                breaker.release_probe()
+        await asyncio.sleep(delay)
+
     assert last_err is not None
     raise last_err
 
@@ -209,15 +968,229 @@ def chat_complete_sync(
     **kwargs: Any,
 ) -> str:
     """Синхронная обёртка — удобно для прямого вызова из кода без asyncio."""
-    return _loop.submit(_achat_complete(messages, model=model, **kwargs))
+    if _clients.loop is None:
+        raise RuntimeError("OpenAI client is not initialized")
+    coro = _achat_complete(messages, model=model, call_context=_call_context.get(), **kwargs)
+    fut = asyncio.run_coroutine_threadsafe(with_run_stats(current_run_stats(), coro), _clients.loop)
+    return fut.result()
 
 
 async def chat_complete_async(
     messages: List[Dict[str, str]],
     model: str = DEFAULT_MODEL,
+    deadline: Optional[float] = None,
+    **kwargs: Any,
+) -> str:
+    """
+    Асинхронная обёртка — удобно для вызова из async-кода (например, FastAPI).
+    deadline (time.monotonic) по умолчанию берётся из llm_deadline(), атрибуция для журнала
+    расходов — из llm_call_context().
+    """
+    if deadline is None:
+        deadline = _deadline.get()
+    # Контекст снимаем здесь: цикл клиентов может быть другим и переменных вызывающего не видит
+    return await _on_clients_loop(_achat_complete(
+        messages, model=model, deadline=deadline, call_context=_call_context.get(), **kwargs
+    ))
+
+
+async def chat_complete_stream_async(
+    messages: List[Dict[str, str]],
+    model: str = DEFAULT_MODEL,
+    *,
+    check: StreamCheck,
+    deadline: Optional[float] = None,
     **kwargs: Any,
 ) -> str:
-    """Асинхронная обёртка — удобно для вызова из async-кода (например, FastAPI)."""
-    fut = _loop.submit_future(_achat_complete(messages, model=model, **kwargs))
+    """
+    Потоковый вариант chat_complete_async: текст проверяется check по мере генерации.
+    check возвращает None (продолжать), позицию обрезки (ответ готов — поток закрывается,
+    лишние токены не генерируются) или бросает StreamAborted (ответ негоден — ошибка
+    пробрасывается вызывающему сразу, без ретраев).
+    """
+    if deadline is None:
+        deadline = _deadline.get()
+    return await _on_clients_loop(_achat_complete(
+        messages, model=model, deadline=deadline, call_context=_call_context.get(), stream_check=check, **kwargs
+    ))
+
+
+async def _on_clients_loop(coro: Awaitable[Any]) -> Any:
+    """Выполнить корутину в цикле, к которому привязаны клиенты."""
+    if _clients.loop is None:
+        coro.close()
+        raise RuntimeError("OpenAI client is not initialized")
+    if _clients.loop is asyncio.get_running_loop():
+        # Клиенты живут в этом же цикле (рантайм воркера) — ждём напрямую
+        return await coro
+    # Счётчики прогона вызывающего в цикл клиентов сами не попадут — передаём явно
+    fut = asyncio.run_coroutine_threadsafe(with_run_stats(current_run_stats(), coro), _clients.loop)
     # оборачиваем concurrent.futures.Future в asyncio Future и дожидаемся результата
     return await asyncio.wrap_future(fut)
+
+
+# ==========================
+#   ОФЛАЙН-ГЕНЕРАЦИЯ (BATCH)
+# ==========================
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+_BATCH_PENDING_STATUSES = ("validating", "in_progress", "finalizing", "cancelling")
+
+
+def batch_request(custom_id: str, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL, **kwargs: Any) -> Dict[str, Any]:
+    """Строка JSONL для batch-запроса Chat Completions."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {"model": model, "messages": messages, **kwargs},
+    }
+
+
+@dataclass
+class BatchOutcome:
+    """Итог batch-задачи: тексты ответов и ошибки по custom_id."""
+    status: str
+    results: Dict[str, str] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    # Токены по custom_id: (prompt, cached, completion)
+    usage: Dict[str, Tuple[int, int, int]] = field(default_factory=dict)
+
+
+def _parse_batch_output(text: str, outcome: BatchOutcome) -> None:
+    """Разбор JSONL с ответами (формат OpenAI Batch API)."""
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        custom_id = row.get("custom_id")
+        response = row.get("response") or {}
+        body = response.get("body") or {}
+        if row.get("error") or response.get("status_code") != 200:
+            outcome.errors[custom_id] = json.dumps(row.get("error") or body.get("error") or body, ensure_ascii=False)
+            continue
+        try:
+            outcome.results[custom_id] = body["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            outcome.errors[custom_id] = "malformed response"
+            continue
+        usage = body.get("usage") or {}
+        tokens = (
+            usage.get("prompt_tokens") or 0,
+            (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0,
+            usage.get("completion_tokens") or 0,
+        )
+        outcome.usage[custom_id] = tokens
+        count(USAGE_STATS, usage_stats, "calls")
+        count(USAGE_STATS, usage_stats, "prompt_tokens", tokens[0])
+        count(USAGE_STATS, usage_stats, "cached_tokens", tokens[1])
+        count(USAGE_STATS, usage_stats, "completion_tokens", tokens[2])
+
+
+def _jsonl(requests: List[Dict[str, Any]]) -> bytes:
+    return "\n".join(json.dumps(r, ensure_ascii=False) for r in requests).encode("utf-8")
+
+
+class OpenAIBatchBackend:
+    """Batch API OpenAI: загрузка JSONL, создание batch, опрос и выгрузка результатов."""
+
+    name = "openai"
+
+    def __init__(self, completion_window: str = "24h") -> None:
+        self.completion_window = completion_window
+
+    async def submit(self, requests: List[Dict[str, Any]]) -> str:
+        async def _submit() -> str:
+            if not _clients.ai:
+                raise RuntimeError("OpenAI client is not initialized")
+            uploaded = await _clients.ai.files.create(file=("letters.jsonl", _jsonl(requests)), purpose="batch")
+            batch = await _clients.ai.batches.create(
+                input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window=self.completion_window,
+            )
+            return batch.id
+        return await _on_clients_loop(_submit())
+
+    async def poll(self, batch_id: str) -> Optional[BatchOutcome]:
+        """None — ещё выполняется, иначе итог (в т.ч. для failed/expired/cancelled)."""
+        async def _poll() -> Optional[BatchOutcome]:
+            if not _clients.ai:
+                raise RuntimeError("OpenAI client is not initialized")
+            batch = await _clients.ai.batches.retrieve(batch_id)
+            if batch.status in _BATCH_PENDING_STATUSES:
+                return None
+            outcome = BatchOutcome(status=batch.status)
+            # У expired/cancelled тоже может быть частичный результат
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    content = await _clients.ai.files.content(file_id)
+                    _parse_batch_output(content.text, outcome)
+            return outcome
+        return await _on_clients_loop(_poll())
+
+
+def _fake_response(messages: List[Dict[str, str]]) -> str:
+    last = messages[-1]["content"] if messages else ""
+    return f"[fake batch] {len(messages)} message(s), {len(last)} chars in the last one"
+
+
+class FakeBatchBackend:
+    """
+    Локальная замена Batch API для разработки и проверок: входной и выходной JSONL
+    лежат в каталоге root (общем для процессов на одной машине), ответ формирует responder.
+    Batch считается выполненным через delay секунд после отправки.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        root: Optional[Path] = None,
+        delay: float = 0.0,
+        responder: Callable[[List[Dict[str, str]]], str] = _fake_response,
+    ) -> None:
+        self.root = Path(root or Path(tempfile.gettempdir()) / "fake_openai_batches")
+        self.delay = delay
+        self.responder = responder
+
+    async def submit(self, requests: List[Dict[str, Any]]) -> str:
+        self.root.mkdir(parents=True, exist_ok=True)
+        batch_id = f"batch_fake_{uuid.uuid4().hex}"
+        (self.root / f"{batch_id}.input.jsonl").write_bytes(_jsonl(requests))
+        return batch_id
+
+    async def poll(self, batch_id: str) -> Optional[BatchOutcome]:
+        input_path = self.root / f"{batch_id}.input.jsonl"
+        output_path = self.root / f"{batch_id}.output.jsonl"
+        if not input_path.exists():
+            return BatchOutcome(status="failed")
+        if not output_path.exists():
+            if time.time() - os.path.getmtime(input_path) < self.delay:
+                return None
+            rows = []
+            for line in input_path.read_text(encoding="utf-8").splitlines():
+                request = json.loads(line)
+                content = self.responder(request["body"]["messages"])
+                rows.append({
+                    "id": f"req_{uuid.uuid4().hex}",
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "body": {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": {}},
+                    },
+                    "error": None,
+                })
+            output_path.write_bytes(_jsonl(rows))
+        outcome = BatchOutcome(status="completed")
+        _parse_batch_output(output_path.read_text(encoding="utf-8"), outcome)
+        return outcome
+
+
+def get_batch_backend(name: str) -> OpenAIBatchBackend:
+    """
+    Бэкенд офлайн-генерации по имени (пока только "openai"). FakeBatchBackend по имени
+    не выдаётся: его ответы — заглушки, которые ушли бы работодателям как письма;
+    в проверках его подставляют явно.
+    """
+    if name == "openai":
+        return OpenAIBatchBackend()
+    raise ValueError(f"Unknown batch backend: {name}")
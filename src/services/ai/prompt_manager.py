@@ -1,4 +1,5 @@
 # src/services/ai/prompt_manager.py
+import hashlib
 
 letter_template = (
     'Добрый день!\n'
@@ -23,7 +24,7 @@ letter_template = (
     '{candidate_name}'
 )
 
-system_prompt = """Ты эксперт по составлению персонализированных сопроводительных писем.
+_instructions = """Ты эксперт по составлению персонализированных сопроводительных писем.
 
 ТВОЯ ЗАДАЧА:
 — Проанализировать Резюме кандидата и Описание вакансии.
@@ -48,16 +49,26 @@ system_prompt = """Ты эксперт по составлению персон
 - {{contact_info}}: Контактная информация в формате "➜ email" и "➜ другие контакты"
 - {{salary}}: Сумма зарплаты указанная в вакансии. Если в вакансии зарплата не указана, то точную сумму из резюме. Не используй разделители между цифрами. Название валюты укажи на русском языке
 
-Шаблон письма:
+"""
+
+_template_and_resume = """Шаблон письма:
 {letter_template}
 
 Резюме кандидата:
 {resume}
+"""
 
+_job_description = """
 Описание вакансии:
 {job_description}
 """
 
+system_prompt = _instructions + _template_and_resume + _job_description
+
+# Раскладка "prefix": инструкции + шаблон + резюме — в system (одинаковый префикс для всех
+# вакансий резюме, его кэширует провайдер), вакансия — в user-сообщении
+prefix_system_prompt = _instructions + _template_and_resume
+
 
 user_prompt = """Сгенерируй персонализированное сопроводительное письмо на основе предоставленных данных.
 Проанализируй получившийся текст письма и перепиши его приятным языком.
@@ -65,6 +76,112 @@ user_prompt = """Сгенерируй персонализированное с
 Выведи только готовый текст письма без дополнительных комментариев."""
 
 
+# Несколько вакансий одного резюме в одном запросе: префикс (инструкции, шаблон, резюме) тот же,
+# что у одиночного письма в раскладке "prefix", письма возвращаются JSON-объектом
+_multi_job_description = """Описание вакансии {id}:
+{job_description}
+"""
+
+multi_user_prompt = """Сгенерируй персонализированное сопроводительное письмо на КАЖДУЮ вакансию выше, отдельно для каждой, по тем же правилам.
+Проанализируй получившийся текст каждого письма и перепиши его приятным языком.
+В тексте вместо "—" используй "-"
+Верни только JSON-объект вида {"letters": [{"id": "<номер вакансии>", "letter": "<готовый текст письма>"}]} -
+ровно одно письмо на каждую вакансию, без дополнительных комментариев."""
+
+
+# Профиль резюме: выжимка достижений, один раз на версию резюме (см. src.services.resume.profile)
+resume_profile_prompt = """Ты помогаешь кандидату готовить сопроводительные письма.
+Из резюме ниже выпиши 4-6 самых сильных пунктов об опыте и достижениях кандидата:
+конкретные задачи, технологии, результаты и цифры. Только факты из резюме, ничего не выдумывай.
+Каждый пункт - одна строка не длиннее 25 слов, начинается с "- ". Без вступлений и комментариев.
+
+Резюме кандидата:
+{resume}
+"""
+
+# Версия промпта: меняется при любой правке шаблона/инструкций (используется в ключах кэша писем)
+PROMPT_VERSION = hashlib.sha256(
+    "\x00".join((system_prompt, letter_template, user_prompt)).encode("utf-8")
+).hexdigest()[:12]
+
+# Версия групповых писем: свой промпт (несколько вакансий, ответ JSON'ом) поверх того же шаблона
+MULTI_PROMPT_VERSION = hashlib.sha256(
+    "\x00".join((PROMPT_VERSION, prefix_system_prompt, _multi_job_description, multi_user_prompt)).encode("utf-8")
+).hexdigest()[:12]
+
+# Режим "slots": имя, должность, компанию, зарплату и контакты подставляем сами,
+# у модели просим только свободный текст (см. src.services.ai.letter_slots)
+slots_prompt = """Ты помогаешь кандидату составить сопроводительное письмо на вакансию.
+По профилю кандидата и описанию вакансии напиши три фрагмента письма и верни их JSON-объектом с ключами:
+- "relevant_skills_match": 1-2 предложения о 2-3 конкретных навыках или опыте кандидата, которые точно соответствуют требованиям вакансии (от первого лица);
+- "key_expertise": ключевая область экспертизы кандидата, наиболее релевантная позиции, 2-6 слов; продолжает фразу "У меня большой опыт в области ...";
+- "personal_highlights": 3-4 пункта о достижениях и опыте кандидата, каждый с новой строки и начинается с "- ".
+
+Правила: только факты из профиля, ничего не выдумывай; тон дружелюбный и деловой, без англицизмов и эмодзи;
+вместо "—" используй "-"; пиши от лица кандидата{gender_rule}. Верни только JSON без комментариев.
+
+Профиль кандидата:
+{resume}
+"""
+
+_slots_gender_rules = {
+    "": " (мужской род)",
+    "а": " (женский род)",
+}
+
+SLOTS_PROMPT_VERSION = hashlib.sha256(
+    "\x00".join((slots_prompt, letter_template)).encode("utf-8")
+).hexdigest()[:12]
+
+
+def generate_prompt_messages(resume_text, job_description_text, layout="prefix"):
+    """
+    Собирает сообщения для LLM.
+
+    Args:
+        resume_text (str): Текст резюме кандидата
+        job_description_text (str): Описание вакансии
+        layout (str): "prefix" — стабильный префикс (инструкции, шаблон, резюме) в system,
+            вакансия в конце user-сообщения; "inline" — всё в system, как раньше
+
+    Returns:
+        list: Сообщения [system, user]
+    """
+    if layout == "inline":
+        return [
+            {"role": "system", "content": generate_system_prompt(resume_text, job_description_text)},
+            {"role": "user", "content": user_prompt},
+        ]
+
+    system = prefix_system_prompt.format(letter_template=letter_template, resume=resume_text)
+    user = _job_description.format(job_description=job_description_text).lstrip("\n") + "\n" + user_prompt
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+
+def generate_multi_letter_messages(resume_text, job_descriptions):
+    """
+    Сообщения для писем на несколько вакансий одним запросом.
+
+    Args:
+        resume_text (str): Текст резюме кандидата
+        job_descriptions (list): Пары (номер вакансии, описание)
+
+    Returns:
+        list: Сообщения [system, user]; system совпадает с одиночным письмом в раскладке "prefix"
+    """
+    system = prefix_system_prompt.format(letter_template=letter_template, resume=resume_text)
+    user = "\n".join(
+        _multi_job_description.format(id=vacancy_id, job_description=text) for vacancy_id, text in job_descriptions
+    ) + "\n" + multi_user_prompt
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+
 def generate_system_prompt(resume_text, job_description_text):
     """
     Генерирует системный промпт на основе резюме и описания вакансии
@@ -83,4 +200,39 @@ def generate_system_prompt(resume_text, job_description_text):
         job_description=job_description_text
     )
 
-    return formatted_system_prompt
\ No newline at end of file
+    return formatted_system_prompt
+
+
+def generate_resume_profile_messages(resume_text):
+    """
+    Сообщения для выжимки достижений кандидата из полного текста резюме.
+
+    Args:
+        resume_text (str): Текст резюме кандидата
+
+    Returns:
+        list: Сообщения [user]
+    """
+    return [{"role": "user", "content": resume_profile_prompt.format(resume=resume_text)}]
+
+
+def generate_slot_messages(resume_text, job_description_text, gender_ending=None):
+    """
+    Сообщения для режима "slots": модель пишет только свободные фрагменты письма (JSON).
+
+    Args:
+        resume_text (str): Профиль (или текст) резюме кандидата
+        job_description_text (str): Описание вакансии
+        gender_ending (str | None): "" или "а" — род для текста; None — неизвестен
+
+    Returns:
+        list: Сообщения [system, user]; профиль — в system (общий префикс для всех вакансий резюме)
+    """
+    system = slots_prompt.format(
+        resume=resume_text, gender_rule=_slots_gender_rules.get(gender_ending, "")
+    )
+    user = _job_description.format(job_description=job_description_text).lstrip("\n")
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
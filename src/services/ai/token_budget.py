@@ -0,0 +1,263 @@
+# src/services/ai/token_budget.py
+"""
+Бюджет токенов для входных данных промпта.
+
+Тексты резюме и вакансии ужимаются до заданного числа токенов, начиная с наименее
+полезного:
+- резюме: обязанности на самых старых местах работы, затем сами старые места работы
+  (HH отдаёт опыт от нового к старому), в крайнем случае — обрезка хвоста;
+- вакансия: абзацы описания "о компании/мы предлагаем/условия" раньше требований и задач.
+
+Токены считаются tiktoken, если он установлен, иначе — приблизительно по длине текста.
+"""
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - зависит от окружения
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Кодировка семейств gpt-4o/gpt-5
+ENCODING = "o200k_base"
+# Средняя длина токена для русского текста, если токенизатора нет
+_CHARS_PER_TOKEN = 3
+
+_EXPERIENCE_HEADER = "ОПЫТ РАБОТЫ:"
+_DUTIES_MARK = "\n  Обязанности: "
+# Строка записи опыта начинается с периода "2019-01-01 - ..."
+_PERIOD_RE = re.compile(r"\d{4}-\d{2}(-\d{2})? - ")
+# Секции резюме, идущие после опыта
+_RESUME_TAIL_HEADERS = ("\nЯЗЫКИ: ", "\nКЛЮЧЕВЫЕ НАВЫКИ: ")
+_DESCRIPTION_HEADER = "ОПИСАНИЕ ВАКАНСИИ:"
+_TRUNCATION_MARK = " …"
+
+# Абзацы вакансии: сначала жертвуем "продающими" и общими, требования и задачи — в последнюю очередь
+_LOW_VALUE_RE = re.compile(
+    r"о компании|о нас|предлагаем|условия|бонус|дмс|офис|"
+    r"корпоратив|печеньки|дружн|коллектив|оформление|соцпакет|отпуск",
+    re.IGNORECASE,
+)
+_HIGH_VALUE_RE = re.compile(
+    r"требовани|обязанност|задачи|ожидаем|что нужно|нужно будет|чем предстоит|будет плюсом|опыт|знание|навык",
+    re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(ENCODING)
+    except Exception:
+        # Нет файла кодировки и доступа к сети — работаем по приближённой оценке
+        logger.warning("[token_budget] tiktoken encoding %s unavailable, using estimate", ENCODING)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Число токенов в тексте (точно с tiktoken, иначе оценка)."""
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text))
+    return -(-len(text) // _CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Обрезать текст до budget токенов (по границе слова, с пометкой об обрезке)."""
+    if count_tokens(text) <= budget:
+        return text
+    enc = _encoding()
+    if enc is not None:
+        cut = enc.decode(enc.encode(text)[:max(0, budget - 1)])
+    else:
+        cut = text[:max(0, (budget - 1) * _CHARS_PER_TOKEN)]
+    cut = cut.rsplit(" ", 1)[0] if " " in cut else cut
+    return cut.rstrip() + _TRUNCATION_MARK
+
+
+def _shrink_section(
+    head: List[str], section: List[str], tail: List[str], budget: int, steps: List[Callable[[List[str]], bool]]
+) -> List[str]:
+    """
+    Ужимать section шагами по порядку, пока head + section + tail не влезет в бюджет.
+    Каждый шаг убирает одну наименее полезную часть или возвращает False, если убирать нечего.
+    """
+    section = list(section)
+    for step in steps:
+        while count_tokens("\n".join(head + section + tail)) > budget:
+            if not step(section):
+                break
+    return section
+
+
+def _split_experience(section: str) -> List[str]:
+    """Разбить секцию опыта на блоки: "Общий стаж" и записи (строка периода + обязанности)."""
+    blocks: List[str] = []
+    for line in section.split("\n"):
+        if not blocks or _PERIOD_RE.match(line):
+            blocks.append(line)
+        else:
+            # Описание из HH может быть многострочным — продолжение относится к текущей записи
+            blocks[-1] += "\n" + line
+    return blocks
+
+
+def fit_resume_text(text: str, budget: int) -> str:
+    """Ужать отрендеренное резюме (extract_resume_description_from_json) до budget токенов."""
+    if count_tokens(text) <= budget:
+        return text
+
+    marker = "\n" + _EXPERIENCE_HEADER + "\n"
+    pos = text.find(marker)
+    if pos < 0:
+        return truncate_to_tokens(text, budget)
+    section_start = pos + len(marker)
+    section_end = min(
+        (i for i in (text.find(h, section_start) for h in _RESUME_TAIL_HEADERS) if i >= 0),
+        default=len(text),
+    )
+    head, tail = text[:section_start].rstrip("\n"), text[section_end:]
+    blocks = _split_experience(text[section_start:section_end].rstrip("\n"))
+    # HH отдаёт опыт от нового к старому: идём с конца
+    entries = [i for i, block in enumerate(blocks) if _PERIOD_RE.match(block)]
+
+    def _shorten_oldest_duties(parts: List[str]) -> bool:
+        for i in reversed(entries):
+            cut = parts[i].find(_DUTIES_MARK) if i < len(parts) else -1
+            if cut < 0:
+                continue
+            duties = parts[i][cut + len(_DUTIES_MARK):]
+            short = _first_sentence(duties)
+            if short != duties:
+                parts[i] = parts[i][:cut + len(_DUTIES_MARK)] + short
+                return True
+        return False
+
+    def _drop_oldest_duties(parts: List[str]) -> bool:
+        for i in reversed(entries):
+            cut = parts[i].find(_DUTIES_MARK) if i < len(parts) else -1
+            if cut >= 0:
+                parts[i] = parts[i][:cut]
+                return True
+        return False
+
+    def _drop_oldest_entry(parts: List[str]) -> bool:
+        # Два последних места работы оставляем всегда
+        alive = [i for i in entries if i < len(parts)]
+        if len(alive) <= 2:
+            return False
+        del parts[alive[-1]:]
+        return True
+
+    blocks = _shrink_section(
+        [head], blocks, [tail], budget, [_shorten_oldest_duties, _drop_oldest_duties, _drop_oldest_entry]
+    )
+    return truncate_to_tokens("\n".join([head] + blocks) + "\n" + tail, budget)
+
+
+def _first_sentence(text: str, limit: int = 200) -> str:
+    """Первое предложение текста (не длиннее limit символов) или сам текст, если короче не выйдет."""
+    flat = " ".join(text.split())
+    match = re.match(r"(.+?[.!?;])(\s|$)", flat)
+    short = match.group(1) if match else flat
+    if len(short) > limit:
+        short = short[:limit].rsplit(" ", 1)[0] + _TRUNCATION_MARK
+    return short if len(short) < len(text) else text
+
+
+def _paragraph_score(paragraph: str) -> Optional[int]:
+    """2 — требования/задачи, 0 — о компании/условия, None — ничего не сказать."""
+    if _HIGH_VALUE_RE.search(paragraph):
+        return 2
+    if _LOW_VALUE_RE.search(paragraph):
+        return 0
+    return None
+
+
+def _is_heading(paragraph: str) -> bool:
+    return paragraph.rstrip().endswith(":") and len(paragraph) <= 80
+
+
+def _score_paragraphs(paragraphs: List[str]) -> List[int]:
+    """Оценить абзацы; пункты списка без своих признаков наследуют оценку заголовка ("Мы предлагаем:")."""
+    scores = []
+    section_score = 1
+    for paragraph in paragraphs:
+        score = _paragraph_score(paragraph)
+        if _is_heading(paragraph):
+            section_score = 1 if score is None else score
+        scores.append(section_score if score is None else score)
+    return scores
+
+
+def fit_vacancy_text(text: str, budget: int) -> str:
+    """Ужать описание вакансии (extract_job_description_from_vacancy) до budget токенов."""
+    if count_tokens(text) <= budget:
+        return text
+
+    head, sep, description = text.partition(_DESCRIPTION_HEADER)
+    if not sep:
+        return truncate_to_tokens(text, budget)
+    paragraphs = [p for p in description.split("\n") if p.strip()]
+    scores = _score_paragraphs(paragraphs)
+
+    def _drop_least_useful(parts: List[str]) -> bool:
+        if len(parts) <= 1:
+            return False
+        # Наименее полезный абзац; при равенстве — ближе к концу
+        idx = min(range(len(parts)), key=lambda i: (scores[i], -i))
+        del parts[idx]
+        del scores[idx]
+        # Заголовок, у которого не осталось пунктов, тоже убираем
+        if 0 < idx <= len(parts) and _is_heading(parts[idx - 1]) and (idx == len(parts) or _is_heading(parts[idx])):
+            del parts[idx - 1]
+            del scores[idx - 1]
+        return True
+
+    paragraphs = _shrink_section([head + sep], paragraphs, [], budget, [_drop_least_useful])
+    return truncate_to_tokens("\n".join([head + sep] + paragraphs), budget)
+
+
+@dataclass
+class BudgetResult:
+    resume_text: str
+    vacancy_text: str
+    resume_tokens: Tuple[int, int]     # (до, после)
+    vacancy_tokens: Tuple[int, int]
+
+    @property
+    def saved(self) -> int:
+        return (self.resume_tokens[0] - self.resume_tokens[1]) + (self.vacancy_tokens[0] - self.vacancy_tokens[1])
+
+
+def fit_prompt_inputs(
+    resume_text: str,
+    vacancy_text: str,
+    *,
+    resume_budget: Optional[int],
+    vacancy_budget: Optional[int],
+) -> BudgetResult:
+    """Применить бюджеты к резюме и вакансии (None или 0 — без ограничения)."""
+    resume_before = count_tokens(resume_text)
+    vacancy_before = count_tokens(vacancy_text)
+    if resume_budget:
+        resume_text = fit_resume_text(resume_text, resume_budget)
+    if vacancy_budget:
+        vacancy_text = fit_vacancy_text(vacancy_text, vacancy_budget)
+    return BudgetResult(
+        resume_text=resume_text,
+        vacancy_text=vacancy_text,
+        resume_tokens=(resume_before, count_tokens(resume_text) if resume_budget else resume_before),
+        vacancy_tokens=(vacancy_before, count_tokens(vacancy_text) if vacancy_budget else vacancy_before),
+    )
@@ -0,0 +1,121 @@
+# src/services/ai/usage_ledger.py
+"""
+Журнал расходов LLM (таблица llm_usage).
+
+Пул (openai_pool) сообщает о каждом вызове Chat Completions записью LLMCall: токены,
+задержка, ретраи, бэкенд и атрибуция из llm_call_context (пользователь, резюме,
+назначение, версия промпта). Журнал копит записи в памяти процесса и пишет их одной
+вставкой (bulk_create): рантайм воркера вызывает maybe_flush после каждой задачи
+и flush при остановке. Если БД недоступна, записи остаются в буфере до следующей пачки.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List
+
+from src.config import config
+from src.models import LLMUsage
+from src.services.ai.openai_pool import LLMCall, add_call_listener
+
+logger = logging.getLogger(__name__)
+
+# Сколько записей держим, пока БД недоступна (дальше отбрасываем самые старые)
+MAX_BUFFER = 10_000
+INSERT_BATCH_SIZE = 500
+
+
+def _row(call: LLMCall) -> LLMUsage:
+    ctx = call.context
+    return LLMUsage(
+        user_id=ctx.get("user_id"),
+        resume_id=ctx.get("resume_id"),
+        purpose=ctx.get("purpose"),
+        prompt_version=ctx.get("prompt_version"),
+        model=call.model[:32],
+        backend=call.backend,
+        prompt_tokens=call.prompt_tokens,
+        cached_tokens=call.cached_tokens,
+        completion_tokens=call.completion_tokens,
+        latency_ms=round(call.latency * 1000) if call.latency is not None else None,
+        retries=call.retries,
+        error=call.error[:32] if call.error else None,
+        created_at=datetime.fromtimestamp(call.finished_at, tz=timezone.utc),
+    )
+
+
+class UsageLedger:
+    """Буфер записей о вызовах LLM с пакетной записью в llm_usage."""
+
+    def __init__(self, *, flush_size: int = 100, flush_interval: float = 60.0, max_buffer: int = MAX_BUFFER) -> None:
+        self.enabled = False
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._buffer: List[LLMCall] = []
+        # Пул может жить в отдельном потоке (openai_pool.setup)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def record(self, call: LLMCall) -> None:
+        """Добавить запись (подписчик пула; в БД не ходит)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._buffer.append(call)
+            self._trim()
+
+    def _trim(self) -> None:
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.dropped += overflow
+            logger.warning("[usage_ledger] buffer full, dropped %d oldest record(s)", overflow)
+
+    def due(self) -> bool:
+        """Пора писать: набралась пачка или старейшая запись ждёт дольше flush_interval."""
+        with self._lock:
+            if not self._buffer:
+                return False
+            return (
+                len(self._buffer) >= self.flush_size
+                or time.time() - self._buffer[0].finished_at >= self.flush_interval
+            )
+
+    async def maybe_flush(self) -> int:
+        return await self.flush() if self.due() else 0
+
+    async def flush(self) -> int:
+        """Записать всё накопленное одной вставкой. Возвращает число записанных строк."""
+        with self._lock:
+            calls, self._buffer = self._buffer, []
+        if not calls:
+            return 0
+        try:
+            await LLMUsage.bulk_create([_row(c) for c in calls], batch_size=INSERT_BATCH_SIZE)
+        except Exception:
+            logger.warning("[usage_ledger] insert of %d record(s) failed, will retry", len(calls), exc_info=True)
+            with self._lock:
+                self._buffer[:0] = calls
+                self._trim()
+            return 0
+        logger.debug("[usage_ledger] wrote %d record(s)", len(calls))
+        return len(calls)
+
+
+usage_ledger = UsageLedger()
+
+
+def install_usage_ledger() -> None:
+    """Подписать журнал на вызовы пула, если он включён (config.ai.usage_ledger)."""
+    if not config.ai.usage_ledger:
+        return
+    usage_ledger.flush_size = max(1, config.ai.usage_flush_size)
+    usage_ledger.flush_interval = config.ai.usage_flush_interval
+    usage_ledger.enabled = True
+    add_call_listener(usage_ledger.record)
@@ -0,0 +1,161 @@
+# src/services/analytics/report_generator.py
+"""
+Отчёты по журналу расходов LLM (llm_usage): задержка и токены в разрезе тарифа,
+назначения вызова, версии промпта или пользователя.
+
+    python -m src.services.analytics.report_generator [часов] [plan|purpose|prompt_version|user]
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from tortoise.timezone import now
+
+from src.models import LLMUsage, Plan, Subscription
+
+GROUP_BY = ("plan", "purpose", "prompt_version", "user")
+
+
+def _percentile(sorted_values: List[int], q: float) -> Optional[int]:
+    """Перцентиль по ближайшему рангу (values отсортированы)."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+@dataclass
+class UsageGroup:
+    """Сводка по группе вызовов LLM."""
+    key: str
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+    latencies_ms: List[int] = field(default_factory=list, repr=False)
+    users: Set[int] = field(default_factory=set, repr=False)
+
+    @property
+    def latency_p50_ms(self) -> Optional[int]:
+        return _percentile(sorted(self.latencies_ms), 50)
+
+    @property
+    def latency_p95_ms(self) -> Optional[int]:
+        return _percentile(sorted(self.latencies_ms), 95)
+
+    @property
+    def tokens_per_call(self) -> float:
+        ok = self.calls - self.errors
+        return (self.prompt_tokens + self.completion_tokens) / ok if ok else 0.0
+
+    @property
+    def tokens_per_user(self) -> float:
+        return (self.prompt_tokens + self.completion_tokens) / len(self.users) if self.users else 0.0
+
+
+async def _user_plans(user_ids: Set[int]) -> Dict[int, str]:
+    """Текущий тариф пользователей (без подписки — free)."""
+    rows = await Subscription.filter(user_id__in=list(user_ids)).values_list("user_id", "plan")
+    return {uid: Plan(plan).value for uid, plan in rows}
+
+
+async def llm_usage_report(
+    since: datetime,
+    until: Optional[datetime] = None,
+    *,
+    group_by: str = "plan",
+) -> Dict[str, UsageGroup]:
+    """
+    Сводка журнала llm_usage за период.
+
+    Args:
+        since: Начало периода (включительно)
+        until: Конец периода (не включительно; None — до текущего момента)
+        group_by: "plan" (текущий тариф пользователя), "purpose", "prompt_version" или "user"
+
+    Returns:
+        dict: Ключ группы -> UsageGroup (p50/p95 задержки — только по вызовам, у которых она есть)
+    """
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {GROUP_BY}, got {group_by!r}")
+
+    qs = LLMUsage.filter(created_at__gte=since)
+    if until is not None:
+        qs = qs.filter(created_at__lt=until)
+    rows = await qs.values_list(
+        "user_id", "purpose", "prompt_version", "latency_ms", "retries", "error",
+        "prompt_tokens", "cached_tokens", "completion_tokens",
+    )
+
+    plans: Dict[int, str] = {}
+    if group_by == "plan":
+        plans = await _user_plans({row[0] for row in rows if row[0] is not None})
+
+    groups: Dict[str, UsageGroup] = {}
+    for user_id, purpose, prompt_version, latency_ms, retries, error, prompt, cached, completion in rows:
+        if group_by == "plan":
+            key = plans.get(user_id, Plan.FREE.value) if user_id is not None else "-"
+        elif group_by == "purpose":
+            key = purpose or "-"
+        elif group_by == "prompt_version":
+            key = prompt_version or "-"
+        else:
+            key = str(user_id) if user_id is not None else "-"
+
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = UsageGroup(key)
+        group.calls += 1
+        group.errors += 1 if error else 0
+        group.retries += retries
+        group.prompt_tokens += prompt
+        group.cached_tokens += cached
+        group.completion_tokens += completion
+        if latency_ms is not None:
+            group.latencies_ms.append(latency_ms)
+        if user_id is not None:
+            group.users.add(user_id)
+    return groups
+
+
+def format_usage_report(groups: Dict[str, UsageGroup], group_by: str = "plan") -> str:
+    """Таблица отчёта для логов/консоли."""
+    lines = [
+        f"{group_by:<14} {'calls':>7} {'errors':>6} {'retries':>7} {'p50 ms':>7} {'p95 ms':>7} "
+        f"{'prompt':>10} {'cached':>10} {'completion':>10} {'tok/call':>8} {'tok/user':>9}"
+    ]
+    for group in sorted(groups.values(), key=lambda g: g.prompt_tokens + g.completion_tokens, reverse=True):
+        lines.append(
+            f"{group.key:<14} {group.calls:>7} {group.errors:>6} {group.retries:>7} "
+            f"{group.latency_p50_ms if group.latency_p50_ms is not None else '-':>7} "
+            f"{group.latency_p95_ms if group.latency_p95_ms is not None else '-':>7} "
+            f"{group.prompt_tokens:>10} {group.cached_tokens:>10} {group.completion_tokens:>10} "
+            f"{group.tokens_per_call:>8.0f} {group.tokens_per_user:>9.0f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Отчёт за последние N часов по настроенной БД:
+    #   python -m src.services.analytics.report_generator 24 plan
+    import asyncio
+    import sys
+
+    from src.db.init import init_db, close_db
+
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 24
+    group = sys.argv[2] if len(sys.argv) > 2 else "plan"
+
+    async def _main() -> None:
+        await init_db()
+        try:
+            report = await llm_usage_report(now() - timedelta(hours=hours), group_by=group)
+            print(format_usage_report(report, group))
+        finally:
+            await close_db()
+
+    asyncio.run(_main())
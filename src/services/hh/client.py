@@ -1,8 +1,44 @@
+import asyncio
+import copy
+import weakref
+from typing import Any, Optional
+
 from hh_api.client import HHClient
 
+from src.config import config
 from src.services.hh.auth.token_manager import tm
 
 USER_AGENT = "auto-cover-letter-bot/1.0"
 
 
-hhc = HHClient(tm=tm, user_agent=USER_AGENT)
\ No newline at end of file
+hhc = HHClient(tm=tm, user_agent=USER_AGENT)
+
+
+_shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, HHClient]" = weakref.WeakKeyDictionary()
+
+
+def get_hh_client(subject: Optional[Any] = None) -> HHClient:
+    """
+    HHClient поверх общего для текущего event loop httpx-пула.
+
+    HHClient создаёт свой httpx.AsyncClient в конструкторе, а соединения нельзя
+    переносить между циклами, поэтому базовый клиент один на цикл. Для пользователя
+    возвращается поверхностная копия с его subject: пул соединений общий, токен — свой.
+    """
+    loop = asyncio.get_running_loop()
+    base = _shared_clients.get(loop)
+    if base is None:
+        base = HHClient(tm=tm, user_agent=config.hh.user_agent)
+        _shared_clients[loop] = base
+    if subject is None:
+        return base
+    client = copy.copy(base)
+    client.subject = subject
+    return client
+
+
+async def close_hh_client() -> None:
+    """Закрыть общий клиент текущего цикла."""
+    base = _shared_clients.pop(asyncio.get_running_loop(), None)
+    if base is not None:
+        await base.aclose()
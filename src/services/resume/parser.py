@@ -37,6 +37,36 @@ def extract_keywords(text: str) -> List[str]:
     return list(dict.fromkeys(keywords))
 
 
+def extract_resume_contacts(resume_data) -> List[str]:
+    """
+    Контакты из резюме: почта, телефон и сайты ("Email: ...", "Телефон: ...", "<тип>: <url>")
+    """
+    contacts = []
+    for contact in resume_data.get('contact', []):
+        contact_type = contact.get('type', {}).get('name', '')
+        if contact_type == 'Эл. почта':
+            email = contact.get('value', '')
+            if email:
+                contacts.append(f"Email: {email}")
+        elif contact_type == 'Мобильный телефон':
+            phone = contact.get('value', {}).get('formatted', '')
+            if phone:
+                comment = contact.get('comment', '')
+                phone_info = f"Телефон: {phone}"
+                if comment:
+                    phone_info += f" ({comment})"
+                contacts.append(phone_info)
+
+    # Дополнительные способы связи
+    sites = resume_data.get('site', [])
+    for site in sites:
+        site_type = site.get('type', {}).get('name', '')
+        site_url = site.get('url', '')
+        if site_url:
+            contacts.append(f"{site_type}: {site_url}")
+    return contacts
+
+
 def extract_resume_description_from_json(resume_data):
     """
     Извлекает информацию о резюме из JSON-ответа HeadHunter API
@@ -86,29 +116,7 @@ def extract_resume_description_from_json(resume_data):
     business_trip = resume_data.get('business_trip_readiness', {}).get('name', '')
 
     # Контактная информация
-    contacts = []
-    for contact in resume_data.get('contact', []):
-        contact_type = contact.get('type', {}).get('name', '')
-        if contact_type == 'Эл. почта':
-            email = contact.get('value', '')
-            if email:
-                contacts.append(f"Email: {email}")
-        elif contact_type == 'Мобильный телефон':
-            phone = contact.get('value', {}).get('formatted', '')
-            if phone:
-                comment = contact.get('comment', '')
-                phone_info = f"Телефон: {phone}"
-                if comment:
-                    phone_info += f" ({comment})"
-                contacts.append(phone_info)
-
-    # Дополнительные способы связи
-    sites = resume_data.get('site', [])
-    for site in sites:
-        site_type = site.get('type', {}).get('name', '')
-        site_url = site.get('url', '')
-        if site_url:
-            contacts.append(f"{site_type}: {site_url}")
+    contacts = extract_resume_contacts(resume_data)
 
     # Образование
     education_info = []
@@ -0,0 +1,192 @@
+# src/services/resume/profile.py
+"""
+Профиль резюме — компактная выжимка для промпта письма.
+
+Полный текст резюме уходит в модель один раз на версию резюме (по resume_hash):
+из него делается выжимка достижений, а имя, окончание по полу, навыки, контакты
+и зарплата берутся прямо из resume_json. Профиль хранится на Resume.resume_profile
+и подставляется в промпт письма вместо полного текста.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import config
+from src.models import Resume
+from src.services.ai.openai_client import chat_complete
+from src.services.ai.openai_pool import DEFAULT_MODEL, llm_call_context
+from src.services.ai.prompt_manager import generate_resume_profile_messages, resume_profile_prompt
+from src.services.resume.parser import extract_resume_contacts
+from src.services.resume.snapshot import get_resume_text
+
+logger = logging.getLogger(__name__)
+
+# Версия профиля: меняется при правке промпта выжимки или состава профиля
+PROFILE_VERSION = hashlib.sha256(f"1\x00{resume_profile_prompt}".encode("utf-8")).hexdigest()[:12]
+
+MAX_SKILLS = 25
+MAX_HIGHLIGHTS = 6
+RECENT_ROLES = 3
+# Профиль с запасной выжимкой (модель не ответила) живёт недолго, потом модель пробуем снова
+FALLBACK_TTL = 3600
+
+_GENDER_ENDINGS = {"male": "", "female": "а"}
+
+
+def _recent_roles(resume_json: dict) -> List[str]:
+    roles = []
+    for exp in (resume_json.get("experience") or [])[:RECENT_ROLES]:
+        period = exp.get("start") or ""
+        if period:
+            period += f" - {exp.get('end') or 'настоящее время'}"
+        parts = [p for p in (exp.get("position"), exp.get("company")) if p]
+        if parts:
+            roles.append(" - ".join(parts) + (f" ({period})" if period else ""))
+    return roles
+
+
+def _total_experience(resume_json: dict) -> str:
+    months = (resume_json.get("total_experience") or {}).get("months") or 0
+    years, rest = divmod(months, 12)
+    return " ".join(filter(None, (f"{years} лет" if years else "", f"{rest} мес." if rest else "")))
+
+
+def _fallback_highlights(resume_json: dict) -> List[str]:
+    """Без модели: первые предложения обязанностей на последних местах работы."""
+    highlights = []
+    for exp in (resume_json.get("experience") or [])[:MAX_HIGHLIGHTS]:
+        description = " ".join((exp.get("description") or "").split())
+        if description:
+            first = description.split(". ", 1)[0].rstrip(".")
+            highlights.append(first[:200])
+    return highlights
+
+
+def _parse_highlights(text: str) -> List[str]:
+    lines = [line.strip().lstrip("-•*").strip() for line in (text or "").splitlines()]
+    return [line for line in lines if line][:MAX_HIGHLIGHTS]
+
+
+def build_resume_profile(resume_json: dict, resume_hash: str, highlights: List[str]) -> Dict[str, Any]:
+    """Профиль из resume_json и готовой выжимки достижений."""
+    salary = resume_json.get("salary") or {}
+    salary_text = f"{salary['amount']} {salary.get('currency', 'RUR')}" if salary.get("amount") else ""
+    gender = (resume_json.get("gender") or {}).get("id")
+    skills = list(resume_json.get("skill_set") or [])[:MAX_SKILLS]
+    return {
+        "version": PROFILE_VERSION,
+        "resume_hash": resume_hash,
+        "name": " ".join(filter(None, (resume_json.get("first_name"), resume_json.get("last_name")))),
+        # None — пол в резюме не указан, модель определит окончание по имени
+        "gender_ending": _GENDER_ENDINGS.get(gender),
+        "title": resume_json.get("title") or "",
+        "area": (resume_json.get("area") or {}).get("name", ""),
+        "salary": salary_text,
+        "contacts": extract_resume_contacts(resume_json),
+        "total_experience": _total_experience(resume_json),
+        "recent_roles": _recent_roles(resume_json),
+        "key_skills": skills,
+        "highlights": highlights,
+    }
+
+
+def render_resume_profile(profile: Dict[str, Any]) -> str:
+    """Текст профиля для промпта письма (вместо полного текста резюме)."""
+    lines = [f"Кандидат: {profile['name']}"]
+    if profile.get("gender_ending") is not None:
+        lines.append(f'Окончание для {{gender_ending}}: "{profile["gender_ending"]}"')
+    lines.append(f"Должность: {profile['title']}")
+    if profile.get("area"):
+        lines.append(f"Город: {profile['area']}")
+    if profile.get("salary"):
+        lines.append(f"Зарплатные ожидания: {profile['salary']}")
+    if profile.get("total_experience"):
+        lines.append(f"Общий стаж: {profile['total_experience']}")
+    if profile.get("contacts"):
+        lines.append("Контакты: " + "; ".join(profile["contacts"]))
+    if profile.get("recent_roles"):
+        lines.append("Последние места работы:")
+        lines.extend(f"- {role}" for role in profile["recent_roles"])
+    if profile.get("key_skills"):
+        lines.append("Ключевые навыки: " + ", ".join(profile["key_skills"]))
+    if profile.get("highlights"):
+        lines.append("Опыт и достижения:")
+        lines.extend(f"- {item}" for item in profile["highlights"])
+    return "\n".join(lines)
+
+
+def is_profile_fresh(resume: Resume) -> bool:
+    """Профиль собран из текущей версии резюме текущей версией промпта (запасной — не старше FALLBACK_TTL)."""
+    profile = resume.resume_profile
+    return bool(
+        profile
+        and profile.get("version") == PROFILE_VERSION
+        and profile.get("resume_hash") == resume.resume_hash
+        and (profile.get("fallback_until") is None or profile["fallback_until"] > time.time())
+    )
+
+
+async def ensure_resume_profile(resume: Resume, *, model: str = DEFAULT_MODEL) -> Optional[Dict[str, Any]]:
+    """
+    Профиль резюме; собирается заново, только если резюме изменилось.
+    Нужен актуальный снимок (resume_json, resume_text, resume_hash — см. snapshot).
+
+    Returns:
+        dict | None: Профиль или None, если снимка резюме нет
+    """
+    if is_profile_fresh(resume):
+        return resume.resume_profile
+    if resume.resume_json is None or not resume.resume_text:
+        return None
+
+    try:
+        with llm_call_context(
+            user_id=resume.user_id, resume_id=resume.id, purpose="resume_profile", prompt_version=PROFILE_VERSION
+        ):
+            highlights = _parse_highlights(
+                await chat_complete(generate_resume_profile_messages(resume.resume_text), model=model)
+            )
+    except Exception:
+        # Сбой модели: сохраняем профиль с запасной выжимкой на FALLBACK_TTL, чтобы не запрашивать
+        # модель на каждой вакансии прогона; по истечении профиль соберётся заново
+        logger.warning("[resume_profile] highlights generation failed for resume_id=%s", resume.id, exc_info=True)
+        resume.resume_profile = build_resume_profile(
+            resume.resume_json, resume.resume_hash, _fallback_highlights(resume.resume_json)
+        )
+        resume.resume_profile["fallback_until"] = time.time() + FALLBACK_TTL
+        await resume.save(update_fields=("resume_profile",))
+        return resume.resume_profile
+    if not highlights:
+        highlights = _fallback_highlights(resume.resume_json)
+
+    resume.resume_profile = build_resume_profile(resume.resume_json, resume.resume_hash, highlights)
+    await resume.save(update_fields=("resume_profile",))
+    logger.info("[resume_profile] built for resume_id=%s: %d highlight(s)", resume.id, len(highlights))
+    return resume.resume_profile
+
+
+async def get_resume_prompt_inputs(resume: Resume, hhc: Any) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Текст резюме для промпта письма и профиль резюме.
+    Текст — профиль (если включён config.ai.resume_profile) или полный текст снимка; профиль
+    нужен и режиму писем "slots". Снимок при необходимости обновляется из HH (get_resume_text).
+
+    Returns:
+        tuple: (текст, профиль или None — профиль не нужен или снимка резюме нет)
+    """
+    resume_text = await get_resume_text(resume, hhc)
+    profile = None
+    if config.ai.resume_profile or config.ai.letter_mode == "slots":
+        profile = await ensure_resume_profile(resume)
+    if config.ai.resume_profile and profile is not None:
+        resume_text = render_resume_profile(profile)
+    return resume_text, profile
+
+
+async def get_resume_prompt_text(resume: Resume, hhc: Any) -> str:
+    """Текст резюме для промпта письма (см. get_resume_prompt_inputs)."""
+    resume_text, _ = await get_resume_prompt_inputs(resume, hhc)
+    return resume_text
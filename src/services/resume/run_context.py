@@ -0,0 +1,80 @@
+# src/services/resume/run_context.py
+"""
+Контекст резюме на один прогон fan-out'а apply_for_resume → apply_for_vacancy.
+
+apply_for_resume один раз собирает всё, что нужно задачам по вакансиям
+(текст резюме для промпта, id резюме в HH, владелец и его очередь), и кладёт
+в Redis с коротким TTL по id прогона. Задачи по вакансиям читают контекст
+оттуда, а не грузят Resume и резюме из HH каждая заново.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+from src.config import config
+from src.models import Resume
+from src.services.resume.profile import get_resume_prompt_inputs
+from src.utils.cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ResumeRunContext:
+    run_id: str
+    resume_id: str
+    hh_resume_id: str
+    user_id: int
+    queue: str
+    resume_text: str
+    # Профиль резюме для режима писем "slots" (None — не нужен или снимка резюме нет)
+    resume_profile: Optional[Dict[str, Any]] = None
+
+
+def _key(run_id: str) -> str:
+    return f"apply:resume_ctx:{run_id}"
+
+
+async def build_resume_context(resume: Resume, hhc: Any, *, run_id: str, queue: str) -> ResumeRunContext:
+    """Собрать контекст по резюме (профиль или текст из снимка, в HH — только если он устарел)."""
+    resume_text, profile = await get_resume_prompt_inputs(resume, hhc)
+    return ResumeRunContext(
+        run_id=run_id,
+        resume_id=str(resume.id),
+        # id резюме в БД совпадает с id резюме в HH
+        hh_resume_id=str(resume.id),
+        user_id=resume.user_id,
+        queue=queue,
+        resume_text=resume_text,
+        resume_profile=profile,
+    )
+
+
+async def save_resume_context(ctx: ResumeRunContext, ttl: Optional[int] = None) -> bool:
+    """Сохранить контекст в Redis. Ошибка Redis не фатальна: задачи соберут контекст сами."""
+    if ttl is None:
+        ttl = config.cache.resume_context_ttl
+    try:
+        await get_redis().set(_key(ctx.run_id), json.dumps(asdict(ctx), ensure_ascii=False), ex=ttl)
+        return True
+    except Exception as e:
+        logger.warning("[resume_ctx] redis set failed for run_id=%s: %s", ctx.run_id, e)
+        return False
+
+
+async def load_resume_context(run_id: str) -> Optional[ResumeRunContext]:
+    """Контекст прогона из Redis или None (истёк TTL, Redis недоступен)."""
+    try:
+        raw = await get_redis().get(_key(run_id))
+    except Exception as e:
+        logger.warning("[resume_ctx] redis get failed for run_id=%s: %s", run_id, e)
+        return None
+    if not raw:
+        return None
+    try:
+        return ResumeRunContext(**json.loads(raw))
+    except (ValueError, TypeError):
+        return None
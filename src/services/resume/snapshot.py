@@ -0,0 +1,82 @@
+# src/services/resume/snapshot.py
+"""
+Текст резюме для промпта без лишних походов в HH.
+
+Отрендеренный текст хранится на Resume вместе с хэшем JSON, из которого он собран.
+В HH идём, только если снимок старше config.apply.resume_refresh_hours;
+если HH недоступен — используем то, что уже есть.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from tortoise.timezone import now
+
+from src.config import config
+from src.models import Resume
+from src.services.resume.parser import extract_resume_description_from_json
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_fields(resume_json: dict) -> Dict[str, Any]:
+    """Значения полей снимка для свежего resume_json из HH (для create/get_or_create)."""
+    return {
+        "resume_json": resume_json,
+        "resume_text": extract_resume_description_from_json(resume_json),
+        "resume_hash": Resume.json_hash(resume_json),
+        "resume_synced_at": now(),
+    }
+
+
+def set_resume_json(resume: Resume, resume_json: dict) -> None:
+    """
+    Обновляет resume_json свежими данными из HH.
+    Текст пересобирается, только если содержимое резюме изменилось.
+    Сохранение — на стороне вызывающего (update_fields=Resume.SNAPSHOT_FIELDS).
+    """
+    new_hash = Resume.json_hash(resume_json)
+    if new_hash != resume.resume_hash or not resume.resume_text:
+        resume.resume_text = extract_resume_description_from_json(resume_json)
+        resume.resume_hash = new_hash
+    resume.resume_json = resume_json
+    resume.resume_synced_at = now()
+
+
+async def get_resume_text(resume: Resume, hhc: Any, *, max_age: Optional[timedelta] = None) -> str:
+    """
+    Возвращает текст резюме, при необходимости обновляя снимок из HH.
+
+    Args:
+        resume: Резюме из БД
+        hhc: Клиент HH (с методом get_resume(resume_id))
+        max_age: Сколько живёт снимок (по умолчанию config.apply.resume_refresh_hours)
+
+    Returns:
+        str: Текст резюме для промпта
+    """
+    if max_age is None:
+        max_age = timedelta(hours=config.apply.resume_refresh_hours)
+
+    if resume.is_snapshot_stale(max_age):
+        try:
+            resume_json = await hhc.get_resume(resume.id)
+        except Exception:
+            if resume.resume_json is None:
+                raise
+            logger.warning("[resume_snapshot] HH refresh failed for resume_id=%s, using stored copy", resume.id,
+                           exc_info=True)
+        else:
+            set_resume_json(resume, resume_json)
+            await resume.save(update_fields=Resume.SNAPSHOT_FIELDS)
+            return resume.resume_text
+
+    if not resume.resume_text or not resume.resume_hash:
+        # Записи, сохранённые до появления снимка: рендерим из сохранённого JSON без похода в HH
+        resume.resume_text = extract_resume_description_from_json(resume.resume_json)
+        resume.resume_hash = Resume.json_hash(resume.resume_json)
+        await resume.save(update_fields=("resume_text", "resume_hash"))
+
+    return resume.resume_text
@@ -0,0 +1,142 @@
+# src/services/task_manager/batch_publisher.py
+"""
+Пакетная постановка задач Celery.
+
+apply_async на транспорте Redis стоит два запроса на сообщение: SMEMBERS (таблица
+маршрутов обменника) и LPUSH в очередь. Здесь сообщения публикуются чанками через
+один producer, и на время чанка канал Redis (kombu) переключается на конвейер:
+таблица маршрутов читается один раз, а LPUSH всех сообщений чанка уходят одним
+pipeline (без транзакции). Сообщения остаются по одному на элемент — ретраи и
+маршрутизация задач не меняются. На других транспортах публикуется как обычно.
+
+Конвейер опирается на внутренние методы канала kombu (Channel._put, get_table),
+поэтому включается только на сверенных версиях kombu (KOMBU_PIPELINE_VERSIONS,
+закреплены в requirements.txt) и при наличии этих методов; иначе сообщения чанка
+публикуются обычным apply_async через общий producer.
+
+Размер чанка — config.apply.publish_chunk_size (APPLY_PUBLISH_CHUNK_SIZE).
+"""
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import kombu
+from celery import Task
+from kombu.transport import redis as redis_transport
+from kombu.utils.json import dumps
+
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+# [min, max) версий kombu, с которыми сверены подменяемые методы redis Channel
+KOMBU_PIPELINE_VERSIONS = ((5, 3), (5, 7))
+_CHANNEL_METHODS = ("_put", "get_table", "_q_for_pri", "_get_message_priority", "conn_or_acquire")
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _pipeline_supported() -> bool:
+    """Можно ли подменять методы redis Channel у установленной версии kombu."""
+    low, high = KOMBU_PIPELINE_VERSIONS
+    if not low <= tuple(kombu.VERSION[:2]) < high:
+        return False
+    return all(callable(getattr(redis_transport.Channel, name, None)) for name in _CHANNEL_METHODS)
+
+
+_PIPELINE_SUPPORTED = _pipeline_supported()
+if not _PIPELINE_SUPPORTED:
+    logger.warning("[enqueue] kombu %s is not verified for pipelined publishing, publishing one by one",
+                   kombu.__version__)
+
+
+@contextmanager
+def _pipelined(channel: Any) -> Iterator[None]:
+    """
+    Сообщения, опубликованные через channel внутри блока, уходят в Redis одним pipeline
+    при выходе из блока. Повторяет kombu redis Channel._put/get_table, подменяя их
+    на экземпляре канала только на время блока; для других транспортов и несверенных
+    версий kombu ничего не делает.
+    """
+    if not _PIPELINE_SUPPORTED or not isinstance(channel, redis_transport.Channel):
+        yield
+        return
+
+    routes: Dict[str, Any] = {}
+    get_table = channel.get_table
+
+    def _get_table(exchange: str) -> Any:
+        # Привязки очередей за время чанка не меняются
+        if exchange not in routes:
+            routes[exchange] = get_table(exchange)
+        return routes[exchange]
+
+    with channel.conn_or_acquire() as client:
+        pipe = client.pipeline(transaction=False)
+
+        def _put(queue: str, message: Dict[str, Any], **kwargs: Any) -> None:
+            pri = channel._get_message_priority(message, reverse=False)
+            pipe.lpush(channel._q_for_pri(queue, pri), dumps(message))
+
+        channel.get_table = _get_table
+        channel._put = _put
+        try:
+            yield
+        except BaseException:
+            pipe.reset()
+            raise
+        finally:
+            del channel.get_table
+            del channel._put
+        pipe.execute()
+
+
+def publish_batched(
+    task: Task,
+    args_list: Iterable[Sequence],
+    *,
+    queue: str,
+    routing_key: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+) -> List[str]:
+    """
+    Ставит task по одному сообщению на каждый элемент args_list.
+
+    Args:
+        task: Задача Celery
+        args_list: Позиционные аргументы для каждого сообщения
+        queue: Очередь
+        routing_key: Ключ маршрутизации (по умолчанию "q.<queue>")
+        chunk_size: Сообщений на один pipeline (по умолчанию config.apply.publish_chunk_size)
+
+    Returns:
+        List[str]: ID поставленных задач
+    """
+    items = [list(args) for args in args_list]
+    if not items:
+        return []
+    if chunk_size is None:
+        chunk_size = config.apply.publish_chunk_size
+    if routing_key is None:
+        routing_key = f"q.{queue}"
+
+    task_ids: List[str] = []
+    t0 = time.perf_counter()
+    for chunk in _chunks(items, max(1, chunk_size)):
+        with task.app.producer_or_acquire() as producer, _pipelined(producer.channel):
+            for args in chunk:
+                res = task.apply_async(args=args, queue=queue, routing_key=routing_key, producer=producer)
+                task_ids.append(res.id)
+    elapsed = time.perf_counter() - t0
+
+    logger.info(
+        "[enqueue] %s: %d msg(s) -> %s in %.3fs (%.0f msg/s, chunk=%d)",
+        task.name, len(task_ids), queue, elapsed, len(task_ids) / elapsed if elapsed else 0.0, chunk_size,
+    )
+    return task_ids
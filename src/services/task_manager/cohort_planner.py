@@ -0,0 +1,145 @@
+# src/services/task_manager/cohort_planner.py
+"""
+План постановки задач apply_for_resume для когорты пользователей.
+
+Очередь пользователя определяется по плану подписки. Раньше она читалась
+отдельным запросом на каждого пользователя (N+1). Здесь весь план собирается
+двумя запросами: подписки (user_id, plan, status) и активные резюме.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from tortoise.expressions import Q
+from tortoise.timezone import now
+
+from src.config.celery_config import config as celery_cfg
+from src.models import Resume, Subscription, Plan, SubscriptionStatus
+
+
+def queue_for_subscription(plan: Optional[str], status: Optional[str]) -> str:
+    """Очередь по плану и статусу подписки (нет подписки/неактивна — low)."""
+    if status != SubscriptionStatus.ACTIVE:
+        return celery_cfg.queues_low
+    if plan in (Plan.PLUS, Plan.PRO):
+        return celery_cfg.queues_high
+    if plan == Plan.FREE:
+        return celery_cfg.queues_low
+    return celery_cfg.queues_normal
+
+
+@dataclass
+class EnqueuePlan:
+    """Что и куда ставить: очередь каждого пользователя и резюме по очередям."""
+    user_queues: Dict[int, str] = field(default_factory=dict)
+    resumes_by_queue: Dict[str, List[str]] = field(default_factory=lambda: defaultdict(list))
+    resumes_per_user: Dict[int, int] = field(default_factory=lambda: defaultdict(int))
+
+    @property
+    def total_resumes(self) -> int:
+        return sum(len(rids) for rids in self.resumes_by_queue.values())
+
+
+def _active_subscription_q(prefix: str = "") -> Q:
+    return Q(**{f"{prefix}status": SubscriptionStatus.ACTIVE}) & (
+        Q(**{f"{prefix}expires_at": None}) | Q(**{f"{prefix}expires_at__gt": now()})
+    )
+
+
+async def build_enqueue_plan(
+    *,
+    user_ids: Optional[Iterable[int]] = None,
+    plans: Optional[Iterable[str]] = None,
+) -> EnqueuePlan:
+    """
+    Собирает план постановки за два запроса.
+
+    Args:
+        user_ids: Конкретные пользователи (ручной запуск). Их резюме ставятся
+            даже без активной подписки — в low, как и раньше.
+        plans: Ограничить когорту планами подписки (только без user_ids)
+
+    Returns:
+        EnqueuePlan
+    """
+    result = EnqueuePlan()
+
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return result
+        subs = await Subscription.filter(user_id__in=user_ids).values_list("user_id", "plan", "status")
+        by_user = {uid: (plan, status) for uid, plan, status in subs}
+        for uid in user_ids:
+            plan, status = by_user.get(uid, (None, None))
+            result.user_queues[uid] = queue_for_subscription(plan, status)
+        resume_q = Resume.filter(user_id__in=user_ids, status="active")
+    else:
+        sub_q = Subscription.filter(_active_subscription_q())
+        resume_q = Resume.filter(_active_subscription_q("user__subscription__"), status="active")
+        if plans is not None:
+            plans = list(plans)
+            sub_q = sub_q.filter(plan__in=plans)
+            resume_q = resume_q.filter(user__subscription__plan__in=plans)
+        for uid, plan, status in await sub_q.values_list("user_id", "plan", "status"):
+            result.user_queues[uid] = queue_for_subscription(plan, status)
+
+    for rid, uid in await resume_q.values_list("id", "user_id"):
+        queue = result.user_queues.get(uid)
+        if queue is None:
+            continue
+        result.resumes_by_queue[queue].append(rid)
+        result.resumes_per_user[uid] += 1
+
+    return result
+
+
+if __name__ == "__main__":
+    # Сравнение с построением плана по одному пользователю (N+1) на in-memory SQLite:
+    #   python -m src.services.task_manager.cohort_planner 10000 100000
+    import asyncio
+    import sys
+    import time
+
+    from tortoise import Tortoise
+
+    from src.models import User
+
+    async def _old_plan() -> int:
+        total = 0
+        uids = await Subscription.filter(_active_subscription_q()).values_list("user_id", flat=True)
+        for uid in uids:
+            sub = await Subscription.get_or_none(user_id=uid)
+            queue_for_subscription(sub.plan if sub else None, sub.status if sub else None)
+            total += len(await Resume.filter(user_id=uid, status="active").values_list("id", flat=True))
+        return total
+
+    async def _bench(n: int) -> None:
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["src.models"]})
+        await Tortoise.generate_schemas()
+        plans_cycle = (Plan.FREE, Plan.PLUS, Plan.PRO)
+        await User.bulk_create([User(id=i) for i in range(1, n + 1)], batch_size=5000)
+        await Subscription.bulk_create(
+            [Subscription(user_id=i, plan=plans_cycle[i % 3]) for i in range(1, n + 1)], batch_size=5000
+        )
+        await Resume.bulk_create(
+            [Resume(id=f"r{i}_{k}", user_id=i, status="active") for i in range(1, n + 1) for k in range(2)],
+            batch_size=5000,
+        )
+
+        t0 = time.perf_counter()
+        old_total = await _old_plan()
+        old_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        plan = await build_enqueue_plan()
+        new_s = time.perf_counter() - t0
+
+        assert plan.total_resumes == old_total
+        print(f"users={n}: per-user {old_s:.2f}s, planner {new_s:.2f}s ({old_s / new_s:.0f}x)")
+        await Tortoise.close_connections()
+
+    for arg in sys.argv[1:] or ["10000"]:
+        asyncio.run(_bench(int(arg)))
@@ -4,6 +4,7 @@ from typing import Iterable
 
 from src.celery_app import celery_app
 from src.config.celery_config import config as celery_cfg
+from src.services.task_manager.batch_publisher import publish_batched
 
 # Импортируем таски, если хотим прямые вызовы .delay()
 from src.workers.application_sender_worker import schedule_bulk_apply, apply_for_resume
@@ -24,14 +25,11 @@ def enqueue_bulk_apply_for_user(user_id: int) -> str:
 
 def enqueue_apply_for_resumes(resume_ids: Iterable[str]) -> list[str]:
     """
-    Массовая постановка задач для набора резюме.
+    Массовая постановка задач для набора резюме (пакетами, см. publish_batched).
     """
-    task_ids: list[str] = []
-    for rid in resume_ids:
-        res = apply_for_resume.apply_async(
-            kwargs={"resume_id": rid},
-            queue=celery_cfg.queues_normal,
-            routing_key="q.normal",
-        )
-        task_ids.append(res.id)
-    return task_ids
+    return publish_batched(
+        apply_for_resume,
+        [[rid] for rid in resume_ids],
+        queue=celery_cfg.queues_normal,
+        routing_key="q.normal",
+    )
@@ -0,0 +1,92 @@
+# src/services/vacancy/filter.py
+"""
+Локальный фильтр выдачи поиска HH.
+
+NOT-термы в строке запроса (build_search_query) HH применяет нестрого,
+поэтому элементы выдачи дополнительно проверяются у нас — до запроса деталей
+вакансии и вызова LLM. Все минус-слова собираются в одно регулярное выражение,
+которое компилируется один раз на резюме.
+"""
+from __future__ import annotations
+
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+# HH подсвечивает совпадения в сниппетах тегом <highlighttext>
+_HIGHLIGHT_RE = re.compile(r"</?highlighttext>")
+
+
+class VacancyFilter:
+    """
+    Отбрасывает элементы выдачи по минус-словам (название, работодатель, сниппет)
+    и по списку исключённых работодателей (id или название).
+    Считает, сколько элементов убрало каждое правило.
+    """
+
+    def __init__(
+        self,
+        negative_keywords: Optional[Iterable[str]] = None,
+        excluded_employers: Optional[Iterable[Any]] = None,
+    ) -> None:
+        # lower -> исходное написание (для читаемых счётчиков)
+        self._keywords = {w.strip().lower(): w.strip() for w in (negative_keywords or []) if w and w.strip()}
+        self._keyword_re: Optional[re.Pattern] = None
+        if self._keywords:
+            # Длинные слова раньше коротких, чтобы "java script" не съедалось "java"
+            alternatives = "|".join(re.escape(w) for w in sorted(self._keywords, key=len, reverse=True))
+            self._keyword_re = re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)", re.IGNORECASE)
+
+        self._employers = {str(e).strip().lower() for e in (excluded_employers or []) if e and str(e).strip()}
+
+        self.checked = 0
+        self.removed: Counter = Counter()
+
+    @property
+    def is_empty(self) -> bool:
+        return self._keyword_re is None and not self._employers
+
+    @staticmethod
+    def _searchable_text(item: Dict[str, Any]) -> str:
+        employer = item.get("employer") or {}
+        snippet = item.get("snippet") or {}
+        parts = [
+            item.get("name") or "",
+            employer.get("name") or "",
+            snippet.get("requirement") or "",
+            snippet.get("responsibility") or "",
+        ]
+        return _HIGHLIGHT_RE.sub("", "\n".join(parts))
+
+    def rejection_reason(self, item: Dict[str, Any]) -> Optional[str]:
+        """
+        Имя сработавшего правила ("employer:<...>" / "keyword:<...>") или None, если элемент проходит.
+        """
+        if self._employers:
+            employer = item.get("employer") or {}
+            employer_id = str(employer.get("id") or "").strip()
+            employer_name = (employer.get("name") or "").strip().lower()
+            if employer_id and employer_id in self._employers:
+                return f"employer:{employer_id}"
+            if employer_name and employer_name in self._employers:
+                return f"employer:{employer_name}"
+
+        if self._keyword_re is not None:
+            match = self._keyword_re.search(self._searchable_text(item))
+            if match:
+                word = match.group(0).lower()
+                return f"keyword:{self._keywords.get(word, word)}"
+
+        return None
+
+    def apply(self, items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Возвращает элементы, прошедшие фильтр, и обновляет счётчики."""
+        kept = []
+        for item in items:
+            self.checked += 1
+            reason = self.rejection_reason(item)
+            if reason is None:
+                kept.append(item)
+            else:
+                self.removed[reason] += 1
+        return kept
@@ -98,10 +98,14 @@ def extract_job_description_from_vacancy(vacancy_data):
         job_description_parts.append(f"ЯЗЫКИ: {languages_text}")
 
     if description:
-        # Удаляем HTML-теги из описания (базово)
+        # Удаляем HTML-теги из описания (базово), сохраняя абзацы и пункты списков —
+        # по ним бюджет токенов отбрасывает наименее полезные части
         import re
-        clean_description = re.sub(r'<[^>]+>', '', description)
-        clean_description = re.sub(r'\s+', ' ', clean_description).strip()
+        clean_description = re.sub(r'<br\s*/?>|</(?:p|li|ul|ol|div|h\d)>', '\n', description, flags=re.IGNORECASE)
+        clean_description = re.sub(r'<[^>]+>', '', clean_description)
+        clean_description = "\n".join(
+            line for line in (re.sub(r'\s+', ' ', part).strip() for part in clean_description.split('\n')) if line
+        )
         job_description_parts.append(f"\nОПИСАНИЕ ВАКАНСИИ:\n{clean_description}")
 
     return "\n".join(job_description_parts)
\ No newline at end of file
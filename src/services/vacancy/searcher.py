@@ -0,0 +1,67 @@
+# src/services/vacancy/searcher.py
+"""
+Ленивый постраничный поиск похожих вакансий.
+
+Страницы запрашиваются по одной и только пока потребителю нужны кандидаты:
+достаточно выйти из `async for`, и следующая страница не будет загружена.
+"""
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from src.config import config
+
+# HH отдаёт не больше 2000 элементов выдачи (per_page * (page + 1) <= 2000)
+HH_MAX_ITEMS = 2000
+HH_MAX_PER_PAGE = 100
+
+
+def page_size_for_cap(cap: Optional[int]) -> int:
+    """
+    Размер страницы под лимит откликов: с запасом на пропуски (тесты, фильтры, дубли),
+    но без выкачивания 100 элементов ради 3 откликов.
+    """
+    if cap is None:
+        return HH_MAX_PER_PAGE
+    size = max(config.apply.search_min_page_size, cap * config.apply.search_page_factor)
+    return min(size, HH_MAX_PER_PAGE)
+
+
+async def iter_similar_vacancies(
+    hhc: Any,
+    *,
+    resume_id: str,
+    text: Optional[str] = None,
+    page_size: int = HH_MAX_PER_PAGE,
+    max_pages: Optional[int] = None,
+    **params: Any,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Асинхронный генератор страниц HHClient.search_similar_vacancies.
+
+    Args:
+        hhc: Клиент HH
+        resume_id: ID резюме
+        text: Строка поиска
+        page_size: Размер страницы (per_page)
+        max_pages: Максимум страниц (по умолчанию — сколько позволяет HH)
+        **params: Прочие параметры поиска (salary, schedule и т.п.)
+
+    Yields:
+        List[dict]: Элементы очередной страницы выдачи
+    """
+    page_size = max(1, min(page_size, HH_MAX_PER_PAGE))
+    pages_limit = HH_MAX_ITEMS // page_size
+    if max_pages is not None:
+        pages_limit = min(pages_limit, max_pages)
+
+    for page in range(pages_limit):
+        items = await hhc.search_similar_vacancies(
+            resume_id=resume_id, text=text, per_page=page_size, page=page, **params
+        )
+        if not items:
+            return
+        yield items
+        if len(items) < page_size:
+            # Неполная страница — дальше пусто
+            return
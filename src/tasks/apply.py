@@ -1,77 +1,496 @@
 # src/tasks/apply.py
-from typing import Optional
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import Optional, List, Dict, Any
 
 from hh_api.client import HHClient
 
 from src.config import config
 from src.db.init import init_db, close_db
-from src.models import Resume, ApplicationResult
-from src.services.ai.cover_letter_service import generate_cover_letter
+from src.models import Resume, ApplicationResult, ApplicationHistory, ApplicationStatus
+from src.services.ai.cover_letter_service import (
+    can_generate_letters,
+    generate_cover_letters,
+    generate_letter_for_vacancy,
+)
 from src.services.hh.auth.token_manager import tm
-from src.services.resume.parser import extract_resume_description_from_json
+from src.services.hh.client import get_hh_client
+from src.services.resume.profile import get_resume_prompt_inputs
 from src.services.vacancy.parser import extract_job_description_from_vacancy
+from src.services.vacancy.filter import VacancyFilter
+from src.services.vacancy.searcher import iter_similar_vacancies, page_size_for_cap
+from src.utils.cache import CacheStats, vacancy_cache, vacancy_version, letter_cache
+from src.utils.run_stats import RunStats, run_stats_scope
 
 from src.services.ai.openai_pool import (
     setup as ai_setup,
     teardown as ai_teardown,
     OpenAISettings,
+    UsageStats,
+    PoolStats,
+    USAGE_STATS,
+    POOL_STATS,
+    BACKEND_STATS_PREFIX,
+    backend_stats,
+    llm_call_context,
+    llm_deadline_exceeded,
+    LLMDeadlineExceeded,
+    ProviderUnavailable,
 )
 
+logger = logging.getLogger(__name__)
 
-async def apply_for_resume_task(resume_id: str, cap: Optional[int] = None):
 
-    resume = await Resume.get(id=resume_id)
-    user_id = resume.user_id
+class _DeadlineReached(Exception):
+    """Дедлайн LLM наступил посреди обработки вакансий; sent — сколько откликов уже ушло."""
 
-    hhc = HHClient(tm=tm, user_agent=config.hh.user_agent, subject=user_id)
+    def __init__(self, sent: int) -> None:
+        super().__init__(f"deadline reached after {sent} application(s)")
+        self.sent = sent
+
+
+async def _prepare_cover_letter(
+    hhc: HHClient, item: Dict[str, Any], resume_text: str, profile: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Загружает вакансию (через общий кэш) и генерирует для неё сопроводительное письмо
+    (режим — config.ai.letter_mode, профиль резюме нужен режиму "slots").
+    """
+    vacancy = await vacancy_cache.get(hhc, item.get('id'), version=vacancy_version(item))
+    return await generate_letter_for_vacancy(resume_text, vacancy, profile)
+
+
+async def _drop_already_applied(resume_id: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Отбрасывает вакансии, на которые резюме уже откликалось.
+    Один запрос vacancy_id__in на страницу выдачи.
+    """
+    found_ids = [str(i.get('id')) for i in items if i.get('id')]
+    if not found_ids:
+        return []
+    already = set(
+        await ApplicationHistory.filter(
+            resume_id=resume_id,
+            vacancy_id__in=found_ids,
+            status__in=[ApplicationStatus.SENT, ApplicationStatus.SUCCESS],
+        ).values_list("vacancy_id", flat=True)
+    )
+    return [i for i in items if i.get('id') and str(i.get('id')) not in already]
 
-    text = getattr(resume, "keywords", "") or ""
-    negative_keywords = resume.negative_keywords
-    resume_json = await hhc.get_resume(resume_id)
-    resume_text = extract_resume_description_from_json(resume_json)
+
+async def collect_candidates(
+    hhc: HHClient,
+    resume: Resume,
+    cap: int,
+    *,
+    exclude: frozenset = frozenset(),
+) -> List[Dict[str, Any]]:
+    """
+    Подбирает до cap вакансий для отклика (фильтры, дедуп, без тестов) без генерации писем.
+    Используется офлайн-генерацией, где письма и отклики идут позже.
+
+    Args:
+        exclude: id вакансий, которые уже ждут письма в другом batch
+    """
+    vacancy_filter = VacancyFilter(resume.negative_keywords, resume.excluded_employers)
+    candidates: List[Dict[str, Any]] = []
+    if cap <= 0:
+        return candidates
+
+    pages = iter_similar_vacancies(
+        hhc,
+        resume_id=resume.id,
+        text=getattr(resume, "keywords", "") or "",
+        page_size=page_size_for_cap(cap),
+        max_pages=config.apply.search_max_pages,
+    )
+    async with aclosing(pages):
+        async for items in pages:
+            filtered_items = vacancy_filter.apply(items) if not vacancy_filter.is_empty else items
+            for item in await _drop_already_applied(resume.id, filtered_items):
+                if item.get('has_test') or str(item.get('id')) in exclude:
+                    continue
+                candidates.append(item)
+                if len(candidates) >= cap:
+                    return candidates
+    return candidates
+
+
+async def _apply_and_record(
+    hhc: HHClient,
+    user_id: int,
+    resume_id: str,
+    vacancy_id: str,
+    cover_letter: str,
+) -> bool:
+    """
+    Отправляет отклик и пишет попытку в ApplicationHistory.
+    Ошибка отклика на одну вакансию не прерывает обработку резюме.
+
+    Returns:
+        bool: True, если HH принял отклик
+    """
+    error = None
+    try:
+        ok = await hhc.apply_to_vacancy(
+            resume_id=resume_id,
+            vacancy_id=vacancy_id,
+            message=cover_letter,
+        )
+        if not ok:
+            error = "HH did not accept the application"
+    except Exception as e:
+        logger.exception("apply_to_vacancy failed: resume_id=%s vacancy_id=%s", resume_id, vacancy_id)
+        ok = False
+        error = str(e)
 
     try:
-        items = await hhc.search_similar_vacancies(resume_id=resume_id, text=text, per_page=100)
+        if ok:
+            await ApplicationHistory.mark_success(
+                user_id=user_id, resume_id=resume_id, vacancy_id=str(vacancy_id), cover_letter=cover_letter,
+            )
+        else:
+            await ApplicationHistory.mark_failed(
+                user_id=user_id, resume_id=resume_id, vacancy_id=str(vacancy_id), error=error,
+            )
     except Exception:
-        raise
+        logger.exception("ApplicationHistory write failed: resume_id=%s vacancy_id=%s", resume_id, vacancy_id)
+    return ok
+
+
+async def _apply_concurrently(
+    hhc: HHClient,
+    user_id: int,
+    resume_id: str,
+    resume_text: str,
+    candidates: List[Dict[str, Any]],
+    cap: Optional[int],
+    concurrency: int,
+    profile: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Готовит письма для нескольких вакансий одновременно (не больше concurrency штук),
+    а сами отклики отправляет строго по одному под замком, поэтому cap не превышается,
+    даже если несколько писем готовы одновременно. Как только cap достигнут,
+    оставшаяся работа отменяется. Ошибка подготовки одной вакансии (HH, LLM)
+    пишется в лог и на остальные не влияет.
+
+    Returns:
+        int: Число отправленных откликов
+
+    Raises:
+        _DeadlineReached: Письмо не успевает к дедлайну LLM (остальная работа отменена)
+    """
+    if cap is not None and cap <= 0:
+        return 0
+    if cap is not None:
+        # Нет смысла генерировать больше писем, чем мы можем отправить
+        concurrency = min(concurrency, cap)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    apply_lock = asyncio.Lock()
+    cap_reached = asyncio.Event()   # или генерация недоступна — дальше не идём
+    deadline_reached = False
     sent = 0
-    skipped = []
 
-    for item in items:
+    async def _process(item: Dict[str, Any]) -> None:
+        nonlocal sent, deadline_reached
         vacancy_id = item.get('id')
+        async with semaphore:
+            if cap_reached.is_set():
+                return
+            try:
+                cover_letter = await _prepare_cover_letter(hhc, item, resume_text, profile)
+            except ProviderUnavailable:
+                logger.warning("[openai] provider unavailable, stopping resume_id=%s", resume_id)
+                cap_reached.set()
+                return
+            except LLMDeadlineExceeded:
+                deadline_reached = True
+                cap_reached.set()
+                return
+            except Exception:
+                logger.exception("cover letter failed: resume_id=%s vacancy_id=%s", resume_id, vacancy_id)
+                return
+
+        async with apply_lock:
+            if cap_reached.is_set():
+                return
+            if not await _apply_and_record(hhc, user_id, resume_id, vacancy_id, cover_letter):
+                return
+            sent += 1
+            if cap is not None and sent >= cap:
+                cap_reached.set()
+
+    tasks = [asyncio.create_task(_process(item)) for item in candidates]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            await fut
+            if cap_reached.is_set():
+                break
+    finally:
+        # Отменяем лишнюю работу (и всё остальное, если что-то упало)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    if deadline_reached:
+        raise _DeadlineReached(sent)
+    return sent
+
+
+async def _apply_sequentially(
+    hhc: HHClient,
+    user_id: int,
+    resume_id: str,
+    resume_text: str,
+    candidates: List[Dict[str, Any]],
+    cap: Optional[int],
+    profile: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Обрабатывает вакансии строго по одной, пока не достигнут cap.
+
+    Returns:
+        int: Число отправленных откликов
+
+    Raises:
+        _DeadlineReached: Письмо не успевает к дедлайну LLM
+    """
+    sent = 0
+    for item in candidates:
         if cap is not None and sent >= cap:
             break
-        if item.get('has_test'):
-            skipped.append(vacancy_id)
-            continue
-        vacancy = await hhc.get_vacancy(vacancy_id=vacancy_id)
-        # print(f'vacancy: {vacancy}')
-        # Извлекаем описание вакансии из JSON
-        job_description_text = extract_job_description_from_vacancy(vacancy)
-        # print(f'job_description_text: {job_description_text}')
-        cover_letter = await generate_cover_letter(resume_text, job_description_text)
-        # print(f"cover_letter: {cover_letter}")
         try:
-            await hhc.apply_to_vacancy(
-                resume_id=resume_id,
-                vacancy_id=vacancy_id,
-                message=cover_letter,
-            )
+            cover_letter = await _prepare_cover_letter(hhc, item, resume_text, profile)
+        except ProviderUnavailable:
+            logger.warning("[openai] provider unavailable, stopping resume_id=%s", resume_id)
+            break
+        except LLMDeadlineExceeded:
+            raise _DeadlineReached(sent)
         except Exception:
-            raise
-        sent += 1
+            logger.exception("cover letter failed: resume_id=%s vacancy_id=%s", resume_id, item.get('id'))
+            continue
+        if await _apply_and_record(hhc, user_id, resume_id, item.get('id'), cover_letter):
+            sent += 1
+    return sent
+
+
+async def _apply_grouped(
+    hhc: HHClient,
+    user_id: int,
+    resume_id: str,
+    resume_text: str,
+    candidates: List[Dict[str, Any]],
+    cap: Optional[int],
+    group_size: int,
+) -> int:
+    """
+    Письма готовятся группами по group_size вакансий одним запросом к модели
+    (generate_cover_letters), отклики отправляются по одному. Группа не больше, чем
+    осталось до cap, чтобы не генерировать лишних писем.
+
+    Returns:
+        int: Число отправленных откликов
+
+    Raises:
+        _DeadlineReached: Письма не успевают к дедлайну LLM
+    """
+    sent = 0
+    pos = 0
+    while pos < len(candidates):
+        size = group_size if cap is None else min(group_size, cap - sent)
+        if size <= 0:
+            break
+        group, pos = candidates[pos:pos + size], pos + size
+        vacancies = await asyncio.gather(
+            *(vacancy_cache.get(hhc, item.get('id'), version=vacancy_version(item)) for item in group),
+            return_exceptions=True,
+        )
+        ready = []
+        for item, vacancy in zip(group, vacancies):
+            if isinstance(vacancy, Exception):
+                logger.warning("get_vacancy failed: vacancy_id=%s: %s", item.get('id'), vacancy)
+                continue
+            ready.append((item, extract_job_description_from_vacancy(vacancy)))
+        if not ready:
+            continue
+        try:
+            letters = await generate_cover_letters(resume_text, [text for _, text in ready])
+        except ProviderUnavailable:
+            logger.warning("[openai] provider unavailable, stopping resume_id=%s", resume_id)
+            break
+        except LLMDeadlineExceeded:
+            raise _DeadlineReached(sent)
+        for (item, _), cover_letter in zip(ready, letters):
+            if cover_letter is None:
+                # Письмо не получилось (причина в логе) — вакансию подхватит следующий прогон
+                continue
+            if await _apply_and_record(hhc, user_id, resume_id, item.get('id'), cover_letter):
+                sent += 1
+    return sent
+
+
+async def apply_for_resume_task(resume_id: str, cap: Optional[int] = None, concurrency: Optional[int] = None):
+    """
+    Откликается на подходящие вакансии по резюме.
+
+    Выдача поиска читается постранично и лениво: следующая страница запрашивается,
+    только если на предыдущей не набралось cap откликов.
+
+    Args:
+        resume_id: ID резюме
+        cap: Максимум откликов за прогон (None — без ограничения)
+        concurrency: Сколько вакансий готовить параллельно (по умолчанию config.apply.concurrency).
+            1 — строго последовательная обработка.
+
+    Returns:
+        int: Число отправленных откликов
+
+    Raises:
+        LLMDeadlineExceeded: Дедлайн llm_deadline() наступил до конца прогона. Отправленное
+            до него есть в ApplicationHistory, ApplicationResult не пишется: резюме нужно
+            обработать заново (продолжением), и итог запишет оно
+    """
+    if concurrency is None:
+        concurrency = config.apply.concurrency
+
+    if llm_deadline_exceeded():
+        # Письма уже не успеть — не тратим запросы к HH
+        raise LLMDeadlineExceeded(f"resume_id={resume_id}: deadline reached before start")
+    if not can_generate_letters():
+        # Генерация писем сейчас невозможна — не тратим запросы к HH, резюме обработает следующий прогон
+        logger.warning("[openai] provider unavailable, skipping resume_id=%s", resume_id)
+        return 0
+
+    resume = await Resume.get(id=resume_id)
+    # Вызовы LLM прогона попадают в журнал расходов с пользователем и резюме, а счётчики
+    # кэшей и пула OpenAI — в статистику этого прогона (параллельные прогоны их не смешивают)
+    with llm_call_context(user_id=resume.user_id, resume_id=resume_id), run_stats_scope() as run:
+        return await _apply_for_resume(resume, cap, concurrency, run)
+
+
+async def _apply_for_resume(resume: Resume, cap: Optional[int], concurrency: int, run: RunStats) -> int:
+    resume_id = resume.id
+    user_id = resume.user_id
+
+    hhc = get_hh_client(user_id)
+
+    text = getattr(resume, "keywords", "") or ""
+    negative_keywords = resume.negative_keywords
+    resume_text, profile = await get_resume_prompt_inputs(resume, hhc)
+
+    sent = 0
+    skipped = []
+    total_found = 0
+    already_applied = 0
+    vacancy_filter = VacancyFilter(negative_keywords, resume.excluded_employers)
+
+    pages = iter_similar_vacancies(
+        hhc,
+        resume_id=resume_id,
+        text=text,
+        page_size=page_size_for_cap(cap),
+        # Без лимита обрабатываем одну полную страницу, как раньше
+        max_pages=config.apply.search_max_pages if cap is not None else 1,
+    )
+    deadline_error = None
+    try:
+        async with aclosing(pages):
+            async for items in pages:
+                total_found += len(items)
+
+                filtered_items = vacancy_filter.apply(items) if not vacancy_filter.is_empty else items
+                fresh_items = await _drop_already_applied(resume_id, filtered_items)
+                already_applied += len(filtered_items) - len(fresh_items)
+
+                candidates = []
+                for item in fresh_items:
+                    if item.get('has_test'):
+                        skipped.append(item.get('id'))
+                        continue
+                    candidates.append(item)
+
+                remaining = cap - sent if cap is not None else None
+                if config.ai.letter_group_size > 1 and config.ai.letter_mode == "full":
+                    sent += await _apply_grouped(
+                        hhc, user_id, resume_id, resume_text, candidates, remaining, config.ai.letter_group_size
+                    )
+                elif concurrency > 1:
+                    sent += await _apply_concurrently(
+                        hhc, user_id, resume_id, resume_text, candidates, remaining, concurrency, profile
+                    )
+                else:
+                    sent += await _apply_sequentially(
+                        hhc, user_id, resume_id, resume_text, candidates, remaining, profile
+                    )
+
+                if cap is not None and sent >= cap:
+                    break
+                if not can_generate_letters():
+                    break
+    except _DeadlineReached as e:
+        # Отправленное до дедлайна учитываем; резюме доработает продолжение когорты
+        sent += e.sent
+        deadline_error = LLMDeadlineExceeded(f"resume_id={resume_id}: deadline reached after {sent} application(s)")
+        logger.warning("[openai] deadline reached, stopping resume_id=%s sent=%d", resume_id, sent)
+
+    if vacancy_filter.removed:
+        logger.info("[vacancy_filter] resume_id=%s: removed %d of %d: %s",
+                    resume_id, sum(vacancy_filter.removed.values()), vacancy_filter.checked,
+                    dict(vacancy_filter.removed))
+    if already_applied:
+        logger.info("resume_id=%s: skipped %d already applied vacancies", resume_id, already_applied)
+
+    _log_run_stats(resume_id, run)
+
+    if deadline_error is not None:
+        # Итог прогона запишет продолжение (отклики до дедлайна уже в ApplicationHistory)
+        raise deadline_error
 
     # Сохраняем краткий результат в ApplicationResult
     await ApplicationResult.create(
         user_id=user_id,
         resume_id=resume_id,
-        total_vacancies=len(items),
+        total_vacancies=total_found,
         sent_applications=sent,
         skipped_tests=skipped,
     )
     return sent
 
 
+def _log_run_stats(resume_id: str, run: RunStats) -> None:
+    """Статистика кэшей и пула OpenAI за прогон резюме."""
+    cache_run = run.group(vacancy_cache.name, CacheStats)
+    logger.info(
+        "[vacancy_cache] resume_id=%s: hits=%d (local=%d, redis=%d), misses=%d, stale=%d, errors=%d",
+        resume_id, cache_run.hits, cache_run.local_hits, cache_run.redis_hits,
+        cache_run.misses, cache_run.stale, cache_run.errors,
+    )
+    letters_run = run.group(letter_cache.name, CacheStats)
+    if letters_run.hits or letters_run.errors:
+        logger.info("[letter_cache] resume_id=%s: hits=%d, misses=%d, errors=%d",
+                    resume_id, letters_run.hits, letters_run.misses, letters_run.errors)
+    usage_run = run.group(USAGE_STATS, UsageStats)
+    if usage_run.calls:
+        logger.info("[openai] resume_id=%s: calls=%d, prompt_tokens=%d, cached_tokens=%d (%.0f%%), completion_tokens=%d",
+                    resume_id, usage_run.calls, usage_run.prompt_tokens, usage_run.cached_tokens,
+                    usage_run.cached_ratio * 100, usage_run.completion_tokens)
+    pool_run = run.group(POOL_STATS, PoolStats)
+    if pool_run.requests:
+        logger.info("[openai] resume_id=%s: requests=%d, queued=%d, avg_wait=%.2fs, coalesced=%d",
+                    resume_id, pool_run.requests, pool_run.queued, pool_run.avg_wait, pool_run.coalesced)
+    if pool_run.hedged:
+        logger.info("[openai] resume_id=%s: hedged=%d, hedge_wins=%d",
+                    resume_id, pool_run.hedged, pool_run.hedge_wins)
+    if len(backend_stats()) > 1:
+        for name, stats in run.groups(BACKEND_STATS_PREFIX).items():
+            if stats.requests:
+                logger.info("[openai] resume_id=%s backend=%s: requests=%d, ok=%d, 429=%d, 5xx=%d, timeouts=%d, "
+                            "conn=%d, avg_latency=%.2fs", resume_id, name, stats.requests, stats.successes,
+                            stats.rate_limited, stats.server_errors, stats.timeouts,
+                            stats.connection_errors, stats.avg_latency)
+
+
 async def _main(resume_id: str, cap: int = 2) -> None:
     await init_db()
     resume = await Resume.get(id=resume_id)
@@ -0,0 +1,259 @@
+# src/tasks/cohort.py
+"""
+Прогон когорты пользователей (платные — каждый час, free — раз в день).
+
+Пользователи обрабатываются параллельно, но не больше config.apply.cohort_concurrency
+одновременно. Резюме одного пользователя идут последовательно — так остаток лимита
+откликов на пользователя считается корректно. Ошибка или зависание одного
+пользователя не мешает остальным: он просто попадает в failed/timed_out.
+
+Прогон может быть ограничен дедлайном (лимиты времени задачи Celery). Пользователи
+идут по возрастанию id, курсор (последний id, до которого включительно все обработаны)
+вместе с id уже обработанных пользователей за курсором сохраняется в Redis, и продолжение
+прогона начинает с курсора, пропуская обработанных. Пользователь, которому не хватило
+времени до дедлайна LLM (LLMDeadlineExceeded), считается отложенным, а не обработанным:
+курсор за него не сдвигается.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Iterable, List, Optional, Set, Tuple
+
+from src.config import config
+from src.models import ApplicationHistory, ApplicationStatus
+from src.services.ai.openai_pool import LLMDeadlineExceeded
+from src.tasks.apply import apply_for_resume_task
+from src.utils.cache import get_redis
+from src.utils.selectors import get_active_user_ids, get_active_resume_ids
+
+logger = logging.getLogger(__name__)
+
+CURSOR_TTL = 24 * 3600
+
+ProcessResume = Callable[[str, Optional[int]], Awaitable[int]]
+
+
+@dataclass
+class CohortStats:
+    """Итоги прогона когорты."""
+    users: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    deferred: int = 0               # не успели до дедлайна LLM — остаются за курсором
+    sent: int = 0
+    cursor: Optional[int] = None    # все пользователи с id <= cursor обработаны
+    finished: bool = True           # False — прогон остановлен по дедлайну, нужно продолжение
+
+
+def _cursor_key(run_id: str) -> str:
+    return f"cohort:cursor:{run_id}"
+
+
+async def load_cursor(run_id: str) -> Tuple[Optional[int], Set[int]]:
+    """Сохранённый курсор прогона (или None) и id обработанных пользователей за ним."""
+    try:
+        raw = await get_redis().get(_cursor_key(run_id))
+    except Exception:
+        logger.warning("[cohort] cannot load cursor for run_id=%s", run_id, exc_info=True)
+        return None, set()
+    if not raw:
+        return None, set()
+    data = json.loads(raw)
+    if isinstance(data, int):
+        # Курсор, сохранённый до появления списка обработанных
+        return data, set()
+    return data.get("cursor"), set(data.get("done", ()))
+
+
+async def save_cursor(run_id: str, cursor: Optional[int], done: Iterable[int] = ()) -> None:
+    """Сохранить курсор прогона и обработанных за ним. Ошибка Redis не останавливает прогон."""
+    value = json.dumps({"cursor": cursor, "done": sorted(done)})
+    try:
+        await get_redis().set(_cursor_key(run_id), value, ex=CURSOR_TTL)
+    except Exception:
+        logger.warning("[cohort] cannot save cursor for run_id=%s", run_id, exc_info=True)
+
+
+async def _sent_since(user_id: int, since: datetime) -> int:
+    """Сколько откликов пользователя HH принял с начала прогона (в т.ч. в прерванной задаче)."""
+    return await ApplicationHistory.filter(
+        user_id=user_id, status=ApplicationStatus.SUCCESS, applied_at__gte=since,
+    ).count()
+
+
+async def process_user(
+    user_id: int,
+    per_user_cap: int,
+    process_resume: ProcessResume,
+    started_at: Optional[datetime] = None,
+) -> int:
+    """
+    Обрабатывает активные резюме пользователя по очереди, распределяя лимит откликов.
+    Если резюме упало, остальные резюме пользователя в этом прогоне не трогаем:
+    сколько откликов успело уйти — неизвестно, и остаток лимита мог бы быть превышен.
+
+    Args:
+        started_at: Начало прогона. Если задано, отклики, уже отправленные с этого момента
+            (например, до обрыва предыдущей задачи), вычитаются из лимита.
+
+    Returns:
+        int: Число откликов, отправленных этим вызовом (без отправленных до обрыва)
+    """
+    remaining = per_user_cap
+    if started_at is not None:
+        remaining -= await _sent_since(user_id, started_at)
+    total = 0
+    for rid in await get_active_resume_ids(user_id):
+        if remaining <= 0:
+            break
+        sent = await process_resume(rid, remaining)
+        remaining -= sent
+        total += sent
+    return total
+
+
+async def run_cohort(
+    plans: Iterable[str],
+    *,
+    per_user_cap: int,
+    concurrency: Optional[int] = None,
+    user_timeout: Optional[float] = None,
+    process_resume: Optional[ProcessResume] = None,
+    run_id: Optional[str] = None,
+    after_user_id: Optional[int] = None,
+    deadline: Optional[float] = None,
+    started_at: Optional[datetime] = None,
+) -> CohortStats:
+    """
+    Прогон всех пользователей с активной подпиской из plans.
+
+    Args:
+        plans: Планы подписки ("free", "plus", "pro")
+        per_user_cap: Максимум откликов на пользователя за прогон
+        concurrency: Сколько пользователей обрабатывать одновременно
+            (по умолчанию config.apply.cohort_concurrency)
+        user_timeout: Лимит времени на пользователя, сек (по умолчанию config.apply.cohort_user_timeout;
+            0 — без лимита). С дедлайном лимит, не меньший оставшегося времени, не применяется
+        process_resume: Обработчик резюме (resume_id, cap) -> sent; по умолчанию apply_for_resume_task
+        run_id: ID прогона; если задан, курсор сохраняется в Redis и подхватывается продолжением
+        after_user_id: Обрабатывать только пользователей с id больше этого
+        deadline: Момент time.monotonic(), к которому прогон должен завершиться.
+            Новых пользователей перестаём брать за config.apply.cohort_drain_seconds до него,
+            незавершённых на дедлайне — отменяем (их подхватит продолжение).
+        started_at: Начало прогона (см. process_user)
+
+    Returns:
+        CohortStats: Итоги прогона
+    """
+    plans = list(plans)
+    if concurrency is None:
+        concurrency = config.apply.cohort_concurrency
+    if user_timeout is None:
+        user_timeout = config.apply.cohort_user_timeout
+    if process_resume is None:
+        process_resume = apply_for_resume_task
+    if deadline is not None and user_timeout and user_timeout >= deadline - time.monotonic():
+        # Такой лимит никогда не сработает раньше дедлайна, а пользователя с ним пометили бы обработанным
+        user_timeout = 0.0
+
+    # Обработанные в прерванной задаче пользователи за курсором (их курсор не прошёл из-за отложенных)
+    done_before: Set[int] = set()
+    if run_id is not None:
+        stored, done_before = await load_cursor(run_id)
+        if stored is not None and (after_user_id is None or stored > after_user_id):
+            after_user_id = stored
+
+    user_ids: List[int] = sorted(await get_active_user_ids(plans))
+    if after_user_id is not None:
+        user_ids = [uid for uid in user_ids if uid > after_user_id]
+    done_before &= set(user_ids)
+    if done_before:
+        logger.info("[cohort] skipping %d user(s) already processed past the cursor", len(done_before))
+
+    stats = CohortStats(users=len(user_ids) - len(done_before), cursor=after_user_id)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    launch_until = deadline - config.apply.cohort_drain_seconds if deadline is not None else None
+    done = set(done_before)
+    next_pos = 0  # первый пользователь (по порядку), который ещё не обработан
+
+    def _advance() -> None:
+        nonlocal next_pos
+        while next_pos < len(user_ids) and user_ids[next_pos] in done:
+            stats.cursor = user_ids[next_pos]
+            done.discard(stats.cursor)
+            next_pos += 1
+
+    async def _mark_done(uid: int) -> None:
+        done.add(uid)
+        _advance()
+        if run_id is not None:
+            # Вместе с курсором — обработанные за ним, чтобы продолжение их не повторяло
+            await save_cursor(run_id, stats.cursor, done)
+
+    _advance()
+
+    async def _run_user(uid: int) -> None:
+        try:
+            try:
+                sent = await asyncio.wait_for(
+                    process_user(uid, per_user_cap, process_resume, started_at),
+                    timeout=user_timeout or None,
+                )
+            except LLMDeadlineExceeded:
+                # Как отмена по дедлайну: курсор не двигаем, пользователя доделает продолжение
+                stats.deferred += 1
+                logger.info("[cohort] user_id=%s deferred: LLM deadline reached", uid)
+                return
+            except asyncio.TimeoutError:
+                stats.timed_out += 1
+                logger.warning("[cohort] user_id=%s timed out after %.0fs", uid, user_timeout)
+            except Exception:
+                stats.failed += 1
+                logger.exception("[cohort] user_id=%s failed", uid)
+            else:
+                stats.succeeded += 1
+                stats.sent += sent
+            # Отменённые и отложенные по дедлайну сюда не доходят и остаются за курсором
+            await _mark_done(uid)
+        finally:
+            semaphore.release()
+
+    tasks = []
+    for uid in user_ids:
+        if uid in done_before:
+            continue
+        if launch_until is None:
+            await semaphore.acquire()
+        else:
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=max(0.0, launch_until - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            if time.monotonic() >= launch_until:
+                semaphore.release()
+                break
+        tasks.append(asyncio.create_task(_run_user(uid)))
+
+    if tasks:
+        timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning("[cohort] deadline reached, cancelled %d in-flight user(s)", len(pending))
+
+    stats.finished = next_pos >= len(user_ids)
+
+    logger.info(
+        "[cohort] plans=%s: users=%d, ok=%d, failed=%d, timed_out=%d, deferred=%d, sent=%d, cursor=%s, finished=%s",
+        plans, stats.users, stats.succeeded, stats.failed, stats.timed_out, stats.deferred, stats.sent,
+        stats.cursor, stats.finished,
+    )
+    return stats
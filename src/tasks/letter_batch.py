@@ -0,0 +1,348 @@
+# src/tasks/letter_batch.py
+"""
+Офлайн-генерация писем для free-когорты.
+
+Прогон когорты (run_cohort) вместо генерации и откликов только подбирает вакансии
+и складывает запросы к LLM в batch (LetterBatchCollector). Запросы по резюме сразу
+сохраняются в Redis (STAGED_KEY) — до того, как курсор когорты пройдёт пользователя,
+так что обрыв задачи их не теряет. В конце задачи (или при следующем опросе)
+накопленное уходит в Batch API одним JSONL, метаданные batch'а лежат в Redis.
+Периодическая задача apply_ready_batches опрашивает незавершённые batch'и и, когда
+письма готовы, отправляет отклики.
+
+Вакансии, уже ждущие письма, повторно не подбираются, а ожидающие отклики
+пользователя засчитываются в его лимит.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from src.config import config
+from src.models import Resume
+from src.services.ai.cover_letter_service import build_letter_messages, cover_letter_cache_key, valid_letter
+from src.services.ai.openai_pool import DEFAULT_MODEL, LLMCall, batch_request, get_batch_backend
+from src.services.ai.prompt_manager import PROMPT_VERSION
+from src.services.ai.usage_ledger import usage_ledger
+from src.services.hh.client import get_hh_client
+from src.services.resume.profile import get_resume_prompt_text
+from src.services.vacancy.parser import extract_job_description_from_vacancy
+from src.services.vacancy.searcher import HH_MAX_PER_PAGE
+from src.tasks.apply import collect_candidates, _apply_and_record
+from src.utils.cache import get_redis, letter_cache, vacancy_cache, vacancy_version
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "ai:batch:pending"
+# Запросы, ещё не отправленные в Batch API: по записи (JSON) на резюме
+STAGED_KEY = "ai:batch:staged"
+LOCK_KEY = "ai:batch:lock"
+LOCK_TTL = 120
+# Как часто сохранять прогресс откликов по готовому batch
+SAVE_EVERY = 20
+
+
+def _meta_key(batch_id: str) -> str:
+    return f"ai:batch:meta:{batch_id}"
+
+
+async def _load_meta(batch_id: str) -> Optional[Dict[str, Any]]:
+    raw = await get_redis().get(_meta_key(batch_id))
+    return json.loads(raw) if raw else None
+
+
+async def _save_meta(meta: Dict[str, Any]) -> None:
+    await get_redis().set(
+        _meta_key(meta["batch_id"]), json.dumps(meta, ensure_ascii=False), ex=config.apply.batch_meta_ttl
+    )
+
+
+async def _staged_entries() -> List[Dict[str, Any]]:
+    return [json.loads(raw) for raw in await get_redis().lrange(STAGED_KEY, 0, -1)]
+
+
+async def submit_staged() -> List[str]:
+    """
+    Отправить в Batch API все накопленные запросы (в т.ч. оставшиеся от оборванных задач).
+    Записи снимаются из Redis атомарно (LPOP), при ошибке отправки возвращаются обратно.
+
+    Returns:
+        list: ID отправленных batch'ей
+    """
+    redis = get_redis()
+    raw_entries = []
+    while True:
+        chunk = await redis.lpop(STAGED_KEY, 100)
+        if not chunk:
+            break
+        raw_entries.extend(chunk)
+    if not raw_entries:
+        return []
+
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+    for raw in raw_entries:
+        entry = json.loads(raw)
+        groups[(entry["backend"], entry["model"])].append(entry)
+
+    batch_ids = []
+    left = list(groups.items())
+    while left:
+        (backend_name, model), entries = left[0]
+        requests = [r for entry in entries for r in entry["requests"]]
+        items = {custom_id: item for entry in entries for custom_id, item in entry["items"].items()}
+        try:
+            batch_id = await get_batch_backend(backend_name).submit(requests)
+        except Exception:
+            # Неотправленное — обратно, заберёт следующий вызов
+            await redis.rpush(STAGED_KEY, *(
+                json.dumps(entry, ensure_ascii=False) for _, group in left for entry in group
+            ))
+            raise
+        left.pop(0)
+        await _save_meta({
+            "batch_id": batch_id,
+            "backend": backend_name,
+            "model": model,
+            "prompt_version": PROMPT_VERSION,
+            "state": "pending",
+            "created_at": time.time(),
+            "items": items,
+            "letters": {},
+        })
+        await redis.sadd(PENDING_KEY, batch_id)
+        logger.info("[letter_batch] submitted %s via %s: %d request(s)", batch_id, backend_name, len(requests))
+        batch_ids.append(batch_id)
+    return batch_ids
+
+
+async def _pending_metas() -> List[Dict[str, Any]]:
+    metas = []
+    for raw_id in await get_redis().smembers(PENDING_KEY):
+        batch_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+        meta = await _load_meta(batch_id)
+        if meta is None:
+            # Метаданные истекли — batch больше не отслеживаем
+            await get_redis().srem(PENDING_KEY, batch_id)
+            continue
+        metas.append(meta)
+    return metas
+
+
+class LetterBatchCollector:
+    """
+    Собирает запросы на письма за прогон когорты.
+    add_resume совместим с ProcessResume из src.tasks.cohort; запросы резюме
+    сохраняются в Redis до возврата из add_resume, submit отправляет накопленное.
+    """
+
+    def __init__(self, *, backend: Optional[str] = None, model: str = DEFAULT_MODEL) -> None:
+        self.backend_name = backend or config.ai.batch_backend
+        self.model = model
+        self.staged = 0
+        self.applied_from_cache = 0
+        self._loaded = False
+        self._pending_vacancies: Dict[str, Set[str]] = defaultdict(set)   # resume_id -> vacancy_id
+        self._pending_per_user: Dict[int, int] = defaultdict(int)
+
+    async def _load_pending(self) -> None:
+        """Что уже ждёт писем: в незавершённых batch'ах и ещё не отправленное (из прошлых задач и прогонов)."""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            metas = await _pending_metas()
+            staged = await _staged_entries()
+        except Exception:
+            logger.warning("[letter_batch] cannot load pending batches", exc_info=True)
+            return
+        pending: List[Dict[str, Any]] = []
+        for meta in metas:
+            pending_ids = meta["letters"].keys() if meta["state"] == "ready" else meta["items"].keys()
+            pending.extend(meta["items"][custom_id] for custom_id in pending_ids)
+        for entry in staged:
+            pending.extend(entry["items"].values())
+        for item in pending:
+            self._pending_vacancies[item["resume_id"]].add(item["vacancy_id"])
+            self._pending_per_user[item["user_id"]] += 1
+
+    async def add_resume(self, resume_id: str, cap: Optional[int] = None) -> int:
+        """
+        Подбирает вакансии по резюме и добавляет запросы на письма в batch.
+        Письма, уже лежащие в кэше, отправляются сразу.
+
+        Returns:
+            int: Сколько откликов занято из лимита (в batch + отправлено из кэша + уже ожидающие)
+        """
+        await self._load_pending()
+        resume = await Resume.get(id=resume_id)
+        user_id = resume.user_id
+        hhc = get_hh_client(user_id)
+
+        # Ожидающие отклики пользователя занимают лимит (засчитываем один раз)
+        already_pending = self._pending_per_user.pop(user_id, 0)
+        if cap is None:
+            # Без лимита — не больше одной полной страницы выдачи
+            cap = HH_MAX_PER_PAGE
+        remaining = cap - already_pending
+        if remaining <= 0:
+            return already_pending
+
+        resume_text = await get_resume_prompt_text(resume, hhc)
+        candidates = await collect_candidates(
+            hhc, resume, remaining, exclude=frozenset(self._pending_vacancies.get(resume_id, ()))
+        )
+
+        taken = 0
+        requests: List[Dict[str, Any]] = []
+        items: Dict[str, Dict[str, Any]] = {}
+        for item in candidates:
+            vacancy_id = str(item.get('id'))
+            try:
+                vacancy = await vacancy_cache.get(hhc, vacancy_id, version=vacancy_version(item))
+            except Exception:
+                logger.exception("[letter_batch] get_vacancy failed: vacancy_id=%s", vacancy_id)
+                continue
+            vacancy_text = extract_job_description_from_vacancy(vacancy)
+            cache_key = cover_letter_cache_key(resume_text, vacancy_text, self.model)
+
+            cached = await letter_cache.get(cache_key)
+            if cached is not None:
+                if await _apply_and_record(hhc, user_id, resume_id, vacancy_id, cached):
+                    self.applied_from_cache += 1
+                    taken += 1
+                continue
+
+            custom_id = f"{resume_id}:{vacancy_id}"
+            messages = build_letter_messages(resume_text, vacancy_text)
+            requests.append(batch_request(custom_id, messages, model=self.model))
+            items[custom_id] = {
+                "user_id": user_id,
+                "resume_id": resume_id,
+                "vacancy_id": vacancy_id,
+                "cache_key": cache_key,
+            }
+            taken += 1
+
+        if requests:
+            # До возврата: после него курсор когорты может пройти пользователя
+            entry = {"backend": self.backend_name, "model": self.model, "requests": requests, "items": items}
+            await get_redis().rpush(STAGED_KEY, json.dumps(entry, ensure_ascii=False))
+            self.staged += len(requests)
+        return taken + already_pending
+
+    async def submit(self) -> List[str]:
+        """Отправить накопленные запросы (см. submit_staged). Возвращает id batch'ей."""
+        batch_ids = await submit_staged()
+        logger.info("[letter_batch] staged %d request(s), applied from cache: %d, batches: %s",
+                    self.staged, self.applied_from_cache, batch_ids or "none")
+        return batch_ids
+
+
+async def _collect_outcome(meta: Dict[str, Any]) -> bool:
+    """Опросить batch; если готов — перенести письма в meta. Возвращает True, если готов."""
+    backend = get_batch_backend(meta["backend"])
+    outcome = await backend.poll(meta["batch_id"])
+    if outcome is None:
+        return False
+
+    letters = {}
+    rejected = 0
+    for custom_id, text in outcome.results.items():
+        item = meta["items"].get(custom_id)
+        if item is None:
+            continue
+        # Как у писем из прямых вызовов: в кэш и работодателю — только письмо в итоговом виде
+        letter = valid_letter(text)
+        if letter is None:
+            rejected += 1
+            continue
+        letters[custom_id] = letter
+        await letter_cache.set(item["cache_key"], letter)
+
+    # Токены batch'а — в журнал расходов (своей задержки у таких вызовов нет)
+    for custom_id, (prompt, cached, completion) in outcome.usage.items():
+        item = meta["items"].get(custom_id)
+        if item is None:
+            continue
+        usage_ledger.record(LLMCall(
+            model=meta.get("model", DEFAULT_MODEL),
+            context={
+                "user_id": item["user_id"],
+                "resume_id": item["resume_id"],
+                "purpose": "letter_batch",
+                "prompt_version": meta.get("prompt_version"),
+            },
+            ok=True,
+            attempts=1,
+            prompt_tokens=prompt,
+            cached_tokens=cached,
+            completion_tokens=completion,
+        ))
+
+    meta["state"] = "ready"
+    meta["letters"] = letters
+    await _save_meta(meta)
+    logger.info("[letter_batch] %s %s after %.0fs: letters=%d, rejected=%d, errors=%d",
+                meta["batch_id"], outcome.status, time.time() - meta["created_at"],
+                len(letters), rejected, len(outcome.errors))
+    if outcome.errors:
+        logger.warning("[letter_batch] %s errors (first 3): %s",
+                       meta["batch_id"], list(outcome.errors.items())[:3])
+    return True
+
+
+async def apply_ready_batches(deadline: Optional[float] = None) -> int:
+    """
+    Опрашивает незавершённые batch'и и отправляет отклики по готовым письмам.
+    Прогресс сохраняется, так что по дедлайну (time.monotonic) можно остановиться
+    и продолжить при следующем запуске.
+
+    Returns:
+        int: Число принятых HH откликов
+    """
+    redis = get_redis()
+    if not await redis.set(LOCK_KEY, "1", nx=True, ex=LOCK_TTL):
+        logger.info("[letter_batch] another poller is running")
+        return 0
+
+    sent = 0
+    try:
+        try:
+            # Запросы, оставшиеся от оборванных задач когорты
+            await submit_staged()
+        except Exception:
+            logger.exception("[letter_batch] cannot submit staged requests")
+        for meta in await _pending_metas():
+            if meta["state"] == "pending":
+                try:
+                    if not await _collect_outcome(meta):
+                        continue
+                except Exception:
+                    logger.exception("[letter_batch] poll failed for %s", meta["batch_id"])
+                    continue
+
+            processed = 0
+            for custom_id in list(meta["letters"]):
+                if deadline is not None and time.monotonic() >= deadline:
+                    await _save_meta(meta)
+                    logger.info("[letter_batch] deadline reached, %d letter(s) left in %s",
+                                len(meta["letters"]), meta["batch_id"])
+                    return sent
+                item = meta["items"][custom_id]
+                letter = meta["letters"].pop(custom_id)
+                hhc = get_hh_client(item["user_id"])
+                if await _apply_and_record(hhc, item["user_id"], item["resume_id"], item["vacancy_id"], letter):
+                    sent += 1
+                processed += 1
+                if processed % SAVE_EVERY == 0:
+                    await _save_meta(meta)
+
+            await redis.srem(PENDING_KEY, meta["batch_id"])
+            await redis.delete(_meta_key(meta["batch_id"]))
+            logger.info("[letter_batch] %s done", meta["batch_id"])
+    finally:
+        await redis.delete(LOCK_KEY)
+    return sent
@@ -0,0 +1,232 @@
+# src/utils/cache.py
+"""
+Кэши, общие для пайплайнов откликов.
+
+LetterCache — готовые сопроводительные письма в Redis по ключу-хэшу входных данных
+(резюме, вакансия, модель, версия промпта), с TTL.
+
+VacancyCache — двухуровневый кэш деталей вакансий HH:
+- in-process LRU (живёт в процессе воркера);
+- Redis (общий для всех воркеров и пользователей), ключ по id вакансии, с TTL.
+
+Запись считается устаревшей, если "версия" вакансии из выдачи поиска
+(updated_at/published_at) не совпадает с версией сохранённой детали.
+Ошибки Redis не ломают пайплайн — просто идём в HH напрямую.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from src.config import config
+from src.utils.run_stats import Counters, count
+
+logger = logging.getLogger(__name__)
+
+
+_redis_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Redis]" = weakref.WeakKeyDictionary()
+
+
+def get_redis() -> Redis:
+    """
+    Redis-клиент, привязанный к текущему event loop.
+    Соединения redis.asyncio нельзя переиспользовать между циклами,
+    а задачи Celery поднимают свой цикл на каждый запуск.
+    """
+    loop = asyncio.get_running_loop()
+    client = _redis_clients.get(loop)
+    if client is None:
+        client = Redis.from_url(config.redis.dsn)
+        _redis_clients[loop] = client
+    return client
+
+
+async def close_redis() -> None:
+    """Закрыть Redis-клиент текущего цикла (при остановке долгоживущего цикла)."""
+    client = _redis_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+@dataclass
+class CacheStats(Counters):
+    """Счётчики обращений к кэшу."""
+    local_hits: int = 0
+    redis_hits: int = 0
+    misses: int = 0     # запросов в HH из-за отсутствия записи
+    stale: int = 0      # запросов в HH из-за устаревшей записи
+    errors: int = 0     # ошибок Redis (запрос ушёл в HH напрямую)
+
+    @property
+    def hits(self) -> int:
+        return self.local_hits + self.redis_hits
+
+
+def vacancy_version(vacancy: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Версия вакансии: updated_at, если HH его отдаёт, иначе published_at."""
+    if not vacancy:
+        return None
+    return vacancy.get("updated_at") or vacancy.get("published_at")
+
+
+def _is_fresh(cached_version: Optional[str], expected: Optional[str]) -> bool:
+    """Без версии с одной из сторон сравнивать нечего — доверяем TTL."""
+    return expected is None or cached_version is None or cached_version == expected
+
+
+class VacancyCache:
+    """Кэш деталей вакансий HH: LRU в процессе + Redis."""
+
+    def __init__(self, *, ttl: int, lru_size: int, prefix: str = "hh:vacancy:", name: str = "vacancy_cache") -> None:
+        self.name = name    # группа счётчиков в статистике прогона (src.utils.run_stats)
+        self.ttl = ttl
+        self.lru_size = lru_size
+        self.prefix = prefix
+        self.stats = CacheStats()
+        # vacancy_id -> (expires_at (monotonic), version, vacancy)
+        self._lru: "OrderedDict[str, Tuple[float, Optional[str], Dict[str, Any]]]" = OrderedDict()
+
+    def _key(self, vacancy_id: str) -> str:
+        return f"{self.prefix}{vacancy_id}"
+
+    def _lru_get(self, vacancy_id: str) -> Optional[Tuple[Optional[str], Dict[str, Any]]]:
+        entry = self._lru.get(vacancy_id)
+        if entry is None:
+            return None
+        expires_at, version, vacancy = entry
+        if expires_at < time.monotonic():
+            del self._lru[vacancy_id]
+            return None
+        self._lru.move_to_end(vacancy_id)
+        return version, vacancy
+
+    def _lru_put(self, vacancy_id: str, version: Optional[str], vacancy: Dict[str, Any]) -> None:
+        self._lru[vacancy_id] = (time.monotonic() + self.ttl, version, vacancy)
+        self._lru.move_to_end(vacancy_id)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    async def _redis_get(self, vacancy_id: str) -> Optional[Tuple[Optional[str], Dict[str, Any]]]:
+        try:
+            raw = await get_redis().get(self._key(vacancy_id))
+        except Exception as e:
+            count(self.name, self.stats, "errors")
+            logger.warning("[vacancy_cache] redis get failed for %s: %s", vacancy_id, e)
+            return None
+        if not raw:
+            return None
+        try:
+            payload = json.loads(raw)
+            return payload.get("v"), payload["data"]
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    async def _redis_put(self, vacancy_id: str, version: Optional[str], vacancy: Dict[str, Any]) -> None:
+        try:
+            payload = json.dumps({"v": version, "data": vacancy}, ensure_ascii=False)
+            await get_redis().set(self._key(vacancy_id), payload, ex=self.ttl)
+        except Exception as e:
+            count(self.name, self.stats, "errors")
+            logger.warning("[vacancy_cache] redis set failed for %s: %s", vacancy_id, e)
+
+    async def get(self, hhc: Any, vacancy_id: str, *, version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Возвращает детали вакансии: из LRU, из Redis или из HH (с сохранением в оба слоя).
+
+        Args:
+            hhc: Клиент HH (любой объект с методом get_vacancy(vacancy_id))
+            vacancy_id: ID вакансии
+            version: Ожидаемая версия из выдачи поиска (см. vacancy_version).
+                Если задана и не совпадает с сохранённой — запись считается устаревшей.
+        """
+        vacancy_id = str(vacancy_id)
+
+        cached = self._lru_get(vacancy_id)
+        if cached is not None and _is_fresh(cached[0], version):
+            count(self.name, self.stats, "local_hits")
+            return cached[1]
+        stale = cached is not None
+
+        # Локальная копия устарела или её нет — возможно, другой воркер уже обновил Redis
+        cached = await self._redis_get(vacancy_id)
+        if cached is not None:
+            if _is_fresh(cached[0], version):
+                count(self.name, self.stats, "redis_hits")
+                self._lru_put(vacancy_id, cached[0], cached[1])
+                return cached[1]
+            stale = True
+
+        if stale:
+            count(self.name, self.stats, "stale")
+        else:
+            count(self.name, self.stats, "misses")
+
+        vacancy = await hhc.get_vacancy(vacancy_id)
+        fresh_version = vacancy_version(vacancy)
+        self._lru_put(vacancy_id, fresh_version, vacancy)
+        await self._redis_put(vacancy_id, fresh_version, vacancy)
+        return vacancy
+
+    async def invalidate(self, vacancy_id: str) -> None:
+        """Удалить вакансию из обоих слоёв."""
+        vacancy_id = str(vacancy_id)
+        self._lru.pop(vacancy_id, None)
+        try:
+            await get_redis().delete(self._key(vacancy_id))
+        except Exception as e:
+            count(self.name, self.stats, "errors")
+            logger.warning("[vacancy_cache] redis delete failed for %s: %s", vacancy_id, e)
+
+
+vacancy_cache = VacancyCache(ttl=config.cache.vacancy_ttl, lru_size=config.cache.vacancy_lru_size)
+
+
+class LetterCache:
+    """Кэш сгенерированных писем в Redis (ключ — хэш входных данных генерации)."""
+
+    def __init__(self, *, ttl: int, prefix: str = "ai:letter:", name: str = "letter_cache") -> None:
+        self.name = name
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = CacheStats()
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """sha256 от частей ключа (с разделителем, чтобы ("ab","c") != ("a","bc"))."""
+        h = hashlib.sha256()
+        for part in parts:
+            h.update((part or "").encode("utf-8"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            raw = await get_redis().get(f"{self.prefix}{key}")
+        except Exception as e:
+            count(self.name, self.stats, "errors")
+            logger.warning("[letter_cache] redis get failed: %s", e)
+            return None
+        if raw is None:
+            count(self.name, self.stats, "misses")
+            return None
+        count(self.name, self.stats, "redis_hits")
+        return raw.decode("utf-8") if isinstance(raw, bytes) else raw
+
+    async def set(self, key: str, letter: str) -> None:
+        try:
+            await get_redis().set(f"{self.prefix}{key}", letter, ex=self.ttl)
+        except Exception as e:
+            count(self.name, self.stats, "errors")
+            logger.warning("[letter_cache] redis set failed: %s", e)
+
+
+letter_cache = LetterCache(ttl=config.cache.letter_ttl)
@@ -7,6 +7,7 @@ def format_resume_card(resume):
     title = (resume.resume_json or {}).get('title', 'Без названия')
     positive_keywords = ', '.join(resume.positive_keywords or [])
     negative_keywords = ', '.join(resume.negative_keywords or [])
+    excluded_employers = ', '.join(resume.excluded_employers or [])
 
     status_label = "🟢 Активно" if resume.status == "active" else "📁 В архиве"
     status_hint = (
@@ -22,4 +23,6 @@ def format_resume_card(resume):
     )
     if negative_keywords:
         text += f"Исключения: {negative_keywords}\n"
+    if excluded_employers:
+        text += f"Скрытые работодатели: {excluded_employers}\n"
     return text
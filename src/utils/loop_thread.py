@@ -0,0 +1,68 @@
+# src/utils/loop_thread.py
+import asyncio
+import threading
+from typing import Any, Optional
+
+
+class LoopThread:
+    """Фоновый asyncio-цикл в отдельном потоке.
+
+    Нужен, чтобы переиспользовать асинхронные клиенты (httpx, AsyncOpenAI, пул БД)
+    между задачами Celery, не создавая новый event loop каждый раз.
+    """
+    def __init__(self, name: str = "asyncio-loop") -> None:
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        return self._loop
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self) -> None:
+        if self.is_running():
+            return
+        self._ready.clear()
+
+        def _runner() -> None:
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._ready.set()
+            self._loop.run_forever()
+            # Аккуратно завершаем все таски перед закрытием цикла
+            pending = asyncio.all_tasks(loop=self._loop)
+            for t in pending:
+                t.cancel()
+            if pending:
+                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=_runner, name=self.name, daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+
+    def stop(self) -> None:
+        if not self._loop:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    def submit(self, coro: "asyncio.Future[Any] | asyncio.coroutines") -> Any:
+        """Выполнить корутину в фоновом цикле и дождаться результата (блокирующе)."""
+        if not self._loop:
+            raise RuntimeError("Loop is not started")
+        fut = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return fut.result()
+
+    def submit_future(self, coro: "asyncio.Future[Any] | asyncio.coroutines"):
+        """Выполнить корутину в фоновом цикле и вернуть concurrent.futures.Future.
+        Это позволяет await'ить её из другого asyncio-цикла через asyncio.wrap_future().
+        """
+        if not self._loop:
+            raise RuntimeError("Loop is not started")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
@@ -0,0 +1,79 @@
+# src/utils/run_stats.py
+"""
+Счётчики за один прогон (резюме и т.п.) поверх счётчиков процесса.
+
+Счётчики кэшей и пула OpenAI общие на процесс, а прогоны резюме идут параллельно
+(когорта), поэтому разница снимков "до/после" смешала бы чужие обращения.
+Прогон открывает run_stats_scope(): count() увеличивает счётчик процесса и, если
+в текущем контексте есть RunStats, его копию для прогона. Контекст (contextvar)
+наследуется дочерними задачами asyncio; в другой цикл/поток его передают явно
+(with_run_stats).
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import fields
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Counters:
+    """Основа счётчиков-dataclass'ов (кэши, пул OpenAI): группа для RunStats и count()."""
+
+    def copy(self):
+        return type(self)(**{f.name: getattr(self, f.name) for f in fields(self)})
+
+
+class RunStats:
+    """Именованные группы счётчиков одного прогона ("vacancy_cache", "openai_usage", ...)."""
+
+    def __init__(self) -> None:
+        self._groups: Dict[str, Any] = {}
+
+    def group(self, name: str, factory: Callable[[], T]) -> T:
+        """Группа счётчиков по имени (создаётся нулевой через factory при первом обращении)."""
+        group = self._groups.get(name)
+        if group is None:
+            group = self._groups[name] = factory()
+        return group
+
+    def groups(self, prefix: str = "") -> Dict[str, Any]:
+        """Группы, имя которых начинается с prefix (имя без префикса -> счётчики)."""
+        return {name[len(prefix):]: group for name, group in self._groups.items() if name.startswith(prefix)}
+
+
+_current: ContextVar[Optional[RunStats]] = ContextVar("run_stats", default=None)
+
+
+def current_run_stats() -> Optional[RunStats]:
+    return _current.get()
+
+
+@contextmanager
+def run_stats_scope(stats: Optional[RunStats] = None) -> Iterator[RunStats]:
+    """Собирать счётчики кода внутри блока (и запущенных из него задач) в RunStats."""
+    stats = stats if stats is not None else RunStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+async def with_run_stats(stats: Optional[RunStats], coro: Awaitable[T]) -> T:
+    """Выполнить корутину со счётчиками прогона stats (для передачи в другой цикл)."""
+    if stats is None:
+        return await coro
+    with run_stats_scope(stats):
+        return await coro
+
+
+def count(name: str, counters: Any, field: str, value: float = 1) -> None:
+    """Увеличить поле field счётчиков процесса counters и той же группы name текущего прогона."""
+    setattr(counters, field, getattr(counters, field) + value)
+    stats = _current.get()
+    if stats is not None:
+        group = stats.group(name, type(counters))
+        setattr(group, field, getattr(group, field) + value)
@@ -6,26 +6,33 @@ import logging
 import os
 import platform
 from typing import Iterable, Optional
+from uuid import uuid4
 
 from celery import shared_task
-from tortoise import Tortoise
-from tortoise.expressions import Q
-from tortoise.timezone import now
 
 from src.celery_app import celery_app
-from src.db.config import TORTOISE_ORM
 from src.models import (
     Resume,
     Subscription,
     Plan,
-    SubscriptionStatus,
     ApplicationHistory,
     ApplicationStatus,
 )
-from src.services.ai.cover_letter_service import generate_cover_letter
-from src.services.hh_client import hh_client
+from src.services.ai.cover_letter_service import generate_letter_for_vacancy
+from src.services.ai.openai_pool import llm_call_context
+from src.services.hh.client import get_hh_client
+from src.services.resume.run_context import (
+    ResumeRunContext,
+    build_resume_context,
+    load_resume_context,
+    save_resume_context,
+)
+from src.services.task_manager.batch_publisher import publish_batched
+from src.services.task_manager.cohort_planner import EnqueuePlan, build_enqueue_plan, queue_for_subscription
 from src.services.task_manager.result_processor import save_run_result
 from src.services.notification.telegram_notifier import send_processing_summary
+from src.utils.cache import vacancy_cache, vacancy_version
+from src.workers.runtime import run
 
 logger = logging.getLogger(__name__)
 
@@ -35,23 +42,6 @@ QUEUE_NORMAL = "normal"
 QUEUE_LOW = "low"
 
 TASK_NS = "workers.application_sender"
-_ORM_READY = False
-
-
-async def init_orm() -> None:
-    global _ORM_READY
-    if _ORM_READY:
-        return
-    await Tortoise.init(config=TORTOISE_ORM)
-    _ORM_READY = True
-    logger.info("Tortoise ORM initialized.")
-
-
-def run_async(coro):
-    async def _runner():
-        await init_orm()
-        return await coro
-    return asyncio.run(_runner())
 
 
 # ==========================
@@ -60,74 +50,59 @@ def run_async(coro):
 
 @shared_task(bind=True, name=f"{TASK_NS}.schedule_bulk_apply")
 def schedule_bulk_apply(self, user_id: Optional[int] = None) -> None:
-    run_async(_schedule_bulk_apply_async(user_id=user_id))
+    run(_schedule_bulk_apply_async(user_id=user_id))
 
 
 async def _schedule_bulk_apply_async(user_id: Optional[int] = None) -> None:
-    await init_orm()
-
     if user_id is not None:
-        user_ids = [user_id]
+        plan = await build_enqueue_plan(user_ids=[user_id])
         run_type = "manual"
     else:
-        active_q = Q(status=SubscriptionStatus.ACTIVE) & (Q(expires_at=None) | Q(expires_at__gt=now()))
-        user_ids = list(await Subscription.filter(active_q).values_list("user_id", flat=True))
+        plan = await build_enqueue_plan()
         run_type = "bulk"
 
-    for uid in user_ids:
-        queue = await _queue_for_user(uid)
-        enqueued = await _enqueue_user_resumes(uid, queue)
-
-        # persist + notify
-        try:
-            await save_run_result(user_id=uid, run_type=run_type, resumes_enqueued=enqueued, meta={"queue": queue})
-            await send_processing_summary(user_id=uid, run_type=run_type, resumes_enqueued=enqueued)
-        except Exception:
-            logger.exception("Persist/notify failed for user_id=%s", uid)
+    await _publish_plan(plan, run_type)
 
 
 @shared_task(bind=True, name=f"{TASK_NS}.schedule_free_daily", queue=QUEUE_LOW)
 def schedule_free_daily(self) -> None:
-    run_async(_schedule_cohort_async(plans=[Plan.FREE], child_queue=QUEUE_LOW, run_type="free_daily"))
+    run(_schedule_cohort_async(plans=[Plan.FREE], child_queue=QUEUE_LOW, run_type="free_daily"))
 
 
 @shared_task(bind=True, name=f"{TASK_NS}.schedule_paid_hourly", queue=QUEUE_HIGH)
 def schedule_paid_hourly(self) -> None:
-    run_async(_schedule_cohort_async(plans=[Plan.PLUS, Plan.PRO], child_queue=QUEUE_HIGH, run_type="paid_hourly"))
+    run(_schedule_cohort_async(plans=[Plan.PLUS, Plan.PRO], child_queue=QUEUE_HIGH, run_type="paid_hourly"))
 
 
 async def _schedule_cohort_async(*, plans: Iterable[Plan], child_queue: str, run_type: str) -> None:
-    await init_orm()
-    active_q = Q(status=SubscriptionStatus.ACTIVE) & (Q(expires_at=None) | Q(expires_at__gt=now()))
-    user_ids = list(await Subscription.filter(active_q, plan__in=list(plans)).values_list("user_id", flat=True))
+    plan = await build_enqueue_plan(plans=plans)
+    # Когорта целиком идёт в очередь расписания, а не в очередь по плану
+    plan.user_queues = {uid: child_queue for uid in plan.user_queues}
+    plan.resumes_by_queue = {child_queue: [rid for rids in plan.resumes_by_queue.values() for rid in rids]}
+    await _publish_plan(plan, run_type)
+
+
+async def _publish_plan(plan: EnqueuePlan, run_type: str) -> None:
+    """Ставит apply_for_resume по плану (пакетно на каждую очередь), затем сохраняет итоги по пользователям."""
+    for queue, resume_ids in plan.resumes_by_queue.items():
+        await asyncio.to_thread(publish_batched, apply_for_resume, [[rid] for rid in resume_ids], queue=queue)
+    logger.info("[%s] users=%d, resumes enqueued=%d", run_type, len(plan.user_queues), plan.total_resumes)
 
-    for uid in user_ids:
-        enqueued = await _enqueue_user_resumes(uid, child_queue)
+    for uid, queue in plan.user_queues.items():
+        enqueued = plan.resumes_per_user.get(uid, 0)
+        # persist + notify
         try:
-            await save_run_result(user_id=uid, run_type=run_type, resumes_enqueued=enqueued, meta={"queue": child_queue})
+            await save_run_result(user_id=uid, run_type=run_type, resumes_enqueued=enqueued, meta={"queue": queue})
             await send_processing_summary(user_id=uid, run_type=run_type, resumes_enqueued=enqueued)
         except Exception:
             logger.exception("Persist/notify failed for user_id=%s", uid)
 
 
-async def _enqueue_user_resumes(user_id: int, queue: str) -> int:
-    """Ставит подзадачи apply_for_resume по активным резюме пользователя. Возвращает число задач."""
-    resumes = list(await Resume.filter(user_id=user_id, is_active=True).values_list("id", flat=True))
-    for rid in resumes:
-        apply_for_resume.apply_async(args=[rid], queue=queue, routing_key=f"q.{queue}")
-    logger.info("Enqueued %d resume(s) for user_id=%s -> queue=%s", len(resumes), user_id, queue)
-    return len(resumes)
-
-
 async def _queue_for_user(user_id: int) -> str:
     sub = await Subscription.get_or_none(user_id=user_id)
-    if not sub or sub.status != SubscriptionStatus.ACTIVE:
-        return QUEUE_LOW
-    if sub.plan in (Plan.PLUS, Plan.PRO):
-        return QUEUE_HIGH
-    if sub.plan == Plan.FREE:
-        return QUEUE_LOW
-    return QUEUE_NORMAL
+    if not sub:
+        return queue_for_subscription(None, None)
+    return queue_for_subscription(sub.plan, sub.status)
 
 
 # ==========================
@@ -136,12 +111,10 @@ async def _queue_for_user(user_id: int) -> str:
 
 @shared_task(bind=True, name=f"{TASK_NS}.apply_for_resume")
 def apply_for_resume(self, resume_id: int) -> None:
-    run_async(_apply_for_resume_async(resume_id))
+    run(_apply_for_resume_async(resume_id))
 
 
 async def _apply_for_resume_async(resume_id: int) -> None:
-    await init_orm()
-
     resume = await Resume.get_or_none(id=resume_id)
     if not resume:
         logger.warning("Resume not found: %s", resume_id)
@@ -150,19 +123,20 @@ async def _apply_for_resume_async(resume_id: int) -> None:
         logger.info("Resume inactive: %s", resume_id)
         return
 
-    hh_resume_id = getattr(resume, "hh_resume_id", None) or getattr(resume, "hh_id", None)
-    if not hh_resume_id:
-        logger.warning("No HH resume id for %s", resume_id)
-        return
+    owner_id = resume.user_id
+    hhc = get_hh_client(owner_id)
+    queue = await _queue_for_user(owner_id)
 
     search_text = getattr(resume, "keywords", "") or ""
     try:
-        items = await hh_client.search_similar_vacancies(text=search_text, resume_id=str(hh_resume_id), per_page=25)
+        # id резюме в БД совпадает с id резюме в HH
+        items = await hhc.search_similar_vacancies(text=search_text, resume_id=str(resume.id), per_page=25)
     except Exception:
         logger.exception("HH search_similar_vacancies failed for resume_id=%s", resume_id)
         return
 
     found_ids = [str(i.get("id")).strip() for i in (items or []) if str(i.get("id") or "").strip()]
+    versions = {str(i.get("id")).strip(): vacancy_version(i) for i in (items or [])}
     if not found_ids:
         logger.info("No vacancies found for resume_id=%s", resume_id)
         return
@@ -179,11 +153,21 @@ async def _apply_for_resume_async(resume_id: int) -> None:
         logger.info("All vacancies already applied. resume_id=%s", resume_id)
         return
 
-    owner_id = getattr(resume, "user_id", None)
-    queue = await _queue_for_user(owner_id) if owner_id is not None else QUEUE_NORMAL
+    # Контекст (снимок резюме из HH, профиль) собираем, только когда есть на что откликаться.
+    # Нужен задачам по вакансиям; если Redis недоступен, они соберут его сами
+    try:
+        ctx = await build_resume_context(resume, hhc, run_id=uuid4().hex, queue=queue)
+    except Exception:
+        logger.exception("build_resume_context failed for resume_id=%s", resume_id)
+        return
+    await save_resume_context(ctx)
 
-    for vacancy_id in to_apply:
-        apply_for_vacancy.apply_async(args=[resume_id, vacancy_id], queue=queue, routing_key=f"q.{queue}")
+    await asyncio.to_thread(
+        publish_batched,
+        apply_for_vacancy,
+        [[resume_id, vacancy_id, versions.get(vacancy_id), ctx.run_id] for vacancy_id in to_apply],
+        queue=queue,
+    )
 
     logger.info(
         "Resume %s: found=%d, skipped=%d, enqueued=%d, queue=%s",
@@ -196,44 +180,61 @@ async def _apply_for_resume_async(resume_id: int) -> None:
 # ==========================
 
 @shared_task(bind=True, name=f"{TASK_NS}.apply_for_vacancy")
-def apply_for_vacancy(self, resume_id: int, vacancy_id: str) -> None:
-    run_async(_apply_for_vacancy_async(resume_id, vacancy_id))
+def apply_for_vacancy(
+    self, resume_id: int, vacancy_id: str, version: Optional[str] = None, run_id: Optional[str] = None
+) -> None:
+    run(_apply_for_vacancy_async(resume_id, vacancy_id, version, run_id))
 
 
-async def _apply_for_vacancy_async(resume_id: int, vacancy_id: str) -> None:
-    await init_orm()
+async def _resume_context_for_vacancy(resume_id: int, run_id: Optional[str]) -> Optional[ResumeRunContext]:
+    """Контекст прогона из Redis; если его нет — собираем заново по резюме."""
+    if run_id:
+        ctx = await load_resume_context(run_id)
+        if ctx is not None:
+            return ctx
+        logger.info("apply_for_vacancy: no cached context for run_id=%s, rebuilding", run_id)
 
-    # Получаем hh_resume_id для запроса к HH
     resume = await Resume.get_or_none(id=resume_id)
     if not resume:
-        logger.warning("apply_for_vacancy: resume not found %s", resume_id)
-        return
+        return None
+    queue = await _queue_for_user(resume.user_id)
+    return await build_resume_context(resume, get_hh_client(resume.user_id), run_id=run_id or uuid4().hex, queue=queue)
 
-    hh_resume_id = getattr(resume, "hh_resume_id", None) or getattr(resume, "hh_id", None)
-    if not hh_resume_id:
-        logger.warning("apply_for_vacancy: no hh_resume_id for %s", resume_id)
+
+async def _apply_for_vacancy_async(
+    resume_id: int, vacancy_id: str, version: Optional[str] = None, run_id: Optional[str] = None
+) -> None:
+    ctx = await _resume_context_for_vacancy(resume_id, run_id)
+    if ctx is None:
+        logger.warning("apply_for_vacancy: resume not found %s", resume_id)
         return
 
+    hhc = get_hh_client(ctx.user_id)
+    error = None
+    cover_letter = None
     try:
-        hh_resume, vacancy = await asyncio.gather(
-            hh_client.get_resume(str(hh_resume_id)),
-            hh_client.get_vacancy(str(vacancy_id)),
-        )
-        cover_letter = await generate_cover_letter(hh_resume, vacancy)
-        ok = await hh_client.apply_to_vacancy(resume_id=str(hh_resume_id), vacancy_id=str(vacancy_id), message=cover_letter)
-    except Exception:
+        vacancy = await vacancy_cache.get(hhc, str(vacancy_id), version=version)
+        with llm_call_context(user_id=ctx.user_id, resume_id=ctx.resume_id):
+            cover_letter = await generate_letter_for_vacancy(ctx.resume_text, vacancy, ctx.resume_profile)
+        ok = await hhc.apply_to_vacancy(resume_id=ctx.hh_resume_id, vacancy_id=str(vacancy_id), message=cover_letter)
+        if not ok:
+            error = "HH did not accept the application"
+    except Exception as e:
         logger.exception("apply_for_vacancy failed: resume_id=%s vacancy_id=%s", resume_id, vacancy_id)
         ok = False
+        error = str(e)
 
     try:
-        await ApplicationHistory.create(
-            resume_id=resume_id,
-            vacancy_id=str(vacancy_id),
-            status=ApplicationStatus.SUCCESS if ok else ApplicationStatus.FAILED,
-            provider_meta=None,
-        )
+        if ok:
+            await ApplicationHistory.mark_success(
+                user_id=ctx.user_id, resume_id=ctx.resume_id, vacancy_id=str(vacancy_id), cover_letter=cover_letter,
+            )
+        else:
+            await ApplicationHistory.mark_failed(
+                user_id=ctx.user_id, resume_id=ctx.resume_id, vacancy_id=str(vacancy_id), error=error,
+            )
     except Exception:
-        logger.exception("ApplicationHistory create failed: resume_id=%s vacancy_id=%s", resume_id, vacancy_id)
+        logger.exception("ApplicationHistory write failed: resume_id=%s vacancy_id=%s", resume_id, vacancy_id)
 
     logger.debug("apply_for_vacancy done: resume_id=%s vacancy_id=%s ok=%s", resume_id, vacancy_id, ok)
 
@@ -1,36 +1,24 @@
 # src/workers/apply.py
 
-import asyncio
-from typing import Optional
+import logging
+import time
+from datetime import datetime
+from typing import List, Optional
+from uuid import uuid4
 
-from celery.signals import worker_process_init, worker_process_shutdown
+from tortoise.timezone import now
 
 from src.celery_app import celery_app
 from src.config import config
-from src.db.init import init_db, close_db
-from src.services.ai.openai_pool import setup as ai_setup, teardown as ai_teardown, OpenAISettings
+from src.models import Resume
+from src.services.ai.openai_pool import llm_deadline
+from src.services.resume.profile import ensure_resume_profile
 from src.tasks.apply import apply_for_resume_task
-from src.utils.selectors import get_active_user_ids, get_active_resume_ids
-
-
-@worker_process_init.connect
-def _on_worker_proc_init(**_: dict) -> None:
-    """Поднимаем фоновый цикл и инициализируем httpx/AsyncOpenAI один раз на процесс."""
-    settings = OpenAISettings(
-        api_key=config.ai.openai_api_key.get_secret_value(),
-        proxy_url=(config.ai.proxy_url or None),
-        connect_timeout=15.0,
-        read_timeout=60.0,
-        pool_timeout=60.0,
-        http2=True,
-    )
-    ai_setup(settings)
-
+from src.tasks.cohort import CohortStats, run_cohort
+from src.tasks.letter_batch import LetterBatchCollector, apply_ready_batches
+from src.workers.runtime import run
 
-@worker_process_shutdown.connect
-def _on_worker_proc_shutdown(**_: dict) -> None:
-    """Аккуратно закрываем клиентов и останавливаем фон.цикл на завершении процесса."""
-    ai_teardown()
+logger = logging.getLogger(__name__)
 
 
 async def _process_resume(resume_id: str, cap: Optional[int] = None) -> int:
@@ -40,49 +28,121 @@ async def _process_resume(resume_id: str, cap: Optional[int] = None) -> int:
     return await apply_for_resume_task(resume_id, cap)
 
 
+def _cohort_deadline() -> float:
+    """Момент (time.monotonic), к которому прогон должен остановиться, не дожидаясь soft limit задачи."""
+    soft_limit = celery_app.conf.task_soft_time_limit
+    return time.monotonic() + soft_limit - config.apply.cohort_deadline_margin
+
+
+def _run_cohort_task(
+    task,
+    plans: List[str],
+    *,
+    queue: str,
+    run_id: Optional[str],
+    after_user_id: Optional[int],
+    started_at: Optional[str],
+    continuation: int,
+    batch: bool = False,
+) -> None:
+    """
+    Прогон когорты в рамках одной задачи Celery. Если до дедлайна обработаны не все
+    пользователи, ставит в очередь продолжение с курсором (run_id и started_at сохраняются,
+    поэтому лимит откликов считается на весь прогон, а не на каждую задачу).
+
+    batch=True — письма не генерируются сразу: запросы собираются в batch
+    (см. src.tasks.letter_batch), отклики отправит poll_letter_batches.
+    """
+    deadline = _cohort_deadline()
+    run_id = run_id or uuid4().hex
+    started_at = started_at or now().isoformat()
+
+    async def _run() -> CohortStats:
+        collector = LetterBatchCollector() if batch else None
+        with llm_deadline(deadline):
+            stats = await run_cohort(
+                plans,
+                per_user_cap=3,
+                process_resume=collector.add_resume if collector else _process_resume,
+                run_id=run_id,
+                after_user_id=after_user_id,
+                deadline=deadline,
+                started_at=datetime.fromisoformat(started_at),
+            )
+        if collector is not None:
+            await collector.submit()
+        return stats
+
+    stats = run(_run())
+    if stats.finished:
+        return
+
+    if continuation >= config.apply.cohort_max_continuations:
+        logger.error("[cohort] run_id=%s: continuation limit reached, stopping at cursor=%s", run_id, stats.cursor)
+        return
+
+    task.apply_async(
+        kwargs={
+            "run_id": run_id,
+            "after_user_id": stats.cursor,
+            "started_at": started_at,
+            "continuation": continuation + 1,
+        },
+        queue=queue,
+    )
+    logger.info("[cohort] run_id=%s: continuation #%d enqueued after user_id=%s",
+                run_id, continuation + 1, stats.cursor)
+
+
 @celery_app.task(name="src.workers.apply.run_paid_hourly")
-def run_paid_hourly():
+def run_paid_hourly(
+    run_id: Optional[str] = None,
+    after_user_id: Optional[int] = None,
+    started_at: Optional[str] = None,
+    continuation: int = 0,
+):
     """Каждый час — обрабатываем все активные резюме у платных (plus/pro)."""
-    async def _run():
-        await init_db()
-        try:
-            user_ids = await get_active_user_ids(["plus", "pro"])
-            for uid in user_ids:
-                remaining = 3
-                for rid in await get_active_resume_ids(uid):
-                    if remaining <= 0:
-                        break
-                    sent = await _process_resume(resume_id=rid, cap=remaining)
-                    remaining -= sent
-        finally:
-            await close_db()
-
-    asyncio.run(_run())
+    _run_cohort_task(
+        run_paid_hourly, ["plus", "pro"], queue="celery",
+        run_id=run_id, after_user_id=after_user_id, started_at=started_at, continuation=continuation,
+    )
 
 
 @celery_app.task(name="src.workers.apply.run_free_daily")
-def run_free_daily():
+def run_free_daily(
+    run_id: Optional[str] = None,
+    after_user_id: Optional[int] = None,
+    started_at: Optional[str] = None,
+    continuation: int = 0,
+):
     """
     Раз в день (12:00 МСК) — для free максимум 3 отклика на пользователя.
     Лимит распределяется по резюме пользователя последовательно.
     """
-    async def _run():
-        await init_db()
-        try:
-            user_ids = await get_active_user_ids(["free"])
-            for uid in user_ids:
-                remaining = 3
-                for rid in await get_active_resume_ids(uid):
-                    if remaining <= 0:
-                        break
-                    sent = await _process_resume(resume_id=rid, cap=remaining)
-                    remaining -= sent
-        finally:
-            await close_db()
-
-    asyncio.run(_run())
+    _run_cohort_task(
+        run_free_daily, ["free"], queue="free",
+        run_id=run_id, after_user_id=after_user_id, started_at=started_at, continuation=continuation,
+        batch=config.apply.free_letter_mode == "batch",
+    )
+
+
+@celery_app.task(name="src.workers.apply.poll_letter_batches")
+def poll_letter_batches():
+    """Каждые 5 минут — забираем готовые batch'и писем и отправляем отклики."""
+    sent = run(apply_ready_batches(deadline=_cohort_deadline()))
+    if sent:
+        logger.info("[letter_batch] sent %d application(s)", sent)
+
 
+@celery_app.task(name="src.workers.apply.build_resume_profile")
+def build_resume_profile(resume_id: str):
+    """После добавления резюме — собираем его профиль для писем заранее, а не на первом прогоне."""
+    async def _run() -> None:
+        resume = await Resume.get_or_none(id=resume_id)
+        if resume is not None:
+            await ensure_resume_profile(resume)
 
+    run(_run())
 
 
 # import asyncio
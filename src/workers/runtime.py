@@ -0,0 +1,213 @@
+# src/workers/runtime.py
+"""
+Рантайм процесса воркера Celery.
+
+Один долгоживущий event loop (в фоновом потоке) на процесс. В нём один раз
+поднимаются Tortoise ORM (пул asyncpg) и клиенты OpenAI; HH- и Redis-клиенты,
+привязанные к циклу (get_hh_client, get_redis), тоже переживают задачу.
+Задачи запускают свои корутины через run(coro) вместо asyncio.run + init_db/close_db.
+После задачи накопленный журнал расходов LLM пишется в БД пачкой (usage_ledger).
+
+В prefork рантайм поднимается по worker_process_init, в --pool=solo этого сигнала
+нет — тогда он стартует лениво при первом run().
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import contextvars
+import logging
+import threading
+import time
+from typing import Awaitable, Optional, TypeVar
+
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from src.config import config
+from src.db.init import init_db, close_db
+from src.services.ai.openai_pool import (
+    OpenAIBackendSettings,
+    OpenAISettings,
+    asetup as ai_asetup,
+    ateardown as ai_ateardown,
+)
+from src.services.ai.usage_ledger import install_usage_ledger, usage_ledger
+from src.services.hh.client import close_hh_client
+from src.utils.cache import close_redis
+from src.utils.loop_thread import LoopThread
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _openai_settings() -> OpenAISettings:
+    return OpenAISettings(
+        api_key=config.ai.openai_api_key.get_secret_value(),
+        proxy_url=(config.ai.proxy_url or None),
+        connect_timeout=15.0,
+        read_timeout=60.0,
+        pool_timeout=60.0,
+        http2=True,
+        max_concurrency=config.ai.max_concurrency,
+        backends=tuple(
+            OpenAIBackendSettings(
+                name=b.name,
+                api_key=b.api_key.get_secret_value(),
+                base_url=b.base_url,
+                proxy_url=b.proxy_url,
+                weight=b.weight,
+            )
+            for b in config.ai.backends
+        ),
+        eject_after=config.ai.backend_eject_after,
+        eject_seconds=config.ai.backend_eject_seconds,
+        breaker_threshold=config.ai.breaker_threshold,
+        breaker_open_seconds=config.ai.breaker_open_seconds,
+        hedge_percentile=config.ai.hedge_percentile,
+        hedge_min_delay=config.ai.hedge_min_delay,
+        hedge_max_ratio=config.ai.hedge_max_ratio,
+    )
+
+
+class WorkerRuntime:
+    """Долгоживущий цикл процесса с инициализированными ORM и клиентами."""
+
+    def __init__(self) -> None:
+        self._loop = LoopThread(name="worker-runtime")
+        self._lock = threading.Lock()
+        self._started = False
+        # Контекст, в котором инициализирован Tortoise (в 1.x его состояние живёт в contextvar)
+        self._context: Optional[contextvars.Context] = None
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def start(self) -> None:
+        """Запустить цикл и поднять ORM/клиентов. Повторный вызов ничего не делает."""
+        with self._lock:
+            if self._started:
+                return
+            t0 = time.perf_counter()
+            self._loop.start()
+            self._context = self._loop.submit(self._astart())
+            self._started = True
+            logger.info("[runtime] started in %.0f ms", (time.perf_counter() - t0) * 1000)
+
+    def stop(self) -> None:
+        """Закрыть ORM/клиентов и остановить цикл."""
+        with self._lock:
+            if not self._started:
+                return
+            try:
+                self._loop.submit(self._in_context(self._astop()))
+            finally:
+                self._loop.stop()
+                self._started = False
+                self._context = None
+                logger.info("[runtime] stopped")
+
+    @staticmethod
+    async def _astart() -> contextvars.Context:
+        await init_db()
+        await ai_asetup(_openai_settings())
+        install_usage_ledger()
+        return contextvars.copy_context()
+
+    async def _in_context(self, coro: Awaitable[T]) -> T:
+        """Выполнить корутину в копии контекста инициализации (видны ORM и т.п.)."""
+        task = asyncio.get_running_loop().create_task(coro, context=self._context.copy())
+        return await task
+
+    @staticmethod
+    async def _astop() -> None:
+        # Закрываем всё, что получится: ошибка одного клиента не должна мешать остальным
+        for close in (close_hh_client, close_redis, ai_ateardown, usage_ledger.flush, close_db):
+            try:
+                await close()
+            except Exception:
+                logger.exception("[runtime] %s failed", close.__name__)
+
+    @staticmethod
+    async def _task(coro: Awaitable[T]) -> T:
+        try:
+            return await coro
+        finally:
+            # Журнал расходов LLM — между задачами, пачкой (при ошибке записи он остаётся в буфере)
+            await usage_ledger.maybe_flush()
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """
+        Выполнить корутину задачи в цикле рантайма и дождаться результата.
+
+        Если ожидание прервано (SoftTimeLimitExceeded, таймаут и т.п.), корутина
+        отменяется, чтобы не продолжала работать в фоне после завершения задачи.
+        """
+        self.start()
+        fut = self._loop.submit_future(self._in_context(self._task(coro)))
+        try:
+            return fut.result(timeout)
+        except BaseException:
+            fut.cancel()
+            raise
+
+
+runtime = WorkerRuntime()
+
+
+def run(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Выполнить корутину в рантайме текущего процесса (см. WorkerRuntime.run)."""
+    return runtime.run(coro, timeout)
+
+
+@worker_process_init.connect
+def _on_worker_proc_init(**_: dict) -> None:
+    """Поднимаем цикл, ORM и клиентов один раз на процесс."""
+    runtime.start()
+
+
+@worker_process_shutdown.connect
+def _on_worker_proc_shutdown(**_: dict) -> None:
+    """Аккуратно закрываем клиентов и останавливаем цикл на завершении процесса."""
+    runtime.stop()
+
+
+# solo-пул и ручные запуски не шлют worker_process_shutdown
+atexit.register(runtime.stop)
+
+
+if __name__ == "__main__":
+    # Накладные расходы на задачу: asyncio.run + init_db/close_db против рантайма.
+    # Нужна настроенная БД (TORTOISE_ORM) и переменные окружения приложения.
+    from tortoise import Tortoise
+
+    logging.basicConfig(level=logging.WARNING)
+    n = 20
+
+    async def _query() -> None:
+        await Tortoise.get_connection("default").execute_query("SELECT 1")
+
+    def _old_task() -> None:
+        async def _run() -> None:
+            await init_db()
+            try:
+                await _query()
+            finally:
+                await close_db()
+        asyncio.run(_run())
+
+    t0 = time.perf_counter()
+    for _ in range(n):
+        _old_task()
+    old_ms = (time.perf_counter() - t0) * 1000 / n
+
+    runtime.start()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        run(_query())
+    new_ms = (time.perf_counter() - t0) * 1000 / n
+    runtime.stop()
+
+    print(f"asyncio.run + init_db/close_db: {old_ms:.1f} ms/task")
+    print(f"runtime.run:                    {new_ms:.1f} ms/task")
@@ -0,0 +1,45 @@
+# tests/conftest.py
+"""
+Общая настройка тестов.
+
+Настройки (src.config) читаются из окружения при импорте — задаём заглушки
+до первого импорта src. Асинхронные тесты (async def test_...) запускаются
+в собственном event loop через asyncio.run, отдельный плагин не нужен.
+"""
+import asyncio
+import inspect
+import os
+
+import pytest
+
+for _name, _value in {
+    "AI_OPENAI_API_KEY": "test",
+    "AI_PROXY_URL": "",
+    "BOT_TOKEN": "1:test",
+    "HH_CLIENT_ID": "test",
+    "HH_CLIENT_SECRET": "test",
+    "HH_REDIRECT_URI": "http://localhost/callback",
+    "HH_TOKEN_URL": "http://localhost/token",
+    "HH_RESUME_URL": "http://localhost/resumes",
+    "HH_USER_AGENT": "hh-apply-tests",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    kwargs = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**kwargs))
+    return True
+
+
+@pytest.fixture(autouse=True)
+def _fresh_vacancy_cache():
+    """LRU кэша вакансий живёт на уровне процесса — тесты не должны видеть чужие записи."""
+    from src.utils.cache import vacancy_cache
+
+    vacancy_cache._lru.clear()
+    yield
+    vacancy_cache._lru.clear()
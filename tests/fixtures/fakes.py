@@ -0,0 +1,165 @@
+# tests/fixtures/fakes.py
+"""Подделки внешних систем для unit-тестов: Redis, HH API, БД в памяти."""
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Set
+
+from tortoise import Tortoise
+
+import src.utils.cache as cache_module
+
+
+class FakeRedis:
+    """Минимальный async Redis в памяти (только команды, которые использует проект)."""
+
+    def __init__(self) -> None:
+        self.data: Dict[str, Any] = {}
+        self.ttl: Dict[str, int] = {}   # ex из последнего set
+        self.fail = False   # True — каждая команда падает, как недоступный Redis
+
+    def _check(self) -> None:
+        if self.fail:
+            raise ConnectionError("redis is down")
+
+    async def get(self, key: str) -> Optional[bytes]:
+        self._check()
+        value = self.data.get(key)
+        return value.encode("utf-8") if isinstance(value, str) else value
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False) -> Optional[bool]:
+        self._check()
+        if nx and key in self.data:
+            return None
+        self.data[key] = value if isinstance(value, (str, bytes)) else str(value)
+        if ex is not None:
+            self.ttl[key] = ex
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        self._check()
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def sadd(self, key: str, *members: str) -> int:
+        self._check()
+        bucket: Set[str] = self.data.setdefault(key, set())
+        before = len(bucket)
+        bucket.update(members)
+        return len(bucket) - before
+
+    async def srem(self, key: str, *members: str) -> int:
+        self._check()
+        bucket: Set[str] = self.data.get(key, set())
+        before = len(bucket)
+        bucket.difference_update(members)
+        return before - len(bucket)
+
+    async def smembers(self, key: str) -> Set[bytes]:
+        self._check()
+        return {m.encode("utf-8") for m in self.data.get(key, set())}
+
+    async def rpush(self, key: str, *values: Any) -> int:
+        self._check()
+        items = self.data.setdefault(key, [])
+        items.extend(v.encode("utf-8") if isinstance(v, str) else v for v in values)
+        return len(items)
+
+    async def lpop(self, key: str, count: Optional[int] = None) -> Any:
+        self._check()
+        items = self.data.get(key) or []
+        if count is None:
+            return items.pop(0) if items else None
+        popped, self.data[key] = items[:count], items[count:]
+        return popped or None
+
+    async def lrange(self, key: str, start: int, end: int) -> List[bytes]:
+        self._check()
+        items = self.data.get(key) or []
+        return items[start:None if end == -1 else end + 1]
+
+    async def aclose(self) -> None:
+        pass
+
+
+def install_fake_redis() -> FakeRedis:
+    """Подменить Redis текущего event loop (см. src.utils.cache.get_redis)."""
+    redis = FakeRedis()
+    cache_module._redis_clients[asyncio.get_running_loop()] = redis
+    return redis
+
+
+def search_item(vacancy_id: Any, **extra: Any) -> Dict[str, Any]:
+    """Вакансия в выдаче поиска HH."""
+    item = {
+        "id": str(vacancy_id),
+        "name": f"Python developer {vacancy_id}",
+        "employer": {"id": f"e{vacancy_id}", "name": f"Company {vacancy_id}"},
+        "has_test": False,
+        "published_at": "2026-10-01T10:00:00+0300",
+        "snippet": {"requirement": "Python", "responsibility": "Разработка"},
+    }
+    item.update(extra)
+    return item
+
+
+class FakeHHClient:
+    """HH API: выдача поиска из списка, детали вакансий, учёт отправленных откликов."""
+
+    def __init__(self, items: List[Dict[str, Any]], *, vacancy_delay: float = 0.0) -> None:
+        self.items = items
+        self.vacancy_delay = vacancy_delay
+        self.failing_vacancies: Set[str] = set()
+        self.applied: List[str] = []
+        self.messages: Dict[str, str] = {}
+        self.vacancy_requests: List[str] = []
+        self.search_requests: List[tuple] = []
+
+    async def search_similar_vacancies(self, resume_id: str, text: str = "", per_page: int = 20,
+                                       page: int = 0, **kwargs: Any) -> List[Dict[str, Any]]:
+        self.search_requests.append((per_page, page))
+        return self.items[page * per_page:(page + 1) * per_page]
+
+    async def get_vacancy(self, vacancy_id: str, **kwargs: Any) -> Dict[str, Any]:
+        self.vacancy_requests.append(str(vacancy_id))
+        await asyncio.sleep(self.vacancy_delay)
+        if str(vacancy_id) in self.failing_vacancies:
+            raise RuntimeError(f"HH 500 for vacancy {vacancy_id}")
+        item = next((i for i in self.items if i["id"] == str(vacancy_id)), search_item(vacancy_id))
+        return {**item, "description": "<p>Разработка на Python.</p>", "key_skills": [{"name": "Python"}]}
+
+    async def apply_to_vacancy(self, resume_id: str, vacancy_id: str, message: str, **kwargs: Any) -> bool:
+        self.applied.append(str(vacancy_id))
+        self.messages[str(vacancy_id)] = message
+        return True
+
+
+@asynccontextmanager
+async def sqlite_db():
+    """Схема проекта в SQLite в памяти на время теста."""
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["src.models"]})
+    await Tortoise.generate_schemas()
+    try:
+        yield
+    finally:
+        await Tortoise.close_connections()
+
+
+async def create_resume(resume_id: str = "r1", user_id: int = 1, **fields: Any):
+    """Пользователь с активным резюме."""
+    from src.models import Resume, User
+
+    user, _ = await User.get_or_create(id=user_id)
+    fields.setdefault("status", "active")
+    return await Resume.create(id=resume_id, user=user, **fields)
+
+
+async def create_subscribers(plan: str, resumes_per_user: dict) -> None:
+    """Пользователи с активной подпиской plan и резюме: {user_id: число резюме}."""
+    from src.models import Subscription, User
+
+    for user_id, count in resumes_per_user.items():
+        user, _ = await User.get_or_create(id=user_id)
+        await Subscription.create(user=user, plan=plan)
+        for n in range(count):
+            await create_resume(f"u{user_id}r{n}", user_id)
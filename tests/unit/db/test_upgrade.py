@@ -0,0 +1,22 @@
+# tests/unit/db/test_upgrade.py
+from tortoise import Tortoise
+
+from src.db.upgrade import COLUMNS, upgrade_schema
+from src.models import Resume
+from tests.fixtures.fakes import create_resume, sqlite_db
+
+
+async def test_upgrade_adds_missing_columns_once():
+    async with sqlite_db():
+        conn = Tortoise.get_connection("default")
+        # База, созданная до снимка резюме
+        for table, column, _ in COLUMNS:
+            await conn.execute_script(f'ALTER TABLE "{table}" DROP COLUMN "{column}"')
+
+        added = await upgrade_schema()
+
+        assert added == [f"{table}.{column}" for table, column, _ in COLUMNS]
+        assert await upgrade_schema() == []
+        await create_resume(resume_text="Python developer", resume_profile={"name": "Анна"})
+        resume = await Resume.get(id="r1")
+        assert resume.resume_profile == {"name": "Анна"}
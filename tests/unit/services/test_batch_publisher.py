@@ -0,0 +1,132 @@
+# tests/unit/services/test_batch_publisher.py
+import json
+
+import pytest
+from celery import Celery
+from kombu.transport import redis as redis_transport
+
+import src.services.task_manager.batch_publisher as batch_publisher
+from src.config import config
+from src.services.task_manager.batch_publisher import publish_batched
+
+
+class SyncRedisStub:
+    """Синхронный Redis для канала kombu: очереди, множества и учёт запросов."""
+
+    def __init__(self):
+        self.lists = {}
+        self.sets = {}
+        self.commands = []      # запросы, ушедшие в Redis (pipeline — один запрос)
+
+    def ping(self):
+        return True
+
+    def sadd(self, key, *values):
+        self.commands.append("SADD")
+        self.sets.setdefault(key, set()).update(v.encode() if isinstance(v, str) else v for v in values)
+
+    def smembers(self, key):
+        self.commands.append("SMEMBERS")
+        return set(self.sets.get(key, ()))
+
+    def lpush(self, key, value):
+        self.commands.append("LPUSH")
+        self.lists.setdefault(key, []).insert(0, value)
+
+    def pipeline(self, transaction=True):
+        return PipelineStub(self)
+
+
+class PipelineStub:
+    def __init__(self, client):
+        self.client = client
+        self.queued = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
+
+    def lpush(self, key, value):
+        self.queued.append(("LPUSH", key, value))
+        return self
+
+    def llen(self, key):
+        self.queued.append(("LLEN", key, None))
+        return self
+
+    def reset(self):
+        self.queued = []
+
+    def execute(self):
+        # Учитываем только конвейеры с LPUSH (LLEN — объявление очереди в kombu)
+        pushes = [(key, value) for cmd, key, value in self.queued if cmd == "LPUSH"]
+        if pushes:
+            self.client.commands.append(f"PIPELINE({len(pushes)})")
+        for key, value in pushes:
+            self.client.lists.setdefault(key, []).insert(0, value)
+        results = [len(self.client.lists.get(key, ())) for cmd, key, _ in self.queued if cmd == "LLEN"]
+        self.queued = []
+        return results
+
+
+@pytest.fixture
+def redis_stub(monkeypatch):
+    stub = SyncRedisStub()
+    monkeypatch.setattr(redis_transport.Channel, "_create_client", lambda self, asynchronous=False: stub)
+    return stub
+
+
+@pytest.fixture
+def task(monkeypatch):
+    monkeypatch.setattr(config.apply, "publish_chunk_size", 4)
+    app = Celery("test_batch_publisher", broker="redis://localhost:6399/0")
+
+    @app.task(name="tests.echo")
+    def echo(value):
+        return value
+
+    yield echo
+    app.close()
+
+
+def test_publish_batched_pipelines_each_chunk(redis_stub, task):
+    task_ids = publish_batched(task, [[i] for i in range(10)], queue="free", routing_key="free")
+
+    assert len(task_ids) == 10
+    messages = [json.loads(raw) for raw in reversed(redis_stub.lists["free"])]
+    assert [m["headers"]["id"] for m in messages] == task_ids
+    # Без отдельных LPUSH: по одному pipeline на чанк из config.apply.publish_chunk_size
+    assert "LPUSH" not in redis_stub.commands
+    assert [c for c in redis_stub.commands if c.startswith("PIPELINE")] == ["PIPELINE(4)", "PIPELINE(4)", "PIPELINE(2)"]
+    assert redis_stub.commands.count("SMEMBERS") <= 3
+
+
+def test_publish_batched_restores_channel_methods(redis_stub, task):
+    publish_batched(task, [[1]], queue="free", routing_key="free", chunk_size=10)
+
+    with task.app.producer_or_acquire() as producer:
+        task.apply_async(args=[2], queue="free", routing_key="free", producer=producer)
+
+    assert redis_stub.commands[-1] == "LPUSH"
+    assert len(redis_stub.lists["free"]) == 2
+
+
+def test_unverified_kombu_publishes_one_by_one(redis_stub, task, monkeypatch):
+    monkeypatch.setattr(batch_publisher, "_PIPELINE_SUPPORTED", False)
+
+    task_ids = publish_batched(task, [[i] for i in range(5)], queue="free", routing_key="free")
+
+    assert len(task_ids) == 5
+    assert redis_stub.commands.count("LPUSH") == 5
+    assert not [c for c in redis_stub.commands if c.startswith("PIPELINE")]
+
+
+def test_pipeline_requires_verified_kombu_version(monkeypatch):
+    assert batch_publisher._pipeline_supported()
+    monkeypatch.setattr(batch_publisher.kombu, "VERSION", (5, 7, 0))
+    assert not batch_publisher._pipeline_supported()
+    monkeypatch.setattr(batch_publisher.kombu, "VERSION", (5, 6, 2))
+    monkeypatch.delattr(redis_transport.Channel, "_q_for_pri")
+    assert not batch_publisher._pipeline_supported()
@@ -0,0 +1,95 @@
+# tests/unit/services/test_cover_letter_cache.py
+import pytest
+
+import src.services.ai.cover_letter_service as letter_service
+from src.config import config
+from src.services.ai.cover_letter_service import cover_letter_cache_key, generate_cover_letter
+from src.utils.cache import LetterCache
+from src.utils.run_stats import run_stats_scope
+from tests.fixtures.fakes import install_fake_redis
+
+RESUME = "Python-разработчик, 5 лет опыта"
+VACANCY = "Ищем backend-разработчика на Python"
+
+
+class ChatStub:
+    def __init__(self, answer="Здравствуйте! Письмо."):
+        self.answer = answer
+        self.calls = 0
+
+    async def __call__(self, messages, **kwargs):
+        self.calls += 1
+        return self.answer
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    stub = ChatStub()
+    monkeypatch.setattr(letter_service, "chat_complete", stub)
+    monkeypatch.setattr(config.ai, "letter_stream", False)
+    return stub
+
+
+def test_cache_key_is_stable_for_same_inputs():
+    assert cover_letter_cache_key(RESUME, VACANCY, "m") == cover_letter_cache_key(RESUME, VACANCY, "m")
+
+
+@pytest.mark.parametrize("change", ["resume", "vacancy", "model", "layout", "budget", "prompt"])
+def test_cache_key_changes_with_generation_inputs(change, monkeypatch):
+    before = cover_letter_cache_key(RESUME, VACANCY, "m", "prefix")
+    resume, vacancy, model, layout = RESUME, VACANCY, "m", "prefix"
+    if change == "resume":
+        resume += "."
+    elif change == "vacancy":
+        vacancy += "."
+    elif change == "model":
+        model = "m2"
+    elif change == "layout":
+        layout = "suffix"
+    elif change == "budget":
+        monkeypatch.setattr(config.ai, "resume_token_budget", config.ai.resume_token_budget + 100)
+    else:
+        monkeypatch.setattr(letter_service, "PROMPT_VERSION", "changed")
+
+    assert cover_letter_cache_key(resume, vacancy, model, layout) != before
+
+
+def test_make_key_separates_parts():
+    assert LetterCache.make_key("ab", "c") != LetterCache.make_key("a", "bc")
+
+
+async def test_letter_cache_round_trip_and_stats():
+    redis = install_fake_redis()
+    cache = LetterCache(ttl=600, prefix="test:letter:")
+
+    with run_stats_scope() as run:
+        assert await cache.get("k") is None
+        await cache.set("k", "Письмо")
+        assert await cache.get("k") == "Письмо"
+
+    assert redis.ttl["test:letter:k"] == 600
+    assert (cache.stats.misses, cache.stats.redis_hits) == (1, 1)
+    stats = run.group("letter_cache", type(cache.stats))
+    assert (stats.misses, stats.redis_hits) == (1, 1)
+
+
+async def test_letter_cache_survives_redis_errors():
+    install_fake_redis().fail = True
+    cache = LetterCache(ttl=600, prefix="test:letter:")
+
+    await cache.set("k", "Письмо")
+    assert await cache.get("k") is None
+    assert cache.stats.errors == 2
+
+
+async def test_generate_cover_letter_reuses_cached_letter(chat):
+    install_fake_redis()
+
+    first = await generate_cover_letter(RESUME, VACANCY)
+    again = await generate_cover_letter(RESUME, VACANCY)
+
+    assert first == again == chat.answer
+    assert chat.calls == 1
+    # Без кэша — всегда новый вызов
+    await generate_cover_letter(RESUME, VACANCY, use_cache=False)
+    assert chat.calls == 2
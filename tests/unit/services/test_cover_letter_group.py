@@ -0,0 +1,106 @@
+# tests/unit/services/test_cover_letter_group.py
+import json
+
+import pytest
+
+import src.services.ai.cover_letter_service as letter_service
+from src.config import config
+from src.services.ai.cover_letter_service import (
+    cover_letter_cache_key,
+    generate_cover_letter,
+    generate_cover_letters,
+    parse_multi_letters,
+)
+from src.services.ai.prompt_manager import MULTI_PROMPT_VERSION, PROMPT_VERSION
+from src.utils.cache import letter_cache
+from tests.fixtures.fakes import install_fake_redis
+
+RESUME = "Python-разработчик, 5 лет опыта"
+VACANCIES = ["Вакансия 1: backend", "Вакансия 2: data", "Вакансия 3: devops"]
+LETTER = "Здравствуйте! Меня заинтересовала вакансия — " + "опыт " * 60
+
+
+class ChatStub:
+    """chat_complete: групповой ответ (response_format) и одиночные письма; ошибки — по тексту вакансии."""
+
+    def __init__(self, group_answer="", fail_on=()):
+        self.group_answer = group_answer
+        self.fail_on = fail_on
+        self.group_calls = 0
+        self.single_calls = 0
+
+    async def __call__(self, messages, **kwargs):
+        if "response_format" in kwargs:
+            self.group_calls += 1
+            return self.group_answer
+        self.single_calls += 1
+        prompt = "\n".join(m["content"] for m in messages)
+        if any(text in prompt for text in self.fail_on):
+            raise RuntimeError("boom")
+        return f"  {LETTER}  "
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    stub = ChatStub()
+    monkeypatch.setattr(letter_service, "chat_complete", stub)
+    monkeypatch.setattr(config.ai, "letter_stream", False)
+    return stub
+
+
+def test_multi_prompt_has_own_version():
+    assert MULTI_PROMPT_VERSION != PROMPT_VERSION
+    single = cover_letter_cache_key(RESUME, VACANCIES[0], "m")
+    group = cover_letter_cache_key(RESUME, VACANCIES[0], "m", prompt_version=MULTI_PROMPT_VERSION)
+    assert single != group
+
+
+async def test_single_and_grouped_letters_are_normalized_alike(chat):
+    install_fake_redis()
+
+    single = await generate_cover_letter(RESUME, VACANCIES[0], use_cache=False)
+    grouped = parse_multi_letters(json.dumps({"1": LETTER}), ["1"])["1"]
+
+    assert single == grouped == LETTER.strip().replace("—", "-")
+
+
+async def test_grouped_letters_are_cached_under_multi_prompt_version(chat):
+    install_fake_redis()
+    chat.group_answer = json.dumps({"letters": [{"id": str(i), "letter": LETTER} for i in (1, 2, 3)]})
+
+    letters = await generate_cover_letters(RESUME, VACANCIES, model="m")
+
+    assert chat.group_calls == 1 and chat.single_calls == 0
+    assert all(letter is not None for letter in letters)
+    for text in VACANCIES:
+        assert await letter_cache.get(cover_letter_cache_key(RESUME, text, "m")) is None
+        assert await letter_cache.get(
+            cover_letter_cache_key(RESUME, text, "m", prompt_version=MULTI_PROMPT_VERSION)
+        ) is not None
+
+    # Повтор берёт письма из кэша группы
+    assert await generate_cover_letters(RESUME, VACANCIES, model="m") == letters
+    assert chat.group_calls == 1
+
+
+async def test_grouped_letters_reuse_cached_single_letter(chat):
+    install_fake_redis()
+    await letter_cache.set(cover_letter_cache_key(RESUME, VACANCIES[1], "m"), "Одиночное письмо")
+    chat.group_answer = json.dumps({"1": LETTER, "2": LETTER})
+
+    letters = await generate_cover_letters(RESUME, VACANCIES, model="m")
+
+    assert letters[1] == "Одиночное письмо"
+    assert chat.group_calls == 1
+
+
+async def test_failed_fallback_letter_is_dropped_and_others_kept(chat):
+    install_fake_redis()
+    chat.group_answer = "не JSON"
+    chat.fail_on = (VACANCIES[1],)
+
+    letters = await generate_cover_letters(RESUME, VACANCIES, model="m")
+
+    assert letters[1] is None
+    assert letters[0] == letters[2] == LETTER.strip().replace("—", "-")
+    assert chat.single_calls == 3
@@ -0,0 +1,151 @@
+# tests/unit/services/test_letter_slots.py
+import json
+
+import pytest
+
+import src.services.ai.letter_slots as letter_slots
+from src.config import config
+from src.services.ai.letter_slots import fill_letter, gender_ending, generate_slot_letter, letter_salary, parse_slots
+from tests.fixtures.fakes import install_fake_redis
+
+PROFILE = {
+    "version": "p1",
+    "resume_hash": "h1",
+    "name": "Анна Иванова",
+    "gender_ending": "а",
+    "title": "Python developer",
+    "salary": "180000 RUR",
+    "contacts": ["Email: anna@example.com", "Телефон: +7 900 000-00-00", "Telegram: @anna"],
+    "key_skills": ["Python", "PostgreSQL", "Kubernetes"],
+    "highlights": ["Запустила платёжный сервис", "Ускорила отчёты в 10 раз"],
+}
+VACANCY = {
+    "id": "v1",
+    "name": "Backend-разработчик",
+    "employer": {"name": "Финтех"},
+    "salary": {"from": 150000, "to": 200000, "currency": "RUR"},
+    "key_skills": [{"name": "Python"}, {"name": "PostgreSQL"}],
+}
+SLOTS = {
+    "relevant_skills_match": "Пять лет пишу сервисы на Python и PostgreSQL.",
+    "key_expertise": "backend-разработки",
+    "personal_highlights": "- Запустила платёжный сервис",
+}
+
+
+def test_fill_letter_substitutes_mechanical_fields():
+    letter = fill_letter(PROFILE, VACANCY, SLOTS)
+
+    assert "Меня зовут Анна Иванова. Я хотела бы предложить свою кандидатуру на вакансию " \
+           "Backend-разработчик в компании Финтех." in letter
+    assert "Мои ожидания по зарплате - от 150000 до 200000 рублей." in letter
+    assert "можно по электронной почте, по телефону или через Telegram:\n➜ anna@example.com\n" \
+           "➜ +7 900 000-00-00\n➜ @anna" in letter
+    assert SLOTS["relevant_skills_match"] in letter and "в области backend-разработки," in letter
+    assert letter.endswith("С уважением,\nАнна Иванова")
+    assert "{" not in letter and "}" not in letter
+
+
+def test_fill_letter_drops_paragraphs_without_values():
+    profile = {**PROFILE, "salary": "", "contacts": [], "highlights": []}
+    vacancy = {**VACANCY, "salary": None}
+
+    letter = fill_letter(profile, vacancy, {**SLOTS, "personal_highlights": ""})
+
+    assert "ожидания по зарплате" not in letter
+    # Без контактов остаётся только предложение обсудить на собеседовании
+    assert "Буду рада обсудить на собеседовании, как мои навыки могут быть полезны вашей команде.\n" in letter
+    assert "Связаться" not in letter
+    assert "\n\n\n" not in letter
+
+
+def test_fill_letter_without_email_rewrites_contact_phrase():
+    profile = {**PROFILE, "contacts": ["Телефон: +7 900 000-00-00"]}
+
+    letter = fill_letter(profile, VACANCY, SLOTS)
+
+    assert "Связаться со мной можно по телефону:\n➜ +7 900 000-00-00" in letter
+    assert "электронной почте" not in letter
+
+
+def test_letter_salary_falls_back_to_resume_expectations():
+    assert letter_salary(PROFILE, {**VACANCY, "salary": {"from": 150000, "currency": "USD"}}) == "150000 долларов"
+    assert letter_salary(PROFILE, {**VACANCY, "salary": None}) == "180000 рублей"
+    assert letter_salary({**PROFILE, "salary": ""}, {}) == ""
+
+
+def test_gender_ending_uses_resume_then_name():
+    assert gender_ending({"name": "Мария", "gender_ending": ""}) == ""
+    assert gender_ending({"name": "Мария Петрова"}) == "а"
+    assert gender_ending({"name": "Никита Петров"}) == ""
+    assert gender_ending({"name": "Иван"}) == ""
+
+
+def test_parse_slots_keeps_only_valid_fragments():
+    answer = json.dumps({
+        "relevant_skills_match": "Пишу на Python — давно.",
+        "key_expertise": "backend-разработки.",
+        "personal_highlights": ["- Запустила сервис", "• Ускорила отчёты"],
+    }, ensure_ascii=False)
+
+    assert parse_slots(answer) == {
+        "relevant_skills_match": "Пишу на Python - давно.",
+        "key_expertise": "backend-разработки",
+        "personal_highlights": "- Запустила сервис\n- Ускорила отчёты",
+    }
+    assert parse_slots(json.dumps({"key_expertise": "x" * 500})) == {}
+    assert parse_slots("Добрый день! Письмо целиком") == {}
+
+
+class ChatStub:
+    def __init__(self, answer=None, fail=False):
+        self.answer = answer
+        self.fail = fail
+        self.calls = 0
+
+    async def __call__(self, messages, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("LLM is down")
+        return self.answer
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    stub = ChatStub(answer=json.dumps(SLOTS, ensure_ascii=False))
+    monkeypatch.setattr(letter_slots, "chat_complete", stub)
+    return stub
+
+
+async def test_slot_letter_is_cached_when_model_answered(chat):
+    install_fake_redis()
+
+    letter = await generate_slot_letter(PROFILE, VACANCY, "Python, PostgreSQL")
+    again = await generate_slot_letter(PROFILE, VACANCY, "Python, PostgreSQL")
+
+    assert letter == again == fill_letter(PROFILE, VACANCY, SLOTS)
+    assert chat.calls == 1
+
+
+async def test_slot_letter_falls_back_to_local_text(chat, monkeypatch):
+    install_fake_redis()
+    chat.fail = True
+    monkeypatch.setattr(config.ai, "letter_local_fallback", True)
+
+    letter = await generate_slot_letter(PROFILE, VACANCY, "Python, PostgreSQL")
+
+    assert "Мой опыт включает Python и PostgreSQL" in letter
+    assert "- Запустила платёжный сервис\n- Ускорила отчёты в 10 раз" in letter
+    # Локальное письмо не кэшируется: в следующий раз снова пробуем модель
+    chat.fail = False
+    await generate_slot_letter(PROFILE, VACANCY, "Python, PostgreSQL")
+    assert chat.calls == 2
+
+
+async def test_slot_letter_without_fallback_raises(chat, monkeypatch):
+    install_fake_redis()
+    chat.fail = True
+    monkeypatch.setattr(config.ai, "letter_local_fallback", False)
+
+    with pytest.raises(RuntimeError):
+        await generate_slot_letter(PROFILE, VACANCY, "Python, PostgreSQL")
@@ -0,0 +1,127 @@
+# tests/unit/services/test_letter_stream_check.py
+import pytest
+
+import src.services.ai.cover_letter_service as letter_service
+from src.config import config
+from src.services.ai.cover_letter_service import MAX_LETTER_CHARS, generate_cover_letter, letter_stream_check
+from src.services.ai.openai_pool import StreamAborted
+
+BODY = (
+    "Добрый день!\n\n"
+    "Меня зовут Иван Петров. Я хотел бы предложить свою кандидатуру на вакансию Python-разработчика.\n\n"
+    "Спасибо за внимание и надеюсь на скорую встречу!\n\n"
+)
+SIGNED = BODY + "С уважением,\nИван Петров\n"
+
+
+def _reason(text):
+    with pytest.raises(StreamAborted) as exc:
+        letter_stream_check(text)
+    return exc.value.reason
+
+
+def test_letter_in_progress_is_not_judged():
+    for end in range(1, len(BODY) + 1, 7):
+        assert letter_stream_check(BODY[:end]) is None
+    # Подпись без имени — письмо ещё не закончено
+    assert letter_stream_check(BODY + "С уважением,\n") is None
+    assert letter_stream_check(BODY + "С уважением,\nИван Пет") is None
+
+
+def test_letter_ends_after_name_line():
+    tail = "\n\nP.S. Готов ответить на вопросы."
+    assert letter_stream_check(SIGNED + tail) == len(SIGNED) - 1
+    assert (SIGNED + tail)[:len(SIGNED) - 1].endswith("Иван Петров")
+
+
+@pytest.mark.parametrize("text", ["Извините, я не могу", "К сожалению, по этим данным", "  Sorry, I cannot help"])
+def test_refusal_at_start(text):
+    assert _reason(text) == "refusal"
+
+
+def test_refusal_words_later_in_letter_are_fine():
+    text = BODY + "К сожалению, раньше не работал с Go, но быстро учусь.\n"
+    assert letter_stream_check(text) is None
+
+
+@pytest.mark.parametrize("text, reason", [
+    (BODY + "```python\n", "code_block"),
+    ("Меня зовут {candidate_name}.", "placeholder"),
+    (BODY + "а" * MAX_LETTER_CHARS, "too_long"),
+])
+def test_bad_letter_is_aborted(text, reason):
+    assert _reason(text) == reason
+
+
+def test_repeated_line_is_aborted_once_line_is_complete():
+    line = "Я умею писать надёжный код на Python.\n"
+    assert letter_stream_check(BODY + line * 2) is None
+    assert letter_stream_check(BODY + line * 2 + line[:-1]) is None
+    assert _reason(BODY + line * 3) == "repetition"
+    # Короткие строки (пустые, "- Python") повторяются законно
+    assert letter_stream_check(BODY + "- Python\n" * 5) is None
+
+
+def test_long_signed_letter_is_complete_not_too_long():
+    text = BODY + "а" * MAX_LETTER_CHARS + "\n" + "С уважением,\nИван Петров\n"
+    assert letter_stream_check(text) == len(text) - 1
+
+
+class StreamStub:
+    """chat_complete_stream: отдаёт answer кусками, как пул, — обрезка и обрыв по check."""
+
+    def __init__(self, answer):
+        self.answer = answer
+
+    async def __call__(self, messages, *, check, **kwargs):
+        for end in range(5, len(self.answer) + 5, 5):
+            text = self.answer[:end]
+            try:
+                cut = check(text)
+            except StreamAborted as e:
+                e.text = text
+                raise
+            if cut is not None:
+                return text[:cut]
+        return self.answer
+
+
+class ChatStub:
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = 0
+
+    async def __call__(self, messages, **kwargs):
+        self.calls += 1
+        return self.answer
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    monkeypatch.setattr(config.ai, "letter_stream", True)
+
+    def install(stream_answer, chat_answer="Письмо без потока"):
+        chat = ChatStub(chat_answer)
+        monkeypatch.setattr(letter_service, "chat_complete_stream", StreamStub(stream_answer))
+        monkeypatch.setattr(letter_service, "chat_complete", chat)
+        return chat
+
+    return install
+
+
+async def test_streamed_letter_is_cut_after_signature(stream):
+    chat = stream(SIGNED + "\nP.S. лишний текст, который модель дописала бы")
+
+    letter = await generate_cover_letter("резюме", "вакансия", use_cache=False)
+
+    assert letter == SIGNED.strip()
+    assert chat.calls == 0
+
+
+async def test_aborted_stream_is_retried_without_stream(stream):
+    chat = stream("Извините, я не могу написать это письмо.")
+
+    letter = await generate_cover_letter("резюме", "вакансия", use_cache=False)
+
+    assert letter == "Письмо без потока"
+    assert chat.calls == 1
@@ -0,0 +1,207 @@
+# tests/unit/services/test_openai_pool.py
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import BadRequestError, InternalServerError, RateLimitError
+
+import src.services.ai.openai_pool as pool
+from src.services.ai.openai_pool import (
+    LLMDeadlineExceeded,
+    OpenAIBackendSettings,
+    OpenAISettings,
+    ProviderUnavailable,
+    chat_complete_async,
+    is_provider_available,
+    llm_deadline,
+)
+
+_REQUEST = httpx.Request("POST", "https://api.openai.test/v1/chat/completions")
+
+
+def rate_limited(retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    return RateLimitError("rate limited", response=httpx.Response(429, headers=headers, request=_REQUEST), body=None)
+
+
+def server_error():
+    return InternalServerError("boom", response=httpx.Response(500, request=_REQUEST), body=None)
+
+
+class FakeAI:
+    """AsyncOpenAI: ответы и ошибки по сценарию script (по умолчанию — "ok")."""
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        self.calls += 1
+        answer = self.script.pop(0) if self.script else "ok"
+        if isinstance(answer, Exception):
+            raise answer
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))], usage=None)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Паузы между попытками не ждём, а записываем."""
+    delays = []
+    sleep = pool.asyncio.sleep
+
+    async def fake_sleep(delay, *args):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(pool.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+@asynccontextmanager
+async def fake_pool(*ais, **settings):
+    backends = tuple(OpenAIBackendSettings(name=f"b{i}", api_key="k") for i in range(len(ais)))
+    await pool.asetup(OpenAISettings(api_key="k", http2=False, backends=backends, **settings))
+    for backend, ai in zip(pool._clients.backends, ais):
+        backend.ai = ai
+    try:
+        yield
+    finally:
+        await pool.ateardown()
+
+
+def _messages(text="привет"):
+    return [{"role": "user", "content": text}]
+
+
+def test_retry_after_header_formats():
+    assert pool._retry_after(rate_limited(7)) == 7.0
+    assert pool._retry_after(rate_limited()) is None
+    ms = RateLimitError("rl", response=httpx.Response(429, headers={"retry-after-ms": "1500"}, request=_REQUEST),
+                        body=None)
+    assert pool._retry_after(ms) == 1.5
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < pool._retry_after(rate_limited(date)) <= 30
+
+
+def test_backoff_delay_honours_retry_after_and_jitters():
+    assert 7 <= pool._backoff_delay(0, rate_limited(7)) <= 7 + pool.BACKOFF_BASE
+    assert pool._backoff_delay(0, rate_limited(600)) <= pool.MAX_RETRY_AFTER + pool.BACKOFF_BASE
+    delays = [pool._backoff_delay(10, server_error()) for _ in range(200)]
+    assert all(0 <= d <= pool.BACKOFF_CAP for d in delays)
+    assert len(set(delays)) > 100
+
+
+async def test_retries_server_errors_and_honours_retry_after(sleeps):
+    ai = FakeAI([server_error(), rate_limited(7), "письмо"])
+    async with fake_pool(ai):
+        assert await chat_complete_async(_messages()) == "письмо"
+
+    assert ai.calls == 3
+    assert 7 <= sleeps[-1] <= 7 + pool.BACKOFF_BASE
+
+
+async def test_request_errors_are_not_retried(sleeps):
+    ai = FakeAI([BadRequestError("bad", response=httpx.Response(400, request=_REQUEST), body=None)])
+    async with fake_pool(ai):
+        with pytest.raises(BadRequestError):
+            await chat_complete_async(_messages())
+
+    assert ai.calls == 1 and sleeps == []
+
+
+async def test_deadline_stops_retries_that_cannot_fit(sleeps):
+    ai = FakeAI([rate_limited(30)])
+    async with fake_pool(ai):
+        with llm_deadline(time.monotonic() + 5):
+            with pytest.raises(LLMDeadlineExceeded) as exc:
+                await chat_complete_async(_messages())
+
+    # Ждать Retry-After бессмысленно: дедлайн раньше
+    assert isinstance(exc.value.__cause__, RateLimitError)
+    assert ai.calls == 1 and sleeps == []
+
+
+async def test_expired_deadline_skips_the_call():
+    ai = FakeAI()
+    async with fake_pool(ai):
+        with llm_deadline(time.monotonic()):
+            assert pool.llm_deadline_exceeded()
+            with pytest.raises(LLMDeadlineExceeded):
+                await chat_complete_async(_messages())
+
+    assert ai.calls == 0
+
+
+def _open_period_elapsed():
+    pool._clients.breaker.opened_until = time.monotonic() - 1
+
+
+async def test_circuit_breaker_fails_fast_and_probes(sleeps):
+    ai = FakeAI([server_error()] * 3)
+    async with fake_pool(ai, breaker_threshold=3, breaker_open_seconds=30):
+        with pytest.raises(ProviderUnavailable):
+            await chat_complete_async(_messages("1"))
+        assert ai.calls == 3
+        assert not is_provider_available()
+
+        # Пока автомат разомкнут, запросы не отправляются
+        with pytest.raises(ProviderUnavailable):
+            await chat_complete_async(_messages("2"))
+        assert ai.calls == 3
+
+        # Через open_seconds — пробный запрос; неудачный снова размыкает автомат
+        _open_period_elapsed()
+        assert is_provider_available()
+        ai.script = [server_error()]
+        with pytest.raises(ProviderUnavailable):
+            await chat_complete_async(_messages("3"))
+        assert not is_provider_available()
+
+        # Удачный пробный запрос замыкает
+        _open_period_elapsed()
+        assert await chat_complete_async(_messages("4")) == "ok"
+        assert is_provider_available()
+        assert pool._clients.breaker.opens == 2
+
+
+async def test_rate_limits_do_not_open_the_breaker(sleeps):
+    ai = FakeAI([rate_limited(1)] * 4)
+    async with fake_pool(ai, breaker_threshold=2):
+        assert await chat_complete_async(_messages()) == "ok"
+        assert is_provider_available()
+
+
+async def test_retry_goes_to_another_backend_and_ejects_failing_one(sleeps, monkeypatch):
+    # Взвешенный выбор без случайности: бэкенд с наибольшим весом × здоровьем
+    monkeypatch.setattr(pool.random, "choices", lambda population, weights: [population[weights.index(max(weights))]])
+    bad, good = FakeAI([server_error()] * 10), FakeAI()
+    async with fake_pool(bad, good, eject_after=2, breaker_threshold=100):
+        pool._clients.backends[1].settings = OpenAIBackendSettings(name="b1", api_key="k", weight=0.1)
+        results = [await chat_complete_async(_messages(str(i))) for i in range(5)]
+        stats = pool.backend_stats()
+        ejected = pool._clients.backends[0].ejected_until > time.monotonic()
+
+    assert results == ["ok"] * 5
+    # Ошибочный бэкенд после eject_after ошибок подряд исключён, дальше всё идёт на исправный
+    assert ejected
+    assert stats["b0"].server_errors == 2 and stats["b0"].ejections == 1
+    assert stats["b1"].successes == 5
+
+
+async def test_pick_backend_skips_ejected_and_avoided_backends():
+    async with fake_pool(FakeAI(), FakeAI(), FakeAI()):
+        b0, b1, b2 = pool._clients.backends
+        b0.ejected_until = time.monotonic() + 60
+
+        picked = {pool._pick_backend(avoid=b1).name for _ in range(50)}
+        assert picked == {"b2"}
+
+        # Все исключены — берём тот, что вернётся раньше
+        b1.ejected_until = time.monotonic() + 30
+        b2.ejected_until = time.monotonic() + 90
+        assert pool._pick_backend() is b1
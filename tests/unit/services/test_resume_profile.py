@@ -0,0 +1,75 @@
+# tests/unit/services/test_resume_profile.py
+import pytest
+
+import src.services.resume.profile as profile_module
+from src.models import Resume
+from src.services.resume.profile import ensure_resume_profile, is_profile_fresh
+from src.services.resume.snapshot import snapshot_fields
+from tests.fixtures.fakes import create_resume, sqlite_db
+
+RESUME_JSON = {
+    "first_name": "Анна",
+    "last_name": "Иванова",
+    "title": "Python developer",
+    "skill_set": ["Python"],
+    "experience": [{"position": "Backend", "company": "A", "description": "Писала сервисы. Ревьюила код."}],
+}
+
+
+class ChatStub:
+    def __init__(self, answer="- Сервисы на Python\n- Ревью кода", fail=False):
+        self.answer = answer
+        self.fail = fail
+        self.calls = 0
+
+    async def __call__(self, messages, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("LLM is down")
+        return self.answer
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    stub = ChatStub()
+    monkeypatch.setattr(profile_module, "chat_complete", stub)
+    return stub
+
+
+async def _resume() -> Resume:
+    return await create_resume(**snapshot_fields(RESUME_JSON))
+
+
+async def test_profile_is_built_once_per_resume_version(chat):
+    async with sqlite_db():
+        resume = await _resume()
+
+        profile = await ensure_resume_profile(resume)
+        again = await ensure_resume_profile(await Resume.get(id=resume.id))
+
+        assert profile["highlights"] == ["Сервисы на Python", "Ревью кода"]
+        assert again == profile
+        assert chat.calls == 1
+
+
+async def test_fallback_profile_is_saved_for_a_short_time(chat, monkeypatch):
+    chat.fail = True
+    async with sqlite_db():
+        resume = await _resume()
+
+        profile = await ensure_resume_profile(resume)
+        stored = await Resume.get(id=resume.id)
+
+        assert profile["highlights"] == ["Писала сервисы"]
+        assert stored.resume_profile == profile
+        # Пока запасной профиль свежий, модель не дёргаем на каждой вакансии
+        await ensure_resume_profile(stored)
+        assert chat.calls == 1
+
+        # По истечении FALLBACK_TTL профиль собирается заново
+        chat.fail = False
+        monkeypatch.setattr(profile_module.time, "time", lambda: profile["fallback_until"] + 1)
+        assert not is_profile_fresh(stored)
+        rebuilt = await ensure_resume_profile(stored)
+        assert chat.calls == 2
+        assert "fallback_until" not in rebuilt
@@ -0,0 +1,60 @@
+# tests/unit/services/test_resume_snapshot.py
+from datetime import timedelta
+
+from src.models import Resume
+from src.services.resume.snapshot import get_resume_text, set_resume_json, snapshot_fields
+from tests.fixtures.fakes import create_resume, sqlite_db
+
+RESUME_JSON = {"first_name": "Анна", "last_name": "Иванова", "title": "Python developer", "skill_set": ["Python"]}
+
+
+class HHResumes:
+    def __init__(self, resume_json, fail=False):
+        self.resume_json = resume_json
+        self.fail = fail
+        self.requests = 0
+
+    async def get_resume(self, resume_id, **kwargs):
+        self.requests += 1
+        if self.fail:
+            raise RuntimeError("HH is down")
+        return self.resume_json
+
+
+def test_json_hash_ignores_key_order():
+    assert Resume.json_hash({"a": 1, "b": [1, 2]}) == Resume.json_hash({"b": [1, 2], "a": 1})
+    assert Resume.json_hash({"a": 1}) != Resume.json_hash({"a": 2})
+
+
+def test_set_resume_json_rerenders_only_changed_resume():
+    resume = Resume(id="r1", **snapshot_fields(RESUME_JSON))
+    resume.resume_text = "rendered before"
+
+    set_resume_json(resume, dict(RESUME_JSON))
+    assert resume.resume_text == "rendered before"
+
+    set_resume_json(resume, {**RESUME_JSON, "title": "Go developer"})
+    assert resume.resume_text != "rendered before"
+    assert resume.resume_hash == Resume.json_hash({**RESUME_JSON, "title": "Go developer"})
+
+
+async def test_get_resume_text_uses_fresh_snapshot_without_hh():
+    async with sqlite_db():
+        resume = await create_resume(**snapshot_fields(RESUME_JSON))
+        hhc = HHResumes(RESUME_JSON)
+
+        text = await get_resume_text(resume, hhc, max_age=timedelta(hours=1))
+
+        assert text == resume.resume_text
+        assert hhc.requests == 0
+
+
+async def test_get_resume_text_keeps_stored_copy_when_hh_fails():
+    async with sqlite_db():
+        resume = await create_resume(**snapshot_fields(RESUME_JSON))
+        hhc = HHResumes(RESUME_JSON, fail=True)
+
+        text = await get_resume_text(resume, hhc, max_age=timedelta(0))
+
+        assert text == resume.resume_text
+        assert hhc.requests == 1
@@ -0,0 +1,123 @@
+# tests/unit/services/test_token_budget.py
+import pytest
+
+import src.services.ai.token_budget as token_budget
+from src.services.ai.token_budget import count_tokens, fit_prompt_inputs, fit_resume_text, fit_vacancy_text
+from src.services.resume.parser import extract_resume_description_from_json
+
+LONG_DUTIES = "Разработка сервисов на Python. " + "Поддержка legacy-кода и участие в ревью. " * 10
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Приближённая оценка (len / 3) — одинаковая с tiktoken и без него
+    monkeypatch.setattr(token_budget, "_encoding", lambda: None)
+
+
+def _resume(jobs=4) -> str:
+    return extract_resume_description_from_json({
+        "title": "Python developer",
+        "first_name": "Иван",
+        "last_name": "Петров",
+        "total_experience": {"months": 12 * 3 * jobs},
+        # HH отдаёт опыт от нового к старому
+        "experience": [
+            {
+                "start": f"{2022 - 3 * n}-01-01",
+                "end": None if n == 0 else f"{2024 - 3 * n}-12-01",
+                "position": f"Должность {n}",
+                "company": f"Компания {n}",
+                "description": LONG_DUTIES,
+            }
+            for n in range(jobs)
+        ],
+        "skill_set": ["Python", "PostgreSQL"],
+    })
+
+
+def _duties(text: str, company: str) -> str:
+    block = text.split(company, 1)[1].split("\n")
+    return block[1] if len(block) > 1 and block[1].startswith("  Обязанности: ") else ""
+
+
+def test_resume_within_budget_is_unchanged():
+    text = _resume()
+    assert fit_resume_text(text, count_tokens(text)) == text
+
+
+def test_resume_shortens_oldest_duties_first():
+    text = _resume()
+    fitted = fit_resume_text(text, count_tokens(text) - 10)
+
+    assert _duties(fitted, "Компания 3") == "  Обязанности: Разработка сервисов на Python."
+    for n in range(3):
+        assert _duties(fitted, f"Компания {n}") == "  Обязанности: " + LONG_DUTIES
+    assert fitted.endswith("КЛЮЧЕВЫЕ НАВЫКИ: Python, PostgreSQL")
+
+
+def test_resume_drops_oldest_duties_before_entries():
+    text = _resume()
+    short = count_tokens("Разработка сервисов на Python.")
+    # Всех сокращённых обязанностей мало, нужно убрать и пару из них совсем
+    fitted = fit_resume_text(text, count_tokens(text) - 4 * (count_tokens(LONG_DUTIES) - short) - 2 * short)
+
+    assert count_tokens(fitted) <= count_tokens(text) - 4 * (count_tokens(LONG_DUTIES) - short) - 2 * short
+    assert _duties(fitted, "Компания 3") == _duties(fitted, "Компания 2") == ""
+    assert _duties(fitted, "Компания 0") == "  Обязанности: Разработка сервисов на Python."
+    # Все места работы на месте
+    assert all(f"Компания {n}" in fitted for n in range(4))
+
+
+def test_resume_keeps_two_newest_entries_and_tail():
+    text = _resume(jobs=6)
+    fitted = fit_resume_text(text, 120)
+
+    assert count_tokens(fitted) <= 120
+    assert "Компания 0" in fitted and "Компания 1" in fitted
+    assert "Компания 5" not in fitted
+
+
+VACANCY = "\n".join([
+    "Название: Python-разработчик",
+    "ОПИСАНИЕ ВАКАНСИИ:",
+    "О компании: мы крупный финтех с дружным коллективом и большим офисом в центре города.",
+    "Требования: Python 3, asyncio, PostgreSQL, опыт от 3 лет.",
+    "Задачи: разработка платёжных сервисов и интеграций с банками.",
+    "Мы предлагаем:",
+    "ДМС со стоматологией для сотрудника и семьи",
+    "Печеньки, фрукты и кофе в офисе каждый день",
+])
+
+
+def test_vacancy_drops_low_value_paragraphs_first():
+    fitted = fit_vacancy_text(VACANCY, count_tokens(VACANCY) - 30)
+
+    assert "Требования: Python 3" in fitted and "Задачи: разработка" in fitted
+    assert "Печеньки" not in fitted
+    assert count_tokens(fitted) <= count_tokens(VACANCY) - 30
+
+
+def test_vacancy_removes_heading_left_without_items():
+    budget = count_tokens("\n".join(VACANCY.split("\n")[:5]))
+    fitted = fit_vacancy_text(VACANCY, budget)
+
+    assert "Мы предлагаем:" not in fitted
+    assert "ДМС" not in fitted
+    assert "О компании" in fitted
+
+
+def test_vacancy_without_description_is_truncated():
+    fitted = fit_vacancy_text("слово " * 100, 20)
+
+    assert fitted.endswith(" …")
+    assert count_tokens(fitted) <= 20
+
+
+def test_fit_prompt_inputs_reports_saved_tokens():
+    resume, vacancy = _resume(), VACANCY
+
+    result = fit_prompt_inputs(resume, vacancy, resume_budget=150, vacancy_budget=None)
+
+    assert result.vacancy_text == vacancy
+    assert result.resume_tokens == (count_tokens(resume), count_tokens(result.resume_text))
+    assert result.saved == count_tokens(resume) - count_tokens(result.resume_text) > 0
@@ -0,0 +1,122 @@
+# tests/unit/services/test_usage_ledger.py
+import time
+from datetime import timedelta
+
+from tortoise.timezone import now
+
+import src.services.ai.usage_ledger as ledger_module
+from src.models import LLMUsage
+from src.services.ai.openai_pool import LLMCall
+from src.services.ai.usage_ledger import UsageLedger
+from src.services.analytics.report_generator import format_usage_report, llm_usage_report
+from tests.fixtures.fakes import create_subscribers, sqlite_db
+
+
+def call(user_id=1, purpose="letter", latency=1.0, error=None, attempts=1, finished_at=None):
+    return LLMCall(
+        model="gpt-5-mini",
+        context={"user_id": user_id, "resume_id": f"u{user_id}r0", "purpose": purpose, "prompt_version": "v1"},
+        ok=error is None,
+        error=error,
+        attempts=attempts,
+        latency=latency,
+        prompt_tokens=100,
+        cached_tokens=40,
+        completion_tokens=50,
+        finished_at=finished_at or time.time(),
+    )
+
+
+def ledger(**kwargs):
+    usage = UsageLedger(**kwargs)
+    usage.enabled = True
+    return usage
+
+
+def test_ledger_is_due_by_size_or_age():
+    usage = ledger(flush_size=3, flush_interval=60)
+    assert not usage.due()
+
+    usage.record(call())
+    usage.record(call())
+    assert not usage.due()
+    usage.record(call())
+    assert usage.due()
+
+    old = ledger(flush_size=100, flush_interval=60)
+    old.record(call(finished_at=time.time() - 61))
+    assert old.due()
+
+
+def test_disabled_ledger_records_nothing():
+    usage = UsageLedger()
+    usage.record(call())
+    assert len(usage) == 0
+
+
+def test_full_buffer_drops_oldest():
+    usage = ledger(max_buffer=3)
+    for user_id in range(5):
+        usage.record(call(user_id=user_id))
+
+    assert len(usage) == 3 and usage.dropped == 2
+    assert [c.context["user_id"] for c in usage._buffer] == [2, 3, 4]
+
+
+async def test_flush_writes_one_batch_and_keeps_records_on_failure(monkeypatch):
+    async with sqlite_db():
+        usage = ledger()
+        for _ in range(4):
+            usage.record(call())
+
+        inserts = []
+        bulk_create = LLMUsage.bulk_create
+
+        async def failing_bulk_create(rows, **kwargs):
+            inserts.append(len(rows))
+            raise ConnectionError("db is down")
+
+        monkeypatch.setattr(ledger_module.LLMUsage, "bulk_create", failing_bulk_create)
+        assert await usage.flush() == 0
+        assert len(usage) == 4
+
+        async def counting_bulk_create(rows, **kwargs):
+            inserts.append(len(rows))
+            return await bulk_create(rows, **kwargs)
+
+        monkeypatch.setattr(ledger_module.LLMUsage, "bulk_create", counting_bulk_create)
+        assert await usage.flush() == 4
+
+        assert inserts == [4, 4]
+        assert len(usage) == 0
+        row = await LLMUsage.first()
+        assert (row.purpose, row.latency_ms, row.prompt_tokens, row.cached_tokens) == ("letter", 1000, 100, 40)
+
+
+async def test_report_groups_calls_with_latency_percentiles():
+    async with sqlite_db():
+        await create_subscribers("plus", {1: 1})
+        usage = ledger()
+        # 20 писем с задержкой 0.1..2.0 с, одна ошибка с ретраями; профиль резюме; batch без задержки
+        for i in range(1, 21):
+            usage.record(call(latency=i / 10))
+        usage.record(call(latency=5.0, error="timeouts", attempts=3))
+        usage.record(call(purpose="resume_profile", latency=0.5))
+        usage.record(call(user_id=2, purpose="letter_batch", latency=None))
+        await usage.flush()
+
+        by_purpose = await llm_usage_report(now() - timedelta(hours=1), group_by="purpose")
+        by_plan = await llm_usage_report(now() - timedelta(hours=1), group_by="plan")
+
+        letters = by_purpose["letter"]
+        assert (letters.calls, letters.errors, letters.retries) == (21, 1, 2)
+        assert (letters.latency_p50_ms, letters.latency_p95_ms) == (1100, 2000)
+        assert letters.tokens_per_call == 150 * 21 / 20
+        assert by_purpose["letter_batch"].latency_p50_ms is None
+        assert by_purpose["resume_profile"].calls == 1
+
+        # Пользователь без подписки — free
+        assert {key: group.calls for key, group in by_plan.items()} == {"plus": 22, "free": 1}
+
+        table = format_usage_report(by_purpose, "purpose")
+        assert table.splitlines()[1].startswith("letter ")
@@ -0,0 +1,44 @@
+# tests/unit/services/test_vacancy_filter.py
+from src.bot.dialogs.resumes.handlers import parse_employers
+from src.services.vacancy.filter import VacancyFilter
+from tests.fixtures.fakes import search_item
+
+
+def test_filter_counts_removals_per_rule():
+    vacancy_filter = VacancyFilter(["PHP", "1С"], ["e2", "Рога и Копыта"])
+    items = [
+        search_item(1),
+        search_item(2),                                              # работодатель по id
+        search_item(3, employer={"id": "e9", "name": "рога и копыта"}),  # по названию
+        search_item(4, name="PHP developer"),
+        search_item(5, snippet={"requirement": "Опыт <highlighttext>1С</highlighttext>"}),
+        search_item(6, name="php-разработчик"),
+    ]
+
+    kept = vacancy_filter.apply(items)
+
+    assert [i["id"] for i in kept] == ["1"]
+    assert vacancy_filter.checked == 6
+    assert vacancy_filter.removed == {
+        "employer:e2": 1, "employer:рога и копыта": 1, "keyword:PHP": 2, "keyword:1С": 1,
+    }
+
+
+def test_filter_matches_whole_words_longest_first():
+    vacancy_filter = VacancyFilter(["java", "java script"])
+
+    assert vacancy_filter.rejection_reason(search_item(1, name="Java Script developer")) == "keyword:java script"
+    assert vacancy_filter.rejection_reason(search_item(2, name="Javanese translator")) is None
+
+
+def test_empty_filter():
+    vacancy_filter = VacancyFilter(["  "], [None, ""])
+
+    assert vacancy_filter.is_empty
+    assert vacancy_filter.apply([search_item(1)]) == [search_item(1)]
+
+
+def test_parse_employers():
+    text = "Рога и копыта, https://hh.ru/employer/1234?from=vacancy\nрога и копыта; 42"
+
+    assert parse_employers(text) == ["Рога и копыта", "1234", "42"]
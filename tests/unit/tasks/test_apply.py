@@ -0,0 +1,168 @@
+# tests/unit/tasks/test_apply.py
+import asyncio
+
+import pytest
+
+import src.tasks.apply as apply_module
+from src.models import ApplicationHistory, ApplicationResult, ApplicationStatus
+from src.services.ai.openai_pool import LLMDeadlineExceeded, ProviderUnavailable
+from tests.fixtures.fakes import FakeHHClient, create_resume, install_fake_redis, search_item, sqlite_db
+
+
+class LetterStub:
+    """generate_letter_for_vacancy: задержка по id вакансии, учёт начатых и отменённых генераций."""
+
+    def __init__(self, delays=None, errors=None):
+        self.delays = delays or {}
+        self.errors = errors or {}
+        self.started = []
+        self.cancelled = []
+
+    async def __call__(self, resume_text, vacancy, profile=None):
+        vacancy_id = vacancy["id"]
+        self.started.append(vacancy_id)
+        try:
+            await asyncio.sleep(self.delays.get(vacancy_id, 0.01))
+        except asyncio.CancelledError:
+            self.cancelled.append(vacancy_id)
+            raise
+        if vacancy_id in self.errors:
+            raise self.errors[vacancy_id]
+        return f"Письмо для {vacancy_id}"
+
+
+@pytest.fixture
+def letters(monkeypatch):
+    stub = LetterStub()
+    monkeypatch.setattr(apply_module, "generate_letter_for_vacancy", stub)
+    return stub
+
+
+async def _apply(hhc, cap, concurrency=3):
+    return await apply_module._apply_concurrently(
+        hhc, 1, "r1", "резюме", hhc.items, cap, concurrency,
+    )
+
+
+async def test_concurrent_apply_sends_exactly_cap(letters):
+    async with sqlite_db():
+        install_fake_redis()
+        await create_resume()
+        hhc = FakeHHClient([search_item(i) for i in range(10)])
+
+        sent = await _apply(hhc, cap=4, concurrency=3)
+
+        assert sent == 4
+        assert len(hhc.applied) == 4
+        assert await ApplicationHistory.filter(status=ApplicationStatus.SUCCESS).count() == 4
+
+
+async def test_concurrent_apply_cancels_in_flight_siblings(letters):
+    # 0 и 1 готовы сразу, остальные — долго: после второго отклика их генерация отменяется
+    letters.delays = {str(i): 5.0 for i in range(2, 8)}
+    async with sqlite_db():
+        install_fake_redis()
+        await create_resume()
+        hhc = FakeHHClient([search_item(i) for i in range(8)])
+
+        sent = await asyncio.wait_for(_apply(hhc, cap=2, concurrency=5), timeout=2)
+
+        assert sent == 2
+        assert sorted(hhc.applied) == ["0", "1"]
+        # Параллельно генерируется не больше cap писем; начатые лишние отменены, не дожидаясь их
+        assert len(letters.started) <= 2 + 2
+        assert sorted(letters.cancelled) == sorted(set(letters.started) - {"0", "1"})
+        assert not [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+
+async def test_concurrent_apply_with_zero_cap_sends_nothing(letters):
+    hhc = FakeHHClient([search_item(i) for i in range(3)])
+
+    assert await _apply(hhc, cap=0) == 0
+    assert hhc.applied == []
+    assert letters.started == []
+
+
+async def test_concurrent_apply_skips_failed_vacancy(letters):
+    letters.errors = {"1": RuntimeError("LLM returned garbage")}
+    async with sqlite_db():
+        install_fake_redis()
+        await create_resume()
+        hhc = FakeHHClient([search_item(i) for i in range(5)])
+        hhc.failing_vacancies = {"2"}
+
+        sent = await _apply(hhc, cap=None)
+
+        assert sent == 3
+        assert sorted(hhc.applied) == ["0", "3", "4"]
+
+
+async def test_concurrent_apply_stops_when_provider_unavailable(letters):
+    letters.errors = {"0": ProviderUnavailable("circuit open")}
+    letters.delays = {"0": 0.0, "1": 0.5, "2": 0.5}
+    async with sqlite_db():
+        install_fake_redis()
+        await create_resume()
+        hhc = FakeHHClient([search_item(i) for i in range(3)])
+
+        sent = await asyncio.wait_for(_apply(hhc, cap=None, concurrency=1), timeout=2)
+
+        assert sent == 0
+        assert hhc.applied == []
+        assert letters.started == ["0"]
+
+
+async def test_sequential_apply_stops_at_cap_and_skips_failures(letters):
+    letters.errors = {"0": RuntimeError("boom")}
+    async with sqlite_db():
+        install_fake_redis()
+        await create_resume()
+        hhc = FakeHHClient([search_item(i) for i in range(5)])
+
+        sent = await apply_module._apply_sequentially(hhc, 1, "r1", "резюме", hhc.items, 2)
+
+        assert sent == 2
+        assert hhc.applied == ["1", "2"]
+
+
+async def test_grouped_apply_skips_missing_letters(monkeypatch):
+    async def letters_for(resume_text, vacancy_texts):
+        # Второе письмо в группе не получилось
+        return [None if i == 1 else f"Письмо {i}" for i in range(len(vacancy_texts))]
+
+    monkeypatch.setattr(apply_module, "generate_cover_letters", letters_for)
+    async with sqlite_db():
+        install_fake_redis()
+        await create_resume()
+        hhc = FakeHHClient([search_item(i) for i in range(6)])
+
+        sent = await apply_module._apply_grouped(hhc, 1, "r1", "резюме", hhc.items, None, 3)
+
+        assert sent == 4
+        assert sorted(hhc.applied) == ["0", "2", "3", "5"]
+
+
+async def test_apply_reraises_llm_deadline_without_result(letters, monkeypatch):
+    letters.errors = {"2": LLMDeadlineExceeded("LLM call deadline exceeded")}
+    letters.delays = {"2": 0.05, "3": 5.0, "4": 5.0, "5": 5.0}
+
+    async def prompt_inputs(resume, hhc):
+        return "резюме", None
+
+    async with sqlite_db():
+        install_fake_redis()
+        await create_resume()
+        hhc = FakeHHClient([search_item(i) for i in range(6)])
+        monkeypatch.setattr(apply_module, "get_hh_client", lambda user_id: hhc)
+        monkeypatch.setattr(apply_module, "get_resume_prompt_inputs", prompt_inputs)
+        monkeypatch.setattr(apply_module, "can_generate_letters", lambda: True)
+
+        with pytest.raises(LLMDeadlineExceeded):
+            await asyncio.wait_for(apply_module.apply_for_resume_task("r1", cap=5, concurrency=4), timeout=2)
+
+        # Отправленное до дедлайна учтено в истории, недоделанная генерация отменена
+        assert sorted(hhc.applied) == ["0", "1"]
+        assert await ApplicationHistory.filter(resume_id="r1", status=ApplicationStatus.SUCCESS).count() == 2
+        assert "3" in letters.cancelled
+        # Итог прогона запишет продолжение — второй записи на то же резюме не будет
+        assert not await ApplicationResult.filter(resume_id="r1").exists()
@@ -0,0 +1,156 @@
+# tests/unit/tasks/test_cohort.py
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from tortoise.timezone import now
+
+from src.config import config
+from src.models import ApplicationHistory, ApplicationStatus
+from src.services.ai.openai_pool import LLMDeadlineExceeded
+from src.tasks.cohort import process_user, run_cohort
+from tests.fixtures.fakes import create_subscribers, install_fake_redis, sqlite_db
+
+
+class ResumeStub:
+    """process_resume: (resume_id, cap) -> sent; учёт вызовов и одновременных пользователей."""
+
+    def __init__(self, sent_per_resume=1, delay=0.01, fail_users=(), slow_users=(), deadline_users=()):
+        self.sent_per_resume = sent_per_resume
+        self.delay = delay
+        self.fail_users = set(fail_users)
+        self.slow_users = set(slow_users)
+        self.deadline_users = set(deadline_users)
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, resume_id, cap):
+        user_id = int(resume_id[1:].split("r")[0])
+        self.calls.append((resume_id, cap))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(10 if user_id in self.slow_users else self.delay)
+            if user_id in self.fail_users:
+                raise RuntimeError("HH is down")
+            if user_id in self.deadline_users:
+                raise LLMDeadlineExceeded("LLM call deadline exceeded")
+            return min(cap, self.sent_per_resume)
+        finally:
+            self.active -= 1
+
+
+async def test_cohort_bounds_concurrent_users():
+    async with sqlite_db():
+        install_fake_redis()
+        await create_subscribers("plus", {uid: 1 for uid in range(1, 11)})
+        stub = ResumeStub(delay=0.02)
+
+        stats = await run_cohort(["plus"], per_user_cap=3, concurrency=3, user_timeout=0, process_resume=stub)
+
+        assert stub.peak == 3
+        assert (stats.users, stats.succeeded, stats.sent) == (10, 10, 10)
+        assert stats.finished and stats.cursor == 10
+
+
+async def test_cohort_splits_cap_across_user_resumes():
+    async with sqlite_db():
+        install_fake_redis()
+        await create_subscribers("free", {1: 3})
+        stub = ResumeStub(sent_per_resume=2)
+
+        stats = await run_cohort(["free"], per_user_cap=3, user_timeout=0, process_resume=stub)
+
+        # 2 отклика по первому резюме, 1 — по второму, до третьего очередь не доходит
+        assert [cap for _, cap in stub.calls] == [3, 1]
+        assert stats.sent == 3
+
+
+async def test_cohort_isolates_failed_and_slow_users():
+    async with sqlite_db():
+        install_fake_redis()
+        await create_subscribers("pro", {1: 1, 2: 1, 3: 1})
+        stub = ResumeStub(fail_users={1}, slow_users={2})
+
+        stats = await run_cohort(["pro"], per_user_cap=3, user_timeout=0.2, process_resume=stub)
+
+        assert (stats.succeeded, stats.failed, stats.timed_out) == (1, 1, 1)
+        assert stats.sent == 1
+        assert stats.finished
+
+
+async def test_cohort_deadline_cancels_in_flight_users_and_continuation_resumes(monkeypatch):
+    monkeypatch.setattr(config.apply, "cohort_drain_seconds", 0.0)
+    async with sqlite_db():
+        redis = install_fake_redis()
+        await create_subscribers("plus", {1: 1, 2: 1, 3: 1})
+        stub = ResumeStub(slow_users={2})
+
+        stats = await run_cohort(
+            ["plus"], per_user_cap=3, user_timeout=0, process_resume=stub,
+            run_id="run1", deadline=time.monotonic() + 0.3,
+        )
+
+        # Пользователь 3 обработан, но курсор стоит перед незавершённым пользователем 2
+        assert (stats.succeeded, stats.timed_out, stats.failed) == (2, 0, 0)
+        assert stats.cursor == 1 and not stats.finished
+        assert json.loads(redis.data["cohort:cursor:run1"]) == {"cursor": 1, "done": [3]}
+
+        stub = ResumeStub()
+        stats = await run_cohort(["plus"], per_user_cap=3, user_timeout=0, process_resume=stub, run_id="run1")
+
+        # Обработанный за курсором пользователь 3 не повторяется
+        assert [rid for rid, _ in stub.calls] == ["u2r0"]
+        assert stats.users == 1 and stats.sent == 1
+        assert stats.cursor == 3 and stats.finished
+
+
+async def test_cohort_defers_users_hit_by_llm_deadline():
+    async with sqlite_db():
+        install_fake_redis()
+        await create_subscribers("plus", {1: 1, 2: 1, 3: 1})
+        stub = ResumeStub(deadline_users={2})
+
+        stats = await run_cohort(["plus"], per_user_cap=3, user_timeout=0, process_resume=stub, run_id="run1")
+
+        assert (stats.succeeded, stats.deferred, stats.failed, stats.timed_out) == (2, 1, 0, 0)
+        assert stats.cursor == 1 and not stats.finished
+
+        # Продолжение доделывает только отложенного
+        stub = ResumeStub()
+        stats = await run_cohort(["plus"], per_user_cap=3, user_timeout=0, process_resume=stub, run_id="run1")
+
+        assert [rid for rid, _ in stub.calls] == ["u2r0"]
+        assert stats.cursor == 3 and stats.finished
+
+
+async def test_process_user_subtracts_applications_sent_since_run_start():
+    async with sqlite_db():
+        await create_subscribers("plus", {1: 1})
+        started_at = now() - timedelta(minutes=5)
+        await ApplicationHistory.create(
+            user_id=1, resume_id="u1r0", vacancy_id="v1",
+            status=ApplicationStatus.SUCCESS, applied_at=now(),
+        )
+        stub = ResumeStub(sent_per_resume=5)
+
+        sent = await process_user(1, 3, stub, started_at)
+
+        assert stub.calls == [("u1r0", 2)]
+        # Отклик из прерванной задачи уменьшает лимит, но в результат этого вызова не входит
+        assert sent == 2
+
+
+async def test_cursor_saved_as_plain_id_is_still_read():
+    async with sqlite_db():
+        redis = install_fake_redis()
+        await create_subscribers("plus", {1: 1, 2: 1})
+        redis.data["cohort:cursor:run1"] = "1"
+        stub = ResumeStub()
+
+        stats = await run_cohort(["plus"], per_user_cap=3, user_timeout=0, process_resume=stub, run_id="run1")
+
+        assert [rid for rid, _ in stub.calls] == ["u2r0"]
+        assert stats.cursor == 2
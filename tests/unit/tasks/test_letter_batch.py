@@ -0,0 +1,117 @@
+# tests/unit/tasks/test_letter_batch.py
+import pytest
+
+import src.tasks.letter_batch as letter_batch
+from src.models import ApplicationHistory, ApplicationStatus
+from src.services.ai.openai_pool import FakeBatchBackend, get_batch_backend
+from src.utils.cache import letter_cache
+from src.tasks.cohort import run_cohort
+from src.tasks.letter_batch import STAGED_KEY, LetterBatchCollector, apply_ready_batches
+from tests.fixtures.fakes import FakeHHClient, create_subscribers, install_fake_redis, search_item, sqlite_db
+
+
+LETTER = "Добрый день! Меня заинтересовала ваша вакансия — " + "опыт " * 60
+
+
+def letter_responder(messages):
+    return f"  {LETTER}  "
+
+
+@pytest.fixture
+def hhc(monkeypatch, tmp_path):
+    client = FakeHHClient([search_item(i) for i in range(6)])
+
+    async def prompt_text(resume, hhc):
+        return "Python-разработчик, 5 лет опыта"
+
+    monkeypatch.setattr(letter_batch, "get_hh_client", lambda user_id: client)
+    monkeypatch.setattr(letter_batch, "get_resume_prompt_text", prompt_text)
+    monkeypatch.setattr(letter_batch, "get_batch_backend", lambda name: FakeBatchBackend(root=tmp_path, responder=letter_responder))
+    return client
+
+
+async def test_requests_are_staged_before_the_cursor_moves(hhc):
+    async with sqlite_db():
+        redis = install_fake_redis()
+        await create_subscribers("free", {1: 1, 2: 1})
+        collector = LetterBatchCollector(backend="fake")
+
+        stats = await run_cohort(
+            ["free"], per_user_cap=2, user_timeout=0, process_resume=collector.add_resume, run_id="run1",
+        )
+
+        # Задача оборвалась до submit: запросы уже в Redis, курсор прошёл обоих
+        assert stats.cursor == 2 and stats.sent == 4
+        assert len(redis.data[STAGED_KEY]) == 2
+
+        # Следующий опрос отправляет оставшееся, забирает письма и откликается
+        sent = await apply_ready_batches()
+
+        assert sent == 4
+        assert not redis.data[STAGED_KEY]
+        assert await ApplicationHistory.filter(status=ApplicationStatus.SUCCESS).count() == 4
+        assert not await redis.smembers(letter_batch.PENDING_KEY)
+
+
+async def test_staged_requests_count_against_the_user_cap(hhc):
+    async with sqlite_db():
+        redis = install_fake_redis()
+        await create_subscribers("free", {1: 1})
+        assert await LetterBatchCollector(backend="fake").add_resume("u1r0", 2) == 2
+
+        # Продолжение после обрыва: ожидающие отправки запросы занимают лимит
+        again = LetterBatchCollector(backend="fake")
+        assert await again.add_resume("u1r0", 3) == 3
+
+        batch_ids = await again.submit()
+
+        assert len(batch_ids) == 1
+        meta = await letter_batch._load_meta(batch_ids[0])
+        vacancy_ids = [item["vacancy_id"] for item in meta["items"].values()]
+        assert sorted(vacancy_ids) == ["0", "1", "2"]
+        assert not redis.data[STAGED_KEY]
+
+
+async def test_failed_submit_keeps_staged_requests(hhc, monkeypatch):
+    async with sqlite_db():
+        redis = install_fake_redis()
+        await create_subscribers("free", {1: 1})
+        collector = LetterBatchCollector(backend="fake")
+        await collector.add_resume("u1r0", 2)
+
+        class DownBackend:
+            async def submit(self, requests):
+                raise ConnectionError("batch API is down")
+
+        monkeypatch.setattr(letter_batch, "get_batch_backend", lambda name: DownBackend())
+        with pytest.raises(ConnectionError):
+            await collector.submit()
+
+        assert len(redis.data[STAGED_KEY]) == 1
+
+
+def test_fake_backend_is_not_selectable_by_name():
+    # Ответы FakeBatchBackend — заглушки, по настройке AI_BATCH_BACKEND они уйти работодателям не должны
+    with pytest.raises(ValueError):
+        get_batch_backend("fake")
+
+
+async def test_batch_letters_are_normalized_and_validated(hhc, monkeypatch, tmp_path):
+    answers = iter([LETTER, "Меня зовут {candidate_name}", ""])
+    monkeypatch.setattr(letter_batch, "get_batch_backend",
+                        lambda name: FakeBatchBackend(root=tmp_path, responder=lambda messages: next(answers)))
+    async with sqlite_db():
+        install_fake_redis()
+        await create_subscribers("free", {1: 1})
+        collector = LetterBatchCollector(backend="fake")
+        await collector.add_resume("u1r0", 3)
+        [batch_id] = await collector.submit()
+        meta = await letter_batch._load_meta(batch_id)
+
+        sent = await apply_ready_batches()
+
+        # Письмо с плейсхолдером и пустое не отправляются и не кэшируются
+        assert sent == 1
+        assert list(hhc.messages.values()) == [LETTER.strip().replace("—", "-")]
+        cached = [await letter_cache.get(item["cache_key"]) for item in meta["items"].values()]
+        assert sorted(cached, key=str) == sorted([LETTER.strip().replace("—", "-"), None, None], key=str)
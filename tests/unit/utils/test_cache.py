@@ -0,0 +1,72 @@
+# tests/unit/utils/test_cache.py
+from src.utils.cache import VacancyCache, vacancy_version
+from tests.fixtures.fakes import FakeHHClient, install_fake_redis, search_item
+
+
+def _cache() -> VacancyCache:
+    return VacancyCache(ttl=3600, lru_size=10, prefix="test:vacancy:")
+
+
+def test_vacancy_version_prefers_updated_at():
+    assert vacancy_version({"published_at": "p", "updated_at": "u"}) == "u"
+    assert vacancy_version({"published_at": "p"}) == "p"
+    assert vacancy_version(None) is None
+
+
+async def test_vacancy_cache_layers():
+    install_fake_redis()
+    cache = _cache()
+    hhc = FakeHHClient([search_item(1)])
+
+    first = await cache.get(hhc, "1", version="2026-10-01T10:00:00+0300")
+    again = await cache.get(hhc, "1", version="2026-10-01T10:00:00+0300")
+
+    assert again == first
+    assert hhc.vacancy_requests == ["1"]
+    assert (cache.stats.misses, cache.stats.local_hits) == (1, 1)
+
+    # Другой воркер: пустой LRU, но запись уже в Redis
+    other = _cache()
+    await other.get(hhc, "1", version="2026-10-01T10:00:00+0300")
+    assert hhc.vacancy_requests == ["1"]
+    assert other.stats.redis_hits == 1
+
+
+async def test_vacancy_cache_refetches_on_new_version():
+    install_fake_redis()
+    cache = _cache()
+    hhc = FakeHHClient([search_item(1, updated_at="v1")])
+    await cache.get(hhc, "1", version="v1")
+
+    hhc.items = [search_item(1, updated_at="v2")]
+    vacancy = await cache.get(hhc, "1", version="v2")
+
+    assert vacancy["updated_at"] == "v2"
+    assert hhc.vacancy_requests == ["1", "1"]
+    assert cache.stats.stale == 1
+    # Обновлённая запись обслуживает следующие запросы
+    await _cache().get(hhc, "1", version="v2")
+    assert len(hhc.vacancy_requests) == 2
+
+
+async def test_vacancy_cache_without_version_trusts_ttl():
+    install_fake_redis()
+    cache = _cache()
+    hhc = FakeHHClient([search_item(1, updated_at="v1")])
+    await cache.get(hhc, "1", version="v1")
+
+    await cache.get(hhc, "1")
+
+    assert hhc.vacancy_requests == ["1"]
+
+
+async def test_vacancy_cache_survives_redis_errors():
+    redis = install_fake_redis()
+    redis.fail = True
+    cache = _cache()
+    hhc = FakeHHClient([search_item(1)])
+
+    vacancy = await cache.get(hhc, "1")
+
+    assert vacancy["id"] == "1"
+    assert cache.stats.errors == 2   # get и set
@@ -0,0 +1,36 @@
+# tests/unit/utils/test_run_stats.py
+import asyncio
+
+from src.utils.cache import CacheStats, VacancyCache
+from src.utils.run_stats import count, current_run_stats, run_stats_scope
+from tests.fixtures.fakes import FakeHHClient, install_fake_redis, search_item
+
+
+def test_count_updates_process_and_run_counters():
+    process = CacheStats()
+    count("cache", process, "misses")
+    with run_stats_scope() as run:
+        count("cache", process, "misses")
+        count("cache", process, "misses", 2)
+
+    assert process.misses == 4
+    assert run.group("cache", CacheStats).misses == 3
+    assert current_run_stats() is None
+
+
+async def test_concurrent_runs_do_not_mix_counters():
+    install_fake_redis()
+    cache = VacancyCache(ttl=3600, lru_size=100, prefix="test:vacancy:")
+    hhc = FakeHHClient([search_item(i) for i in range(10)], vacancy_delay=0.01)
+
+    async def _run(ids):
+        with run_stats_scope() as run:
+            # Вложенные задачи наследуют счётчики прогона
+            await asyncio.gather(*(cache.get(hhc, vacancy_id) for vacancy_id in ids))
+            return run.group(cache.name, CacheStats)
+
+    first, second = await asyncio.gather(_run(["1", "2", "3"]), _run(["4", "5"]))
+
+    assert first.misses == 3
+    assert second.misses == 2
+    assert cache.stats.misses == 5
@@ -0,0 +1,71 @@
+# tests/unit/workers/test_application_sender_worker.py
+import pytest
+
+import src.workers.application_sender_worker as worker
+from src.models import ApplicationHistory, ApplicationStatus
+from tests.fixtures.fakes import FakeHHClient, create_resume, install_fake_redis, search_item, sqlite_db
+
+
+class ContextStub:
+    """build_resume_context: учёт вызовов, по желанию — ошибка."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self, resume, hhc, *, run_id, queue):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return worker.ResumeRunContext(
+            run_id=run_id, resume_id=str(resume.id), hh_resume_id=str(resume.id),
+            user_id=resume.user_id, queue=queue, resume_text="резюме",
+        )
+
+
+@pytest.fixture
+def env(monkeypatch):
+    hhc = FakeHHClient([search_item(i) for i in range(3)])
+    published = []
+
+    async def queue_for_user(user_id):
+        return "normal"
+
+    monkeypatch.setattr(worker, "get_hh_client", lambda user_id: hhc)
+    monkeypatch.setattr(worker, "_queue_for_user", queue_for_user)
+    monkeypatch.setattr(worker, "publish_batched", lambda task, args_list, queue: published.extend(args_list))
+    return hhc, published
+
+
+async def test_context_is_built_only_when_there_is_something_to_apply(env, monkeypatch):
+    hhc, published = env
+    context = ContextStub()
+    monkeypatch.setattr(worker, "build_resume_context", context)
+    async with sqlite_db():
+        install_fake_redis()
+        await create_resume()
+        for vacancy_id in ("0", "1", "2"):
+            await ApplicationHistory.create(user_id=1, resume_id="r1", vacancy_id=vacancy_id,
+                                            status=ApplicationStatus.SUCCESS)
+
+        await worker._apply_for_resume_async("r1")
+
+        assert context.calls == 0 and published == []
+
+        await ApplicationHistory.filter(vacancy_id="2").delete()
+        await worker._apply_for_resume_async("r1")
+
+        assert context.calls == 1
+        assert [args[1] for args in published] == ["2"]
+
+
+async def test_context_failure_skips_the_resume(env, monkeypatch):
+    hhc, published = env
+    monkeypatch.setattr(worker, "build_resume_context", ContextStub(error=RuntimeError("HH get_resume failed")))
+    async with sqlite_db():
+        install_fake_redis()
+        await create_resume()
+
+        await worker._apply_for_resume_async("r1")
+
+        assert published == []